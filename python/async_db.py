@@ -0,0 +1,103 @@
+"""
+Versión asyncio de la capa de datos.
+
+sqlite3 bloquea, así que las consultas corren en un pool de hilos propio
+(cada hilo con su conexión de db_manager) y un semáforo limita cuántas esperan
+a la vez. Mientras tanto el event loop sigue libre: muchas corrutinas pueden pedir
+reportes de usuarios distintos en paralelo.
+
+    import async_db
+    fila = await async_db.get_usuario(1)            # cualquier función de db_manager
+    u = await Usuario.afrom_db(1)
+    r = await u.asummary()
+    async for g in u.aiter_gastos_variables(desde="2024-01-01"):
+        ...
+"""
+import asyncio
+import functools
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+import db_manager
+
+MAX_HILOS = 4
+
+_pool = None
+# event loop -> semáforo (un asyncio.Semaphore pertenece a un solo loop). Sin
+# referencias fuertes a los loops: cada asyncio.run() crea uno nuevo.
+_semaforos = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+_max_hilos = MAX_HILOS
+
+
+def configurar(max_hilos: int = MAX_HILOS):
+    """
+    Cambia la cantidad de hilos de base de datos (y de consultas simultáneas).
+    Se aplica a partir de la próxima consulta.
+    """
+    global _max_hilos
+    cerrar()
+    _max_hilos = max_hilos
+
+
+def _ejecutor() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(_max_hilos, thread_name_prefix="db")
+    return _pool
+
+
+def _semaforo() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    s = _semaforos.get(loop)
+    if s is None:
+        with _lock:
+            # un semáforo que tuvo que esperar guarda su loop y lo mantendría
+            # vivo: los de loops ya cerrados se sueltan aquí
+            for viejo in [l for l in list(_semaforos) if l.is_closed()]:
+                _semaforos.pop(viejo, None)
+            s = _semaforos.setdefault(loop, asyncio.Semaphore(_max_hilos))
+    return s
+
+
+async def ejecutar(fn, *args, **kwargs):
+    """
+    Corre fn(*args, **kwargs) en un hilo de base de datos y espera el resultado
+    sin bloquear el event loop.
+    """
+    async with _semaforo():
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_ejecutor(), functools.partial(fn, *args, **kwargs))
+
+
+def cerrar():
+    """
+    Espera las consultas en curso y libera los hilos (se recrean si se vuelve a usar).
+    """
+    global _pool
+    with _lock:
+        pool, _pool = _pool, None
+        _semaforos.clear()
+    if pool is not None:
+        pool.shutdown(wait=True)
+
+
+# Funciones de db_manager que no tiene sentido llamar desde aquí
+_NO_EXPONER = {"habilitar_trazas", "deshabilitar_trazas", "metricas", "iniciar_accion",
+               "add_write_listener", "remove_write_listener", "conexion_prestada", "escrituras_agrupadas",
+               "abrir_conexion", "get_connection", "close_connection"}
+
+
+def __getattr__(nombre):
+    # async_db.get_usuario(...) es la versión awaitable de db_manager.get_usuario(...)
+    if nombre.startswith("_") or nombre in _NO_EXPONER or not callable(getattr(db_manager, nombre, None)):
+        raise AttributeError(nombre)
+
+    async def llamada(*args, **kwargs):
+        # se busca en cada llamada para respetar las trazas de db_manager
+        return await ejecutar(getattr(db_manager, nombre), *args, **kwargs)
+    llamada.__name__ = nombre
+    return llamada
@@ -0,0 +1,5 @@
+"""
+Benchmarks de la capa de datos. Se ejecutan desde la carpeta python/, por ejemplo:
+
+    python -m benchmarks.indices
+"""
@@ -0,0 +1,95 @@
+"""
+Tiempos de arranque de la aplicación.
+
+- importar `clases` (capa de datos sin interfaz), medido con `python -X importtime`
+- importar `main` (no debe cargar PyQt5)
+- hasta la primera ventana: proceso nuevo que crea MainWindow, la muestra y sale
+  en la primera vuelta del bucle de eventos
+
+Cada medición corre en un proceso nuevo y se repite; se informa la mediana.
+
+Uso (desde la carpeta python/):
+    python -m benchmarks.arranque [--repeticiones 5] [--sin-ventana]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+CARPETA = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCRIPT_VENTANA = """
+import time
+t0 = time.perf_counter()
+import sys
+import db_manager
+db_manager.init_db(sys.argv[1])
+from PyQt5 import QtWidgets, QtCore
+import ui_main
+app = QtWidgets.QApplication([])
+w = ui_main.MainWindow()
+w.show()
+QtCore.QTimer.singleShot(0, app.quit)
+app.exec_()
+print(time.perf_counter() - t0)
+"""
+
+
+def _ejecutar(args, env=None):
+    t0 = time.perf_counter()
+    res = subprocess.run([sys.executable] + args, cwd=CARPETA, env=env, capture_output=True, text=True, check=True)
+    return time.perf_counter() - t0, res
+
+
+def importtime(modulo):
+    """
+    Devuelve (segundos acumulados del import de `modulo`, módulos importados, pared).
+    """
+    pared, res = _ejecutar(["-X", "importtime", "-c", f"import {modulo}"])
+    acumulado, modulos = 0.0, set()
+    for linea in res.stderr.splitlines():
+        if not linea.startswith("import time:") or "|" not in linea:
+            continue
+        partes = [p.strip() for p in linea[len("import time:"):].split("|")]
+        if not partes[1].isdigit():
+            continue  # encabezado
+        nombre = partes[2]
+        modulos.add(nombre.strip())
+        if nombre == modulo:  # el módulo pedido está sin sangría
+            acumulado = int(partes[1]) / 1e6
+    return acumulado, modulos, pared
+
+
+def primera_ventana(db_path):
+    env = dict(os.environ)
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    pared, res = _ejecutar(["-c", SCRIPT_VENTANA, db_path], env=env)
+    return float(res.stdout.strip().splitlines()[-1]), pared
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--sin-ventana", action="store_true", help="no medir la ventana (sin PyQt5)")
+    args = parser.parse_args()
+
+    for modulo in ("clases", "main"):
+        medidas = [importtime(modulo) for _ in range(args.repeticiones)]
+        modulos = medidas[-1][1]
+        print(f"import {modulo:<8} {statistics.median(m[0] for m in medidas) * 1000:8.1f} ms"
+              f"  (proceso completo {statistics.median(m[2] for m in medidas) * 1000:.1f} ms,"
+              f" {len(modulos)} módulos, PyQt5 cargado: {'PyQt5' in modulos})")
+
+    if not args.sin_ventana:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "arranque.db")
+            medidas = [primera_ventana(db_path) for _ in range(args.repeticiones)]
+        print(f"primera ventana  {statistics.median(m[0] for m in medidas) * 1000:8.1f} ms"
+              f"  (proceso completo {statistics.median(m[1] for m in medidas) * 1000:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Prueba de carga de servicio.py: N clientes concurrentes contra localhost.
+
+Sin --url levanta el servicio en este mismo proceso sobre una base sintética
+(benchmarks.generador). Cada cliente repite una mezcla de lecturas (resumen,
+página de gastos) y escrituras (alta de gasto variable) durante --duracion
+segundos; al final se informan peticiones por segundo, latencias y cuántas
+escrituras entraron en cada commit del escritor.
+
+Uso (desde la carpeta python/):
+    python -m benchmarks.carga_servicio --clientes 1 4 16 --duracion 5
+    python -m benchmarks.carga_servicio --url http://127.0.0.1:8765 --escrituras 0.5
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import urllib.request
+
+import servicio
+from benchmarks.generador import Volumen, poblar
+from clases import CATEGORIES
+from cliente import ClienteServicio
+
+
+def _cliente(c: ClienteServicio, usuarios: int, escrituras: float, fin: float, semilla: int, latencias: list,
+             errores: list):
+    rnd = random.Random(semilla)
+    while time.perf_counter() < fin:
+        uid = rnd.randint(1, usuarios)
+        t0 = time.perf_counter()
+        try:
+            if rnd.random() < escrituras:
+                c.insert_gasto_variable(uid, rnd.choice(CATEGORIES), round(rnd.uniform(1, 100), 2), "2024-06-15")
+            elif rnd.random() < 0.5:
+                c.get_usuario_resumen(uid)
+            else:
+                c.query_gastos_variables(uid, limit=50)
+        except Exception:
+            errores.append(1)
+            continue
+        latencias.append((time.perf_counter() - t0) * 1000)
+
+
+def _salud(url: str) -> dict:
+    with urllib.request.urlopen(url + "/salud") as r:
+        return json.load(r)
+
+
+def medir(url: str, clientes: int, duracion: float, escrituras: float, usuarios: int) -> dict:
+    antes = _salud(url)
+    c = ClienteServicio(url)
+    latencias, errores = [], []
+    fin = time.perf_counter() + duracion
+    hilos = [threading.Thread(target=_cliente, args=(c, usuarios, escrituras, fin, i, latencias, errores))
+             for i in range(clientes)]
+    t0 = time.perf_counter()
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    total = time.perf_counter() - t0
+    c.cerrar()
+    despues = _salud(url)
+    latencias.sort()
+    n = len(latencias)
+    lotes = despues["lotes"] - antes["lotes"]
+    return {
+        "clientes": clientes,
+        "peticiones": n,
+        "errores": len(errores),
+        "rps": round(n / total, 1),
+        "p50_ms": round(latencias[n // 2], 3) if n else 0.0,
+        "p95_ms": round(latencias[min(n - 1, int(n * 0.95))], 3) if n else 0.0,
+        "escrituras_por_commit": round((despues["escrituras"] - antes["escrituras"]) / lotes, 2) if lotes else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="servicio ya en marcha (por defecto se levanta uno local)")
+    parser.add_argument("--clientes", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--duracion", type=float, default=5.0, help="segundos por medición")
+    parser.add_argument("--escrituras", type=float, default=0.2, help="fracción de peticiones que escriben")
+    parser.add_argument("--filas", type=int, default=100_000, help="tamaño de la base sintética")
+    parser.add_argument("--pool", type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        servidor = None
+        if args.url:
+            url = args.url
+            usuarios = 100
+        else:
+            vol = Volumen.para_filas(args.filas)
+            servidor = servicio.crear_servidor(puerto=0, db=os.path.join(tmp, "carga.db"), pool=args.pool)
+            poblar(vol)
+            usuarios = vol.usuarios
+            threading.Thread(target=servidor.serve_forever, daemon=True).start()
+            url = f"http://127.0.0.1:{servidor.server_address[1]}"
+
+        print(f"{'clientes':>8} {'peticiones':>10} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'esc/commit':>10} {'errores':>7}")
+        try:
+            for n in args.clientes:
+                r = medir(url, n, args.duracion, args.escrituras, usuarios)
+                print(f"{r['clientes']:>8} {r['peticiones']:>10} {r['rps']:>9.1f} {r['p50_ms']:>8.3f} "
+                      f"{r['p95_ms']:>8.3f} {r['escrituras_por_commit']:>10.2f} {r['errores']:>7}")
+        finally:
+            if servidor is not None:
+                servidor.cerrar()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Prueba de estrés con varios procesos sobre un mismo gastos.db.
+
+N procesos escriben (altas de gastos variables y cambios de ahorro con
+db_manager.update_ahorro_porcentaje) y M procesos leen (resumen y página de
+gastos) durante --duracion segundos. Se mide con WAL y sin WAL (diario clásico):
+operaciones por segundo, latencia de escritura (incluye la espera por el
+bloqueo de otro proceso), reintentos, escrituras que fallaron igual, y al final
+se comprueba que los resúmenes cuadren y que no se haya perdido ningún alta.
+
+Uso (desde la carpeta python/):
+    python -m benchmarks.concurrencia --escritores 4 --lectores 4 --duracion 5
+    python -m benchmarks.concurrencia --escritores 8 --lectores 0 --modos wal
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+import db_manager
+from benchmarks.generador import Volumen, poblar
+from clases import CATEGORIES
+
+MODOS = ("wal", "diario")
+
+
+def _percentil(valores, q):
+    return valores[min(len(valores) - 1, int(len(valores) * q))] if valores else 0.0
+
+
+def _proceso(rol, db_path, wal, usuarios, duracion, semilla, barrera, resultados):
+    db_manager.WAL = wal
+    db_manager.init_db(db_path)
+    rnd = random.Random(semilla)
+    latencias, altas, errores = [], 0, 0
+    barrera.wait()
+    fin = time.perf_counter() + duracion
+    while time.perf_counter() < fin:
+        uid = rnd.randint(1, usuarios)
+        t0 = time.perf_counter()
+        try:
+            if rol == "lector":
+                if rnd.random() < 0.5:
+                    db_manager.get_usuario_resumen(uid)
+                else:
+                    db_manager.query_gastos_variables(uid, limit=50)
+            elif rnd.random() < 0.9:
+                db_manager.insert_gasto_variable(uid, rnd.choice(CATEGORIES), round(rnd.uniform(1, 100), 2),
+                                                 "2024-06-15")
+                altas += 1
+            else:
+                db_manager.update_ahorro_porcentaje(uid, rnd.choice((0, 5, 10, 15, 20)))
+        except sqlite3.OperationalError:
+            errores += 1
+            continue
+        latencias.append((time.perf_counter() - t0) * 1000)
+    stats = db_manager.concurrencia_stats()
+    db_manager.close_all_connections()
+    resultados.put({"rol": rol, "latencias": latencias, "altas": altas, "errores": errores,
+                    "reintentos": stats["reintentos"]})
+
+
+def medir(db_path, wal, escritores, lectores, duracion, usuarios) -> dict:
+    # spawn: cada proceso abre sus propias conexiones (nada heredado de este)
+    ctx = multiprocessing.get_context("spawn")
+    barrera = ctx.Barrier(escritores + lectores)
+    resultados = ctx.Queue()
+    procesos = [ctx.Process(target=_proceso, args=(rol, db_path, wal, usuarios, duracion, i, barrera, resultados))
+                for i, rol in enumerate(["escritor"] * escritores + ["lector"] * lectores)]
+    antes = db_manager.get_connection().execute("SELECT COUNT(*) FROM gastos_variables").fetchone()[0]
+    for p in procesos:
+        p.start()
+    datos = [resultados.get() for _ in procesos]
+    for p in procesos:
+        p.join()
+
+    escrituras = sorted(x for d in datos if d["rol"] == "escritor" for x in d["latencias"])
+    lecturas = sorted(x for d in datos if d["rol"] == "lector" for x in d["latencias"])
+    altas = sum(d["altas"] for d in datos)
+    despues = db_manager.get_connection().execute("SELECT COUNT(*) FROM gastos_variables").fetchone()[0]
+    return {
+        "escrituras_s": len(escrituras) / duracion,
+        "lecturas_s": len(lecturas) / duracion,
+        "esc_p50": _percentil(escrituras, 0.5),
+        "esc_p95": _percentil(escrituras, 0.95),
+        "esc_max": escrituras[-1] if escrituras else 0.0,
+        "lec_p95": _percentil(lecturas, 0.95),
+        "reintentos": sum(d["reintentos"] for d in datos),
+        "errores": sum(d["errores"] for d in datos),
+        "consistente": despues - antes == altas and not db_manager.verify_resumenes(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--escritores", type=int, default=4, help="procesos que escriben")
+    parser.add_argument("--lectores", type=int, default=4, help="procesos que leen")
+    parser.add_argument("--duracion", type=float, default=5.0, help="segundos por medición")
+    parser.add_argument("--modos", nargs="+", choices=MODOS, default=list(MODOS))
+    parser.add_argument("--filas", type=int, default=50_000, help="tamaño de la base sintética")
+    args = parser.parse_args()
+
+    vol = Volumen.para_filas(args.filas)
+    print(f"{args.escritores} escritores, {args.lectores} lectores, {args.duracion:g} s")
+    print(f"{'modo':<7} {'esc/s':>8} {'lec/s':>9} {'esc p50':>8} {'esc p95':>8} {'esc max':>8} "
+          f"{'lec p95':>8} {'reint.':>6} {'errores':>7} {'ok':>3}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for modo in args.modos:
+            db_manager.WAL = modo == "wal"
+            db_path = os.path.join(tmp, f"concurrencia_{modo}.db")
+            db_manager.init_db(db_path)
+            poblar(vol)
+            r = medir(db_path, db_manager.WAL, args.escritores, args.lectores, args.duracion, vol.usuarios)
+            print(f"{modo:<7} {r['escrituras_s']:>8.0f} {r['lecturas_s']:>9.0f} {r['esc_p50']:>8.2f} "
+                  f"{r['esc_p95']:>8.2f} {r['esc_max']:>8.1f} {r['lec_p95']:>8.2f} {r['reintentos']:>6} "
+                  f"{r['errores']:>7} {'sí' if r['consistente'] else 'NO':>3}")
+        db_manager.close_all_connections()
+    print("latencias en ms; las de escritura incluyen la espera por el bloqueo de otros procesos")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Inserciones por segundo con escritura directa (una transacción por gasto) y con
+escritura diferida (db_manager.habilitar_escritura_diferida), incluido el flush
+final, sobre una base sintética pequeña.
+
+Uso (desde la carpeta python/):
+    python -m benchmarks.escritura_diferida --gastos 5000 --hilos 1 4
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+import db_manager
+from benchmarks.generador import Volumen, poblar
+from clases import CATEGORIES
+
+
+def _cargar(n, usuarios, semilla):
+    rnd = random.Random(semilla)
+    for _ in range(n):
+        db_manager.insert_gasto_variable(rnd.randint(1, usuarios), rnd.choice(CATEGORIES),
+                                         round(rnd.uniform(1, 100), 2), "2024-06-15")
+
+
+def medir(n, hilos, usuarios):
+    t0 = time.perf_counter()
+    trabajo = [threading.Thread(target=_cargar, args=(n // hilos, usuarios, i)) for i in range(hilos)]
+    for h in trabajo:
+        h.start()
+    for h in trabajo:
+        h.join()
+    db_manager.flush()
+    return (n // hilos) * hilos / (time.perf_counter() - t0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--gastos", type=int, default=5000)
+    parser.add_argument("--hilos", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--max-lote", type=int, default=500)
+    parser.add_argument("--ventana-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    print(f"{'modo':<10} {'hilos':>5} {'inserts/s':>10} {'lotes':>6}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for diferida in (False, True):
+            for hilos in args.hilos:
+                db_manager.init_db(os.path.join(tmp, f"diferida_{diferida}_{hilos}.db"))
+                vol = Volumen(100, 2, 10)
+                poblar(vol)
+                if diferida:
+                    db_manager.habilitar_escritura_diferida(args.max_lote, args.ventana_ms)
+                velocidad = medir(args.gastos, hilos, vol.usuarios)
+                stats = db_manager.escritura_diferida_stats()
+                print(f"{'diferida' if diferida else 'directa':<10} {hilos:>5} {velocidad:>10.0f} "
+                      f"{stats['lotes'] if stats else args.gastos:>6}")
+                db_manager.deshabilitar_escritura_diferida()
+        db_manager.close_all_connections()
+
+
+if __name__ == "__main__":
+    main()
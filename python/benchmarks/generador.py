@@ -0,0 +1,71 @@
+"""
+Generador determinista de datos sintéticos: N usuarios con M gastos fijos y
+variables repartidos en varios años. La misma semilla produce siempre la misma
+base de datos, así que los resultados se pueden comparar entre commits.
+"""
+import datetime
+import random
+from dataclasses import dataclass
+
+import db_manager
+from clases import CATEGORIES
+
+FECHA_INICIO = datetime.date(2022, 1, 1)
+
+
+@dataclass
+class Volumen:
+    usuarios: int
+    fijos_por_usuario: int
+    variables_por_usuario: int
+    anios: int = 3
+
+    @property
+    def filas(self) -> int:
+        return self.usuarios * (self.fijos_por_usuario + self.variables_por_usuario)
+
+    @classmethod
+    def para_filas(cls, total: int, variables_por_usuario: int = 200, fijos_por_usuario: int = 5, anios: int = 3):
+        """
+        Volumen con `total` gastos aproximados y la misma cantidad de gastos por usuario.
+        """
+        usuarios = max(1, total // (variables_por_usuario + fijos_por_usuario))
+        return cls(usuarios, fijos_por_usuario, variables_por_usuario, anios)
+
+
+def _usuarios(vol: Volumen, rnd: random.Random):
+    for uid in range(1, vol.usuarios + 1):
+        # se insertan directo en la tabla: ingreso en centavos y ahorro en puntos básicos
+        yield (uid, f"usuario{uid:07d}", round(rnd.uniform(500, 8000) * 100), rnd.choice((0, 5, 10, 15, 20)) * 100)
+
+
+def _fijos(vol: Volumen, rnd: random.Random):
+    for uid in range(1, vol.usuarios + 1):
+        for _ in range(vol.fijos_por_usuario):
+            yield (uid, rnd.choice(CATEGORIES), round(rnd.uniform(10, 800), 2))
+
+
+def _variables(vol: Volumen, rnd: random.Random):
+    dias = 365 * vol.anios
+    # en orden cronológico e intercalando usuarios, como llegarían en la realidad
+    for i in range(vol.variables_por_usuario):
+        base = i * dias // vol.variables_por_usuario
+        for uid in range(1, vol.usuarios + 1):
+            fecha = FECHA_INICIO + datetime.timedelta(days=min(dias - 1, base + rnd.randint(0, 3)))
+            yield (uid, rnd.choice(CATEGORIES), round(rnd.uniform(1, 250), 2), fecha.isoformat())
+
+
+def poblar(vol: Volumen, semilla: int = 1234):
+    """
+    Llena la base de datos actual (db_manager.init_db) con el volumen indicado.
+    """
+    rnd = random.Random(semilla)
+    conn = db_manager.get_connection()
+    with conn:
+        conn.executemany(
+            "INSERT INTO usuarios (id, nombre, ingreso, ahorro_porcentaje) VALUES (?, ?, ?, ?)",
+            _usuarios(vol, rnd),
+        )
+    db_manager.insert_gastos_fijos_bulk(_fijos(vol, rnd))
+    db_manager.insert_gastos_variables_bulk(_variables(vol, rnd), chunk_size=50_000)
+    conn.execute("ANALYZE")
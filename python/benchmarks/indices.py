@@ -0,0 +1,92 @@
+"""
+Costo de las consultas por usuario a medida que crece el total de filas.
+
+Cada usuario tiene siempre la misma cantidad de gastos; lo que crece es el número
+de usuarios. Con los índices de la migración 2 el tiempo por usuario debe
+mantenerse plano; sin ellos crece de forma lineal con el total de filas.
+
+Uso (desde la carpeta python/):
+    python -m benchmarks.indices --tamanos 10000 100000 1000000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import db_manager
+
+GASTOS_VARIABLES_POR_USUARIO = 200
+GASTOS_FIJOS_POR_USUARIO = 5
+CONSULTAS = 200
+
+INDICES = [
+    "idx_gastos_fijos_usuario",
+    "idx_gastos_variables_usuario_fecha",
+    "idx_gastos_variables_usuario_categoria",
+    "idx_gastos_variables_usuario_monto",
+]
+
+
+def poblar(conn, total_filas, rnd):
+    usuarios = max(1, total_filas // GASTOS_VARIABLES_POR_USUARIO)
+    with conn:
+        conn.executemany(
+            "INSERT INTO usuarios (id, nombre, ingreso, ahorro_porcentaje) VALUES (?, ?, ?, ?)",
+            # montos en centavos y ahorro en puntos básicos, como los guarda db_manager
+            ((uid, f"usuario{uid}", 100_000, 1000) for uid in range(1, usuarios + 1)),
+        )
+        conn.executemany(
+            "INSERT INTO gastos_fijos (usuario_id, categoria, monto) VALUES (?, ?, ?)",
+            ((uid, "Servicios", 2500) for uid in range(1, usuarios + 1) for _ in range(GASTOS_FIJOS_POR_USUARIO)),
+        )
+        # intercalado por fecha, como llegarían los gastos en la vida real
+        conn.executemany(
+            "INSERT INTO gastos_variables (usuario_id, categoria, monto, fecha) VALUES (?, ?, ?, ?)",
+            ((uid, "Comida", round(rnd.uniform(1, 100) * 100), f"2024-{1 + i % 12:02d}-{1 + i % 28:02d}")
+             for i in range(GASTOS_VARIABLES_POR_USUARIO)
+             for uid in range(1, usuarios + 1)),
+        )
+    return usuarios
+
+
+def medir(usuarios, rnd):
+    ids = [rnd.randint(1, usuarios) for _ in range(CONSULTAS)]
+    t0 = time.perf_counter()
+    for uid in ids:
+        db_manager.get_usuario_resumen(uid)
+    t_resumen = (time.perf_counter() - t0) / CONSULTAS
+    t0 = time.perf_counter()
+    for uid in ids:
+        db_manager.get_gastos_variables(uid)
+    t_listado = (time.perf_counter() - t0) / CONSULTAS
+    return t_resumen * 1000, t_listado * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanos", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--sin-indices", action="store_true", help="medir también sin los índices (lento)")
+    args = parser.parse_args()
+
+    rnd = random.Random(42)
+    print(f"{'filas':>10} {'usuarios':>9} {'indices':>8} {'resumen ms':>11} {'listado ms':>11}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for total in args.tamanos:
+            db_manager.init_db(os.path.join(tmp, f"bench_{total}.db"))
+            conn = db_manager.get_connection()
+            usuarios = poblar(conn, total, rnd)
+            conn.execute("ANALYZE")
+
+            resumen, listado = medir(usuarios, rnd)
+            print(f"{total:>10} {usuarios:>9} {'si':>8} {resumen:>11.3f} {listado:>11.3f}")
+            if args.sin_indices:
+                for nombre in INDICES:
+                    conn.execute(f"DROP INDEX {nombre}")
+                resumen, listado = medir(usuarios, rnd)
+                print(f"{total:>10} {usuarios:>9} {'no':>8} {resumen:>11.3f} {listado:>11.3f}")
+        db_manager.close_all_connections()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+Suite de benchmarks de db_manager y clases.Usuario sobre datos sintéticos.
+
+Para cada tamaño genera una base nueva (benchmarks.generador) y mide cada
+función CRUD, los totales y listados de Usuario y el camino completo del
+reporte sin interfaz. Los resultados se guardan en JSON para comparar commits.
+
+Uso (desde la carpeta python/):
+    python -m benchmarks.suite --tamanos 10000 100000 1000000 --salida bench.json
+    python -m benchmarks.suite --tamanos 10000 --comparar bench_anterior.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import clases
+import db_manager
+from benchmarks.generador import Volumen, poblar
+
+
+def medir(fn, args_iter, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        args = next(args_iter)
+        t0 = time.perf_counter()
+        fn(*args)
+        tiempos.append((time.perf_counter() - t0) * 1000)
+    tiempos.sort()
+    return {
+        "n": len(tiempos),
+        "media_ms": round(statistics.fmean(tiempos), 4),
+        "p50_ms": round(tiempos[len(tiempos) // 2], 4),
+        "p95_ms": round(tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.95))], 4),
+        "max_ms": round(tiempos[-1], 4),
+    }
+
+
+def _ciclo(gen):
+    while True:
+        yield from gen()
+
+
+def reporte_sin_interfaz(usuario_id):
+    # lo mismo que hace MainWindow al elegir un usuario, sin Qt
+    u = clases.Usuario.from_db(usuario_id)
+    r = u.summary()
+    return "\n".join(r.lineas_reporte(u)), r.porcentaje_uso
+
+
+def casos(vol: Volumen, rnd: random.Random):
+    """
+    (nombre, función, generador de argumentos). Las escrituras usan ids que
+    existen, así que los tiempos incluyen el trabajo real de los triggers.
+    """
+    uid = lambda: rnd.randint(1, vol.usuarios)
+    conn = db_manager.get_connection()
+    max_fijo = conn.execute("SELECT MAX(id) FROM gastos_fijos").fetchone()[0]
+    max_var = conn.execute("SELECT MAX(id) FROM gastos_variables").fetchone()[0]
+    fecha = lambda: f"2023-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}"
+    cat = lambda: rnd.choice(clases.CATEGORIES)
+    borrables_var = iter(range(max_var, 0, -1))
+    borrables_fijo = iter(range(max_fijo, 0, -1))
+
+    def frio(fn):
+        # sin caché: mide el costo real de la consulta
+        def f(*args):
+            clases.cache_usuarios.limpiar()
+            return fn(*args)
+        return f
+
+    return [
+        # db_manager: lecturas
+        ("db.get_usuario", db_manager.get_usuario, lambda: [(uid(),)]),
+        ("db.get_usuario_resumen", db_manager.get_usuario_resumen, lambda: [(uid(),)]),
+        ("db.get_gastos_fijos", db_manager.get_gastos_fijos, lambda: [(uid(),)]),
+        ("db.get_gastos_variables", db_manager.get_gastos_variables, lambda: [(uid(),)]),
+        ("db.total_gastos_fijos", db_manager.total_gastos_fijos, lambda: [(uid(),)]),
+        ("db.total_gastos_variables", db_manager.total_gastos_variables, lambda: [(uid(),)]),
+        ("db.get_gastos_page", db_manager.get_gastos_page, lambda: [("gastos_variables", uid(), "fecha")]),
+        ("db.get_resumen_mensual", db_manager.get_resumen_mensual, lambda: [(uid(),)]),
+        ("db.get_resumen_categorias", db_manager.get_resumen_categorias, lambda: [(uid(),)]),
+        # db_manager: escrituras
+        ("db.insert_usuario_return_id", db_manager.insert_usuario_return_id, lambda: [("nuevo", 1000.0, 10.0)]),
+        ("db.update_usuario", db_manager.update_usuario, lambda: [(uid(), "editado", 2000.0, 15.0)]),
+        ("db.insert_gasto_fijo", db_manager.insert_gasto_fijo, lambda: [(uid(), cat(), 50.0)]),
+        ("db.update_gasto_fijo", db_manager.update_gasto_fijo, lambda: [(rnd.randint(1, max_fijo), cat(), 60.0)]),
+        ("db.delete_gasto_fijo", db_manager.delete_gasto_fijo, lambda: [(next(borrables_fijo),)]),
+        ("db.insert_gasto_variable", db_manager.insert_gasto_variable, lambda: [(uid(), cat(), 20.0, fecha())]),
+        ("db.update_gasto_variable", db_manager.update_gasto_variable,
+         lambda: [(rnd.randint(1, max_var), cat(), 30.0, fecha())]),
+        ("db.delete_gasto_variable", db_manager.delete_gasto_variable, lambda: [(next(borrables_var),)]),
+        ("db.insert_gastos_variables_bulk_1000", db_manager.insert_gastos_variables_bulk,
+         lambda: [([(uid(), cat(), 5.0, fecha()) for _ in range(1000)],)]),
+        # clases.Usuario
+        ("usuario.from_db_frio", frio(clases.Usuario.from_db), lambda: [(uid(),)]),
+        ("usuario.from_db_cache", clases.Usuario.from_db, lambda: [(1,)]),
+        ("usuario.summary_frio", frio(lambda i: clases.Usuario.from_db(i).summary()), lambda: [(uid(),)]),
+        ("usuario.summary_cache", lambda i: clases.Usuario.from_db(i).summary(), lambda: [(1,)]),
+        ("usuario.gastos_fijos_totales", lambda i: clases.Usuario.from_db(i).gastos_fijos_totales(), lambda: [(uid(),)]),
+        ("usuario.gastos_variables_totales", lambda i: clases.Usuario.from_db(i).gastos_variables_totales(),
+         lambda: [(uid(),)]),
+        ("usuario.listar_gastos_fijos", lambda i: clases.Usuario.from_db(i).listar_gastos_fijos(), lambda: [(uid(),)]),
+        ("usuario.listar_gastos_variables", lambda i: clases.Usuario.from_db(i).listar_gastos_variables(),
+         lambda: [(uid(),)]),
+        ("usuario.totales_por_mes", lambda i: clases.Usuario.from_db(i).totales_por_mes(), lambda: [(uid(),)]),
+        # camino completo del reporte
+        ("reporte.frio", frio(reporte_sin_interfaz), lambda: [(uid(),)]),
+        ("reporte.cache", reporte_sin_interfaz, lambda: [(1,)]),
+        ("db.get_all_usuarios", db_manager.get_all_usuarios, lambda: [()]),
+    ]
+
+
+def ejecutar(tamanos, repeticiones, semilla):
+    resultados = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for total in tamanos:
+            vol = Volumen.para_filas(total)
+            db_manager.init_db(os.path.join(tmp, f"suite_{total}.db"))
+            clases.cache_usuarios.limpiar()
+            t0 = time.perf_counter()
+            poblar(vol, semilla)
+            carga = time.perf_counter() - t0
+            print(f"== {vol.filas} filas, {vol.usuarios} usuarios (carga {carga:.1f} s)", file=sys.stderr)
+
+            rnd = random.Random(semilla)
+            medidas = {}
+            for nombre, fn, args in casos(vol, rnd):
+                reps = 3 if nombre == "db.get_all_usuarios" else repeticiones
+                medidas[nombre] = medir(fn, _ciclo(args), reps)
+                print(f"  {nombre:<38} p50 {medidas[nombre]['p50_ms']:9.3f} ms", file=sys.stderr)
+            resultados[str(total)] = {
+                "usuarios": vol.usuarios,
+                "filas": vol.filas,
+                "carga_s": round(carga, 3),
+                "operaciones": medidas,
+            }
+            db_manager.close_all_connections()
+    return resultados
+
+
+def metadatos(semilla, repeticiones):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "fecha": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "plataforma": platform.platform(),
+        "semilla": semilla,
+        "repeticiones": repeticiones,
+    }
+
+
+def comparar(actual, anterior):
+    print(f"\n{'tamaño':>8} {'operación':<38} {'antes':>10} {'ahora':>10} {'cambio':>8}")
+    for total, datos in actual["resultados"].items():
+        previos = anterior.get("resultados", {}).get(total, {}).get("operaciones", {})
+        for nombre, m in datos["operaciones"].items():
+            if nombre not in previos:
+                continue
+            antes, ahora = previos[nombre]["p50_ms"], m["p50_ms"]
+            cambio = (ahora / antes - 1) * 100 if antes else 0.0
+            print(f"{total:>8} {nombre:<38} {antes:>10.3f} {ahora:>10.3f} {cambio:>+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanos", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeticiones", type=int, default=200)
+    parser.add_argument("--semilla", type=int, default=1234)
+    parser.add_argument("--salida", help="archivo JSON de resultados (por defecto, salida estándar)")
+    parser.add_argument("--comparar", help="JSON de una ejecución anterior para comparar")
+    args = parser.parse_args()
+
+    datos = {"meta": metadatos(args.semilla, args.repeticiones),
+             "resultados": ejecutar(args.tamanos, args.repeticiones, args.semilla)}
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(datos, f, indent=2, ensure_ascii=False)
+    else:
+        json.dump(datos, sys.stdout, indent=2, ensure_ascii=False)
+        print()
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            comparar(datos, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,23 @@
+from collections import OrderedDict
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import AsyncIterator, Iterator, List, Optional
 import datetime
+import threading
 
 import db_manager
+import eventos
 
-@dataclass
+# categorías definidas
+CATEGORIES = ["Alquiler", "Comida", "Transporte", "Servicios", "Entretenimiento", "Salud", "Deudas","Otros"]
+
+@dataclass(slots=True)
 class GastoFijo:
     id: int
     usuario_id: int
     categoria: str
     monto: float
 
-@dataclass
+@dataclass(slots=True)
 class GastoVariable:
     id: int
     usuario_id: int
@@ -19,61 +25,557 @@ class GastoVariable:
     monto: float
     fecha: str
 
+@dataclass(slots=True)
+class ResumenUsuario:
+    ingreso: float
+    ahorro: float
+    gastos_fijos: float
+    gastos_variables: float
+    presupuesto_disponible: float
+    compromiso_total: float
+
+    @property
+    def porcentaje_uso(self) -> int:
+        """
+        Porcentaje del ingreso comprometido (0-100), usado por la barra de progreso.
+        """
+        if self.ingreso <= 0:
+            return 0
+        return int(min(100, (self.compromiso_total / self.ingreso) * 100))
+
+    @property
+    def excede_ingreso(self) -> bool:
+        return self.compromiso_total > self.ingreso
+
+    def con_cambios(self, delta_fijos: int = 0, delta_variables: int = 0, ingreso: float = None,
+                    ahorro_porcentaje: float = None) -> "ResumenUsuario":
+        """
+        El resumen después de una escritura, sin consultar la base: los deltas van
+        en centavos y el ahorro se recalcula si se pasan ingreso y porcentaje.
+        Las cuentas son en centavos enteros, como en get_usuario_resumen, así que
+        da exactamente lo mismo que volver a consultar.
+        """
+        ingreso_c = round((self.ingreso if ingreso is None else ingreso) * 100)
+        if ahorro_porcentaje is None:
+            ahorro_c = round(self.ahorro * 100)
+        else:
+            ahorro_c = (ingreso_c * round(ahorro_porcentaje * 100) + 5000) // 10000
+        fijos_c = round(self.gastos_fijos * 100) + delta_fijos
+        variables_c = round(self.gastos_variables * 100) + delta_variables
+        return ResumenUsuario(ingreso_c / 100, ahorro_c / 100, fijos_c / 100, variables_c / 100,
+                              (ingreso_c - ahorro_c - fijos_c - variables_c) / 100,
+                              (ahorro_c + fijos_c + variables_c) / 100)
+
+    def lineas_reporte(self, u: "Usuario") -> List[str]:
+        """
+        Texto del reporte de la ventana principal, sin depender de la interfaz.
+        """
+        texto = []
+        texto.append(f"Usuario: {u.nombre} (id={u.id})")
+        texto.append(f"Ingreso: {self.ingreso:.2f}")
+        texto.append(f"Ahorro ({u.ahorro_porcentaje}%): {self.ahorro:.2f}")
+        texto.append(f"Gastos fijos totales: {self.gastos_fijos:.2f}")
+        texto.append(f"Gastos variables totales: {self.gastos_variables:.2f}")
+        texto.append(f"Presupuesto disponible (ingreso - ahorro - gastos fijos - gastos variables): {self.presupuesto_disponible:.2f}")
+
+        # estado y advertencia si compromiso supera ingreso
+        texto.append(f"Total comprometido (ahorro + gastos): {self.compromiso_total:.2f}")
+        if self.excede_ingreso:
+            texto.append("ADVERTENCIA: Compras + ahorro exceden el ingreso. Revisa gastos o porcentaje de ahorro.")
+        return texto
+
+def _numpy():
+    # NumPy solo se importa cuando se usa GastosBatch; el resto de la aplicación no lo necesita
+    import numpy
+    return numpy
+
+class GastosBatch:
+    """
+    Gastos variables en columnas de NumPy (un arreglo por campo en lugar de un
+    objeto por fila) para análisis vectorizados: ids, codigos (posición en
+    CATEGORIES), centavos (enteros, como en la base) y fechas (datetime64[D]), en
+    orden cronológico. Las sumas se hacen en centavos, así que son exactas.
+    """
+    __slots__ = ("ids", "codigos", "centavos", "fechas")
+
+    def __init__(self, ids, codigos, centavos, fechas):
+        self.ids = ids
+        self.codigos = codigos
+        self.centavos = centavos
+        self.fechas = fechas
+
+    @property
+    def montos(self):
+        # en unidades, como float (para filtros y percentiles)
+        return self.centavos / 100
+
+    @classmethod
+    def desde_cursor(cls, cursor) -> "GastosBatch":
+        """
+        Carga las filas (id, codigo, centavos, dia) de
+        db_manager.cursor_gastos_variables_columnas directo a los arreglos.
+        """
+        np = _numpy()
+        filas = np.fromiter(cursor, dtype=[("id", "i8"), ("codigo", "i2"), ("centavos", "i8"), ("dia", "i4")])
+        codigos = filas["codigo"].copy()
+        # categorías desconocidas cuentan como "Otros", igual que en el importador
+        codigos[codigos < 0] = CATEGORIES.index("Otros")
+        return cls(filas["id"].copy(), codigos, filas["centavos"].copy(), filas["dia"].astype("datetime64[D]"))
+
+    @classmethod
+    def desde_db(cls, usuario_id: int, desde: str = None, hasta: str = None) -> "GastosBatch":
+        return cls.desde_cursor(_datos.cursor_gastos_variables_columnas(usuario_id, CATEGORIES, desde, hasta))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def filtrar(self, mascara) -> "GastosBatch":
+        """
+        Subconjunto por máscara booleana, p. ej. batch.filtrar(batch.montos > 100).
+        """
+        return GastosBatch(self.ids[mascara], self.codigos[mascara], self.centavos[mascara], self.fechas[mascara])
+
+    def total(self) -> float:
+        return int(self.centavos.sum()) / 100
+
+    def por_categoria(self) -> dict:
+        """
+        {categoria: total} para todas las CATEGORIES (0.0 si no hay gastos).
+        """
+        np = _numpy()
+        # los pesos pasan a float64, que representa exacto cualquier suma de centavos hasta 2**53
+        totales = np.bincount(self.codigos, weights=self.centavos, minlength=len(CATEGORIES))
+        return {c: float(t) / 100 for c, t in zip(CATEGORIES, totales)}
+
+    def conteo_por_categoria(self) -> dict:
+        np = _numpy()
+        cuentas = np.bincount(self.codigos, minlength=len(CATEGORIES))
+        return {c: int(n) for c, n in zip(CATEGORIES, cuentas)}
+
+    def por_mes(self) -> dict:
+        """
+        {"YYYY-MM": total} de los meses con gastos, en orden cronológico.
+        """
+        np = _numpy()
+        meses, inverso = np.unique(self.fechas.astype("datetime64[M]"), return_inverse=True)
+        totales = np.bincount(inverso, weights=self.centavos, minlength=len(meses))
+        return {str(m): float(t) / 100 for m, t in zip(meses, totales)}
+
+    def percentiles(self, qs=(50, 90, 95), categoria: str = None) -> dict:
+        """
+        {q: monto} de los montos (de una sola categoría si se indica). Vacío si no hay gastos.
+        """
+        np = _numpy()
+        montos = self.montos if categoria is None else self.montos[self.codigos == CATEGORIES.index(categoria)]
+        if not len(montos):
+            return {}
+        return {q: round(float(v), 2) for q, v in zip(qs, np.percentile(montos, qs))}
+
+class CacheUsuarios:
+    """
+    Mapa de identidad con política LRU: dentro del proceso hay un solo objeto
+    Usuario por id, junto con su resumen ya calculado. Con db_manager cada
+    escritura llega como evento (eventos.py) y el objeto afectado se corrige con
+    la diferencia, sin volver a consultar; otras capas de datos solo avisan qué
+    usuario cambió y su entrada se invalida. Lo que escriben otros procesos no
+    genera eventos: validar() lo detecta (db_manager.cambios_externos) y vacía todo.
+    Solo los objetos que están en el mapa reciben los eventos, así que solo
+    ellos guardan su resumen: al salir (desalojo, invalidación, limpiar) lo
+    pierden y desde entonces cada summary() consulta la base.
+    """
+    def __init__(self, capacidad: int = 256):
+        self.capacidad = capacidad
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.resumen_hits = 0
+        self.resumen_misses = 0
+        self.invalidaciones = 0
+        self.eventos = 0
+
+    def get(self, usuario_id: int):
+        with self._lock:
+            u = self._items.get(usuario_id)
+            if u is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(usuario_id)
+            self.hits += 1
+            return u
+
+    def put(self, u: "Usuario"):
+        with self._lock:
+            anterior = self._items.get(u.id)
+            fuera = [anterior] if anterior is not None and anterior is not u else []
+            self._items[u.id] = u
+            self._items.move_to_end(u.id)
+            while len(self._items) > self.capacidad:
+                fuera.append(self._items.popitem(last=False)[1])
+        for viejo in fuera:
+            viejo._invalidar()
+
+    def contiene(self, u: "Usuario") -> bool:
+        # llamar con el lock tomado
+        return self._items.get(u.id) is u
+
+    def invalidar(self, usuario_id: Optional[int], tabla: Optional[str] = None):
+        """
+        Si cambió la fila del usuario se saca del mapa; si solo cambiaron sus
+        gastos el objeto se conserva y únicamente se descarta su resumen.
+        """
+        with self._lock:
+            self.invalidaciones += 1
+            if usuario_id is None:
+                afectados = list(self._items.values())
+                self._items.clear()
+            elif tabla == "usuarios":
+                u = self._items.pop(usuario_id, None)
+                afectados = [u] if u is not None else []
+            else:
+                u = self._items.get(usuario_id)
+                afectados = [u] if u is not None else []
+        for u in afectados:
+            u._invalidar()
+
+    def validar(self):
+        """
+        Vacía la caché si otro proceso escribió en la base desde la última vez
+        que se miró. Las escrituras de este proceso no: ya llegaron como
+        eventos. Solo con db_manager como capa.
+        """
+        if _datos is db_manager and _datos.cambios_externos():
+            self.invalidar(None)
+
+    def aplicar(self, evento: eventos.Evento):
+        if isinstance(evento, eventos.CambioGeneral):
+            # el objeto sigue valiendo; solo se descarta lo calculado
+            self.invalidar(evento.usuario_id)
+            return
+        with self._lock:
+            self.eventos += 1
+            if isinstance(evento, eventos.UsuarioEliminado):
+                u = self._items.pop(evento.usuario_id, None)
+            else:
+                u = self._items.get(evento.usuario_id)
+            if u is not None:
+                # bajo el lock: dos escrituras del mismo usuario desde hilos distintos no se pisan
+                u._aplicar(evento)
+
+    def limpiar(self):
+        self.invalidar(None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "tamano": len(self._items),
+                "capacidad": self.capacidad,
+                "hits": self.hits,
+                "misses": self.misses,
+                "resumen_hits": self.resumen_hits,
+                "resumen_misses": self.resumen_misses,
+                "invalidaciones": self.invalidaciones,
+                "eventos": self.eventos,
+            }
+
+cache_usuarios = CacheUsuarios()
+
+# Capa de datos en uso: db_manager (la base local) o un cliente con las mismas
+# funciones, como cliente.ClienteServicio. Solo db_manager publica eventos.
+_datos = db_manager
+
+def _conectar_cache(backend):
+    if backend is db_manager:
+        eventos.suscribir(cache_usuarios.aplicar)
+    else:
+        backend.add_write_listener(cache_usuarios.invalidar)
+
+def _desconectar_cache(backend):
+    if backend is db_manager:
+        eventos.cancelar(cache_usuarios.aplicar)
+    else:
+        backend.remove_write_listener(cache_usuarios.invalidar)
+
+_conectar_cache(_datos)
+
+def usar_backend(backend=None):
+    """
+    Cambia la capa de datos de Usuario y GastosBatch (None vuelve a db_manager).
+    La caché se vacía porque los objetos guardados venían de la anterior.
+    """
+    global _datos
+    _desconectar_cache(_datos)
+    _datos = backend if backend is not None else db_manager
+    _conectar_cache(_datos)
+    cache_usuarios.limpiar()
+
+def cache_stats() -> dict:
+    return cache_usuarios.stats()
+
 class Usuario:
     def __init__(self, id: int, nombre: str, ingreso: float, ahorro_porcentaje: float):
         self.id = id
         self.nombre = nombre
         self.ingreso = float(ingreso)
         self.ahorro_porcentaje = float(ahorro_porcentaje)
+        self._resumen = None
+        self._version = 0
+
+    def _invalidar(self):
+        # lo llama la caché cuando una escritura afecta a este usuario o cuando
+        # el objeto sale del mapa (ya no le llegarán los eventos)
+        self._resumen = None
+        self._version += 1
+
+    def _aplicar(self, evento: eventos.Evento):
+        # lo llama la caché con cada evento de este usuario: O(1), sin consultar
+        self._version += 1
+        r = self._resumen
+        if isinstance(evento, eventos.UsuarioActualizado):
+            _, self.nombre, ingreso, porcentaje = evento.fila
+            self.ingreso, self.ahorro_porcentaje = float(ingreso), float(porcentaje)
+            if r is not None:
+                self._resumen = r.con_cambios(ingreso=self.ingreso, ahorro_porcentaje=self.ahorro_porcentaje)
+        elif isinstance(evento, eventos.EventoGasto):
+            if r is not None:
+                if evento.tabla == "gastos_fijos":
+                    self._resumen = r.con_cambios(delta_fijos=evento.delta_centavos)
+                else:
+                    self._resumen = r.con_cambios(delta_variables=evento.delta_centavos)
+        elif isinstance(evento, eventos.UsuarioEliminado):
+            self._resumen = None
 
     @classmethod
     def create(cls, nombre: str, ingreso: float, ahorro_porcentaje: float) -> "Usuario":
-        uid = db_manager.insert_usuario_return_id(nombre, ingreso, ahorro_porcentaje)
-        return cls(uid, nombre, ingreso, ahorro_porcentaje)
+        uid = _datos.insert_usuario_return_id(nombre, ingreso, ahorro_porcentaje)
+        u = cls(uid, nombre, ingreso, ahorro_porcentaje)
+        cache_usuarios.put(u)
+        return u
 
     @classmethod
     def from_db(cls, usuario_id: int) -> Optional["Usuario"]:
-        row = db_manager.get_usuario(usuario_id)
+        cache_usuarios.validar()
+        u = cache_usuarios.get(usuario_id)
+        if u is not None:
+            return u
+        return cls._cargar(usuario_id)
+
+    @classmethod
+    def en_cache(cls, usuario_id: int) -> Optional["Usuario"]:
+        """
+        El usuario si ya está en la caché, sin consultar la base.
+        """
+        return cache_usuarios.get(usuario_id)
+
+    @classmethod
+    def _cargar(cls, usuario_id: int) -> Optional["Usuario"]:
+        row = _datos.get_usuario(usuario_id)
         if not row:
             return None
-        return cls(row[0], row[1], row[2], row[3])
+        u = cls(row[0], row[1], row[2], row[3])
+        cache_usuarios.put(u)
+        return u
+
+    def actualizar_ahorro(self, porcentaje: float) -> bool:
+        """
+        Guarda un nuevo porcentaje de ahorro sin tocar el resto de los datos del
+        usuario. Devuelve False si el usuario ya no existe.
+        """
+        row = _datos.update_ahorro_porcentaje(self.id, porcentaje)
+        if not row:
+            return False
+        self.nombre, self.ingreso, self.ahorro_porcentaje = row[1], float(row[2]), float(row[3])
+        return True
 
     def calcular_ahorro(self) -> float:
-        return round(self.ingreso * (self.ahorro_porcentaje / 100.0), 2)
+        # en centavos y puntos básicos, redondeando mitades hacia arriba como
+        # get_usuario_resumen (100.05 al 50 % da 50.03, no el 50.02 del float)
+        ingreso_c = round(self.ingreso * 100)
+        return (ingreso_c * round(self.ahorro_porcentaje * 100) + 5000) // 10000 / 100
 
     def gastos_fijos_totales(self) -> float:
-        return round(db_manager.total_gastos_fijos(self.id), 2)
+        return _datos.total_gastos_fijos(self.id)
 
     def gastos_variables_totales(self) -> float:
-        return round(db_manager.total_gastos_variables(self.id), 2)
+        return _datos.total_gastos_variables(self.id)
 
     def presupuesto_disponible(self) -> float:
         """
         Presupuesto real disponible considerando ahorro, gastos fijos y variables.
         """
-        ahorro = self.calcular_ahorro()
-        gastos_fijos = self.gastos_fijos_totales()
-        gastos_variables = self.gastos_variables_totales()
-        return round(self.ingreso - ahorro - gastos_fijos - gastos_variables, 2)
+        return self.summary().presupuesto_disponible
 
     def compromiso_total(self) -> float:
         """
         Total comprometido = ahorro + gastos fijos + gastos variables.
         """
-        return round(self.calcular_ahorro() + self.gastos_fijos_totales() + self.gastos_variables_totales(), 2)
+        return self.summary().compromiso_total
+
+    def summary(self) -> ResumenUsuario:
+        """
+        Ingreso, ahorro, totales y presupuesto obtenidos en una sola consulta.
+        El resultado queda guardado hasta la próxima escritura sobre este usuario.
+        """
+        cache_usuarios.validar()
+        resumen = self._resumen
+        if resumen is not None:
+            cache_usuarios.resumen_hits += 1
+            return resumen
+        cache_usuarios.resumen_misses += 1
+        version = self._version
+        calma = eventos.en_calma()
+        row = _datos.get_usuario_resumen(self.id)
+        if not row:
+            ahorro_c = round(self.calcular_ahorro() * 100)
+            ingreso_c = round(self.ingreso * 100)
+            return ResumenUsuario(ingreso_c / 100, ahorro_c / 100, 0.0, 0.0,
+                                  (ingreso_c - ahorro_c) / 100, ahorro_c / 100)
+        # la base suma en centavos: los valores ya vienen exactos, sin redondeo
+        resumen = ResumenUsuario(*row)
+        with cache_usuarios._lock:
+            # no se guarda si hubo una escritura mientras se consultaba: su evento
+            # ya llegó o está por llegar, y la diferencia se sumaría dos veces.
+            # Tampoco si el objeto ya no está en el mapa: no le llegarían más eventos
+            if (calma and version == self._version and eventos.en_calma()
+                    and cache_usuarios.contiene(self)):
+                self._resumen = resumen
+        return resumen
+
+    def resumen_en_cache(self) -> Optional[ResumenUsuario]:
+        """
+        El resumen guardado (ya corregido por las escrituras), o None si habría
+        que consultarlo.
+        """
+        return self._resumen
+
+    def totales_por_mes(self, desde: str = None, hasta: str = None) -> dict:
+        """
+        Gastos variables por mes {"YYYY-MM": total}, leídos de las tablas de resumen.
+        """
+        return {mes: total for mes, total, _ in _datos.get_resumen_mensual(self.id, desde, hasta)}
+
+    def totales_por_categoria(self, desde: str = None, hasta: str = None) -> dict:
+        """
+        Gastos variables por categoría {categoria: total}, leídos de las tablas de resumen.
+        """
+        return {cat: total for cat, total, _ in _datos.get_resumen_categorias(self.id, desde, hasta)}
 
     def agregar_gasto_fijo(self, categoria: str, monto: float):
-        db_manager.insert_gasto_fijo(self.id, categoria, monto)
+        _datos.insert_gasto_fijo(self.id, categoria, monto)
 
     def agregar_gasto_variable(self, categoria: str, monto: float, fecha: str = None):
         if fecha is None:
             fecha = datetime.date.today().isoformat()
-        db_manager.insert_gasto_variable(self.id, categoria, monto, fecha)
+        _datos.insert_gasto_variable(self.id, categoria, monto, fecha)
+
+    def importar_gastos(self, path: str, gastos_negativos: Optional[bool] = None):
+        """
+        Importa gastos variables desde un archivo CSV o extracto bancario.
+        Devuelve un importador.ResultadoImportacion con insertados/omitidos/abonos.
+        """
+        import importador
+        return importador.importar_gastos_variables(path, self.id, gastos_negativos)
+
+    def proyectar(self, meses: int = 12, escenarios=None, ventana: int = 6, tendencia: bool = False) -> List[dict]:
+        """
+        Proyección mes a mes del presupuesto (ver proyeccion.py): una serie por
+        escenario, como las devuelve Proyeccion.de_usuario. Requiere NumPy.
+        """
+        import proyeccion
+        p = proyeccion.proyectar([self.id], meses, escenarios, ventana, tendencia)
+        return [p.de_usuario(self.id, s) for s in range(len(p.escenarios))]
+
+    def obtener_gasto_fijo(self, gasto_id: int) -> Optional[GastoFijo]:
+        """
+        Un gasto fijo por id (None si no existe o es de otro usuario).
+        """
+        row = _datos.get_gasto_fijo(gasto_id)
+        if not row or row[1] != self.id:
+            return None
+        return GastoFijo(*row)
+
+    def obtener_gasto_variable(self, gasto_id: int) -> Optional[GastoVariable]:
+        row = _datos.get_gasto_variable(gasto_id)
+        if not row or row[1] != self.id:
+            return None
+        return GastoVariable(*row)
+
+    def actualizar_gasto_fijo(self, gasto_id: int, categoria: str, monto: float) -> Optional[GastoFijo]:
+        """
+        Actualiza un gasto fijo y devuelve cómo quedó guardado (None si ya no existe).
+        """
+        row = _datos.update_gasto_fijo(gasto_id, categoria, monto)
+        return GastoFijo(*row) if row else None
+
+    def actualizar_gasto_variable(self, gasto_id: int, categoria: str, monto: float,
+                                  fecha: str) -> Optional[GastoVariable]:
+        row = _datos.update_gasto_variable(gasto_id, categoria, monto, fecha)
+        return GastoVariable(*row) if row else None
 
     def listar_gastos_fijos(self) -> List[GastoFijo]:
-        rows = db_manager.get_gastos_fijos(self.id)
+        rows = _datos.get_gastos_fijos(self.id)
         return [GastoFijo(*r) for r in rows]
 
     def listar_gastos_variables(self) -> List[GastoVariable]:
-        rows = db_manager.get_gastos_variables(self.id)
-        return [GastoVariable(*r) for r in rows]
\ No newline at end of file
+        rows = _datos.get_gastos_variables(self.id)
+        return [GastoVariable(*r) for r in rows]
+
+    def gastos_batch(self, desde: str = None, hasta: str = None) -> GastosBatch:
+        """
+        Gastos variables en columnas (GastosBatch) para análisis; requiere NumPy.
+        """
+        return GastosBatch.desde_db(self.id, desde, hasta)
+
+    def iter_gastos_variables(self, desde: str = None, hasta: str = None, categorias=None,
+                              monto_min: float = None, monto_max: float = None,
+                              pagina: int = 500) -> Iterator[GastoVariable]:
+        """
+        Recorre los gastos variables en orden (fecha, id) de a `pagina` filas, sin
+        cargar todo el historial: la memoria usada no depende de cuántos gastos haya.
+        """
+        if categorias is not None:
+            categorias = list(categorias)
+        after = None
+        while True:
+            rows = _datos.query_gastos_variables(self.id, desde, hasta, categorias, monto_min, monto_max,
+                                                     after=after, limit=pagina)
+            for r in rows:
+                yield GastoVariable(*r)
+            if len(rows) < pagina:
+                return
+            after = (rows[-1][4], rows[-1][0])
+
+    # -------------------- asyncio --------------------
+    # Las consultas corren en los hilos de async_db. También lo ya guardado en la
+    # caché: validarlo contra otros procesos (data_version) consulta la base.
+    @classmethod
+    async def afrom_db(cls, usuario_id: int) -> Optional["Usuario"]:
+        import async_db
+        return await async_db.ejecutar(cls.from_db, usuario_id)
+
+    async def asummary(self) -> ResumenUsuario:
+        import async_db
+        return await async_db.ejecutar(self.summary)
+
+    async def aiter_gastos_variables(self, desde: str = None, hasta: str = None, categorias=None,
+                                     monto_min: float = None, monto_max: float = None,
+                                     pagina: int = 500) -> AsyncIterator[GastoVariable]:
+        """
+        Como iter_gastos_variables, pidiendo cada página en un hilo de base de datos.
+        """
+        import async_db
+        if categorias is not None:
+            categorias = list(categorias)
+        after = None
+        while True:
+            rows = await async_db.ejecutar(_datos.query_gastos_variables, self.id, desde, hasta, categorias,
+                                           monto_min, monto_max, after=after, limit=pagina)
+            for r in rows:
+                yield GastoVariable(*r)
+            if len(rows) < pagina:
+                return
+            after = (rows[-1][4], rows[-1][0])
+
+    async def agastos_batch(self, desde: str = None, hasta: str = None) -> GastosBatch:
+        import async_db
+        return await async_db.ejecutar(self.gastos_batch, desde, hasta)
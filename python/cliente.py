@@ -0,0 +1,108 @@
+"""
+Cliente de servicio.py con la misma interfaz que db_manager.
+
+    import clases, cliente
+    clases.usar_backend(cliente.ClienteServicio("http://127.0.0.1:8765"))
+
+Desde ahí Usuario lee y escribe a través del servicio sin cambiar nada más. Los
+avisos de escritura (add_write_listener) llegan por las escrituras hechas desde
+este cliente; las de otros procesos no se ven en la caché local.
+"""
+import http.client
+import json
+import select
+import sqlite3
+import threading
+import urllib.parse
+
+from servicio import ESCRITURAS, LECTURAS, PUERTO
+
+
+class ErrorServicio(Exception):
+    pass
+
+
+class ClienteServicio:
+    def __init__(self, url: str = f"http://127.0.0.1:{PUERTO}", timeout: float = 30.0):
+        partes = urllib.parse.urlsplit(url)
+        self.host = partes.hostname
+        self.puerto = partes.port or 80
+        self.timeout = timeout
+        # una conexión HTTP persistente por hilo, como db_manager con SQLite
+        self._conexiones = {}
+        self._lock = threading.Lock()
+        self._write_listeners = []
+
+    # -- misma interfaz que db_manager --
+    def add_write_listener(self, fn):
+        if fn not in self._write_listeners:
+            self._write_listeners.append(fn)
+
+    def remove_write_listener(self, fn):
+        if fn in self._write_listeners:
+            self._write_listeners.remove(fn)
+
+    def __getattr__(self, nombre):
+        if nombre not in LECTURAS and nombre not in ESCRITURAS:
+            raise AttributeError(nombre)
+
+        def llamada(*args, **kwargs):
+            return self.llamar(nombre, *args, **kwargs)
+        llamada.__name__ = nombre
+        return llamada
+
+    # -- transporte --
+    def _conexion(self) -> http.client.HTTPConnection:
+        tid = threading.get_ident()
+        conn = self._conexiones.get(tid)
+        if conn is None:
+            conn = http.client.HTTPConnection(self.host, self.puerto, timeout=self.timeout)
+            with self._lock:
+                self._conexiones[tid] = conn
+        return conn
+
+    def _post(self, ruta: str, cuerpo: bytes, idempotente: bool):
+        for intento in range(2):
+            conn = self._conexion()
+            if not idempotente and conn.sock is not None and select.select([conn.sock], [], [], 0)[0]:
+                # una conexión ociosa legible es que el servidor la cerró: mejor
+                # abrir otra que mandar una escritura que no se puede reintentar
+                conn.close()
+            enviado = False
+            try:
+                conn.request("POST", ruta, cuerpo, {"Content-Type": "application/json"})
+                enviado = True
+                respuesta = conn.getresponse()
+                return respuesta.status, respuesta.read()
+            except (ConnectionError, http.client.HTTPException):
+                conn.close()
+                with self._lock:
+                    self._conexiones.pop(threading.get_ident(), None)
+                # el servidor cerró la conexión persistente: se reintenta una vez
+                # con otra, salvo una escritura que ya salió y pudo aplicarse
+                if intento or (enviado and not idempotente):
+                    raise
+
+    def llamar(self, nombre: str, *args, **kwargs):
+        cuerpo = json.dumps({"args": list(args), "kwargs": kwargs}).encode("utf-8")
+        estado, datos = self._post(f"/api/{nombre}", cuerpo, nombre in LECTURAS)
+        respuesta = json.loads(datos)
+        if estado == 409:
+            raise sqlite3.IntegrityError(respuesta["error"])
+        if estado != 200:
+            raise ErrorServicio(f"{nombre}: {respuesta.get('error')} (HTTP {estado})")
+        for usuario_id, tabla in respuesta.get("cambios", ()):
+            for fn in list(self._write_listeners):
+                fn(usuario_id, tabla)
+        resultado = respuesta["resultado"]
+        if respuesta["tipo"] == "fila":
+            return tuple(resultado)
+        if respuesta["tipo"] == "filas":
+            return [tuple(r) for r in resultado]
+        return resultado
+
+    def cerrar(self):
+        with self._lock:
+            for conn in self._conexiones.values():
+                conn.close()
+            self._conexiones.clear()
@@ -1,212 +1,1973 @@
+import atexit
+import contextlib
+import functools
+import heapq
+import inspect
+import itertools
+import os
+import pathlib
+import queue
+import random
 import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-DB_NAME = "gastos.db"
+import eventos
+
+# Ruta de la base de datos. Se puede cambiar con la variable de entorno GASTOS_DB
+# o con init_db(path).
+DB_NAME = os.environ.get("GASTOS_DB", "gastos.db")
 
 # -------------------- Conexión --------------------
+# Se mantiene una conexión abierta por hilo en lugar de abrir y cerrar el archivo
+# en cada llamada. Cada conexión guarda sus sentencias ya compiladas en una caché,
+# así que repetir una consulta no vuelve a prepararla.
+# Las conexiones se indexan por el id del hilo y no con threading.local: los hilos
+# de QThreadPool pierden el estado local de Python entre una tarea y la siguiente.
+STATEMENT_CACHE_SIZE = 128
+
+_conexiones = {}
+_conexiones_lock = threading.Lock()
+
+# Al activar o desactivar las trazas sube la generación: cada hilo reabre sus
+# conexiones en su próximo get_connection, cuando no tiene una transacción a
+# medias. Nunca se le cierra la conexión a otro hilo.
+_generacion = 0
+_generacion_de = {}  # id del hilo -> generación de su conexión
+
+# Rutas sobre las que ya se aplicaron las migraciones en este proceso
+_inicializadas = set()
+_init_lock = threading.Lock()
+
+# Modo solo lectura (init_db(..., solo_lectura=True)): para procesos que solo
+# generan reportes. No aplica migraciones.
+_solo_lectura = False
+
+# -------------------- Concurrencia entre procesos --------------------
+# Varios procesos (dos copias de la interfaz, un script, reportes.py) pueden usar
+# el mismo archivo. Con WAL los lectores no bloquean al escritor ni el escritor a
+# los lectores; escribe uno a la vez y los demás esperan hasta BUSY_TIMEOUT_MS.
+# Si después de eso la base sigue ocupada, las escrituras se reintentan hasta
+# REINTENTOS veces con espera exponencial. GASTOS_WAL=0 no toca el modo de diario.
+WAL = os.environ.get("GASTOS_WAL", "1") != "0"
+BUSY_TIMEOUT_MS = int(os.environ.get("GASTOS_BUSY_TIMEOUT_MS", "5000"))
+REINTENTOS = 5
+ESPERA_INICIAL = 0.05  # segundos; se duplica en cada reintento
+
+_bloqueos = {"reintentos": 0, "fallidas": 0}
+
+def _es_bloqueo(e):
+    mensaje = str(e)
+    return "locked" in mensaje or "busy" in mensaje
+
+def _reintentar(fn, *args, **kwargs):
+    """
+    Llama a fn y, si la base está bloqueada por otro proceso, vuelve a intentarlo.
+    Dentro de escrituras_agrupadas no se reintenta: la transacción es del grupo.
+    """
+    espera = ESPERA_INICIAL
+    for intento in range(REINTENTOS + 1):
+        try:
+            return fn(*args, **kwargs)
+        except sqlite3.OperationalError as e:
+            tid = threading.get_ident()
+            if not _es_bloqueo(e) or tid in _grupos:
+                raise
+            if intento == REINTENTOS:
+                _bloqueos["fallidas"] += 1
+                raise
+            for conn in _conexiones_del_hilo(tid):
+                if conn.in_transaction:
+                    # un COMMIT que no pudo completarse deja la transacción abierta
+                    conn.rollback()
+            _bloqueos["reintentos"] += 1
+            time.sleep(espera * random.uniform(0.5, 1.5))
+            espera *= 2
+
+def _con_reintentos(fn):
+    @functools.wraps(fn)
+    def envoltura(*args, **kwargs):
+        return _reintentar(fn, *args, **kwargs)
+    return envoltura
+
+def concurrencia_stats():
+    return {"wal": WAL, "busy_timeout_ms": BUSY_TIMEOUT_MS, **_bloqueos}
+
+def _configure_connection(conn):
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    if WAL:
+        # con WAL basta sincronizar en cada checkpoint; un corte de luz puede
+        # perder los últimos commits, pero la base nunca queda corrupta
+        conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute("PRAGMA cache_size = -8000")  # ~8 MB de páginas en memoria
+
+def _open_connection(compartida=False, ruta=None):
+    ruta = ruta or DB_NAME
+    destino, uri = ruta, False
+    if _solo_lectura:
+        destino, uri = pathlib.Path(ruta).resolve().as_uri() + "?mode=ro", True
+    metricas = _metricas
+    if metricas is not None:
+        import instrumentacion
+        conn = sqlite3.connect(destino, uri=uri, cached_statements=STATEMENT_CACHE_SIZE, timeout=BUSY_TIMEOUT_MS / 1000,
+                               check_same_thread=not compartida, factory=instrumentacion.ConexionMedida)
+        conn.medir(metricas)
+    else:
+        conn = sqlite3.connect(destino, uri=uri, cached_statements=STATEMENT_CACHE_SIZE, timeout=BUSY_TIMEOUT_MS / 1000,
+                               check_same_thread=not compartida)
+    _configure_connection(conn)
+    if _solo_lectura:
+        conn.execute("PRAGMA query_only = ON")
+    elif ruta not in _inicializadas:
+        # primer uso de esta ruta en el proceso: el esquema se aplica una sola vez
+        with _init_lock:
+            if ruta not in _inicializadas:
+                if WAL:
+                    # queda guardado en el archivo: vale para todos los procesos
+                    _reintentar(conn.execute, "PRAGMA journal_mode = WAL")
+                migrate(conn)
+                _inicializadas.add(ruta)
+    if ruta == DB_NAME and _catalogo_de != DB_NAME:
+        _cargar_catalogo(conn)
+    return conn
+
 def get_connection():
-    return sqlite3.connect(DB_NAME)
+    tid = threading.get_ident()
+    if _diferida is not None and tid != _diferida.ident and _diferida.pendientes():
+        # escritura diferida: leer (o escribir) después de lo que ya está en cola;
+        # los errores de esas escrituras se informan en flush(), no aquí
+        _diferida.esperar(lanzar=False)
+    conn = _conexiones.get(tid)
+    if (conn is not None and _generacion_de.get(tid, _generacion) != _generacion and tid not in _grupos
+            and not any(c.in_transaction for c in _conexiones_del_hilo(tid))):
+        close_connection()
+        conn = None
+    if conn is None:
+        conn = _open_connection()
+        with _conexiones_lock:
+            _conexiones[tid] = conn
+            _generacion_de[tid] = _generacion
+    return conn
 
-# -------------------- Crear Tablas --------------------
-def create_tables():
+def init_db(path=None, solo_lectura=False):
+    """
+    Punto de arranque de la capa de datos: fija la ruta de la base (por defecto
+    DB_NAME) y aplica las migraciones pendientes. Es idempotente; llamarla otra vez
+    con la misma ruta no hace nada. Importar este módulo no abre ninguna conexión.
+    Con solo_lectura=True las conexiones se abren en modo "ro" y no se migra nada.
+    Devuelve la ruta en uso.
+    """
+    global DB_NAME, _solo_lectura
+    if os.environ.get("GASTOS_TRAZAS") == "1":
+        habilitar_trazas()
+    if os.environ.get("GASTOS_ESCRITURA_DIFERIDA") == "1" and not solo_lectura:
+        habilitar_escritura_diferida()
+    path = path or DB_NAME
+    if path != DB_NAME or solo_lectura != _solo_lectura:
+        flush()
+        close_all_connections()
+        DB_NAME = path
+        _solo_lectura = solo_lectura
+    get_connection()
+    return DB_NAME
+
+def abrir_conexion(shard=0):
+    """
+    Conexión nueva que no queda asociada a ningún hilo y se puede pasar de un hilo
+    a otro (para pools de conexiones, ver conexion_prestada). Quien la abre la cierra.
+    Con shards, `shard` elige el archivo (0 es el principal).
+    """
+    get_connection()  # asegura las migraciones antes de repartir conexiones
+    return _open_connection(compartida=True, ruta=_shards.get(shard))
+
+@contextlib.contextmanager
+def conexion_prestada(conn, shards=None):
+    """
+    Dentro del bloque, las funciones de este módulo usan `conn` en el hilo actual
+    en lugar de su conexión propia. Con shards, `shards` ({número: conexión}, de
+    abrir_conexion(número)) presta también las de los otros archivos; las
+    consultas que recorren todos los shards las usan desde sus hilos. Los shards
+    que falten se consultan con las conexiones de siempre.
+    """
+    tid = threading.get_ident()
+    shards = {numero: c for numero, c in (shards or {}).items() if numero != 0}
+    with _conexiones_lock:
+        anterior = _conexiones.get(tid)
+        anteriores = {numero: _conexiones_shard.get((tid, numero)) for numero in shards}
+        prestadas = _prestadas.get(tid)
+        # la prestada no se renueva: es de quien la prestó
+        generacion = _generacion_de.pop(tid, None)
+        _conexiones[tid] = conn
+        for numero, c in shards.items():
+            _conexiones_shard[(tid, numero)] = c
+        _prestadas[tid] = {0: conn, **shards}
+    try:
+        yield conn
+    finally:
+        with _conexiones_lock:
+            if anterior is None:
+                _conexiones.pop(tid, None)
+            else:
+                _conexiones[tid] = anterior
+            for numero, c in anteriores.items():
+                if c is None:
+                    _conexiones_shard.pop((tid, numero), None)
+                else:
+                    _conexiones_shard[(tid, numero)] = c
+            if prestadas is None:
+                _prestadas.pop(tid, None)
+            else:
+                _prestadas[tid] = prestadas
+            if generacion is not None:
+                _generacion_de[tid] = generacion
+
+def close_connection():
+    """
+    Cierra las conexiones del hilo actual (se vuelven a abrir en el siguiente uso).
+    """
+    tid = threading.get_ident()
+    conexiones = _conexiones_del_hilo(tid)
+    with _conexiones_lock:
+        _conexiones.pop(tid, None)
+        _generacion_de.pop(tid, None)
+        for clave in [c for c in _conexiones_shard if c[0] == tid]:
+            del _conexiones_shard[clave]
+    for conn in conexiones:
+        conn.close()
+
+def close_all_connections():
+    """
+    Cierra las conexiones del hilo actual y descarta las de los demás hilos
+    (sqlite3 solo permite cerrarlas desde su propio hilo; se liberan al recolectarlas).
+    """
+    close_connection()
+    with _conexiones_lock:
+        _conexiones.clear()
+        _conexiones_shard.clear()
+        _generacion_de.clear()
+    with _monitor_lock:
+        for conn in _monitor.values():
+            conn.close()
+        _monitor.clear()
+        _version_vista.clear()
+
+def _conexiones_del_hilo(tid):
+    with _conexiones_lock:
+        conexiones = [c for (t, _), c in _conexiones_shard.items() if t == tid]
+        if tid in _conexiones:
+            conexiones.insert(0, _conexiones[tid])
+    return conexiones
+
+# -------------------- Shards --------------------
+# Opcionalmente la base se reparte en varios archivos (crear_shards): cada usuario
+# vive, con todos sus gastos y resúmenes, en uno solo de ellos, así que las
+# consultas de un usuario no recorren los datos de los demás y las escrituras en
+# shards distintos no se bloquean entre sí. El archivo principal (DB_NAME) es el
+# shard 0 y además guarda el catálogo: la tabla shards con los otros archivos y
+# shard_usuarios, que asigna a cada usuario su shard y reparte ids únicos entre
+# todos. Los ids de gastos también son únicos: el shard n los toma del rango que
+# empieza en n * RANGO_IDS_SHARD, así que el id alcanza para saber dónde buscar.
+# Las funciones de este módulo resuelven el shard solas; las que recorren a todos
+# los usuarios consultan cada shard en paralelo y juntan los resultados.
+# Con el catálogo vacío (lo normal) todo va al archivo principal, como siempre.
+RANGO_IDS_SHARD = 1 << 40
+HILOS_SHARDS = 8
+
+_shards = {}  # número -> ruta, sin el 0
+_catalogo_de = None  # DB_NAME del que se leyó _shards
+_shard_usuarios = {}  # usuario_id -> shard, a medida que se consultan
+_conexiones_shard = {}  # (id del hilo, shard) -> conexión
+_prestadas = {}  # id del hilo -> {shard: conexión} de conexion_prestada
+_pool_shards = None
+
+def _cargar_catalogo(conn):
+    global _shards, _catalogo_de
+    try:
+        filas = conn.execute("SELECT numero, archivo FROM shards ORDER BY numero").fetchall()
+    except sqlite3.OperationalError:
+        filas = []  # base anterior a la migración 7 abierta en solo lectura
+    carpeta = os.path.dirname(os.path.abspath(DB_NAME))
+    _shards = {numero: os.path.join(carpeta, archivo) for numero, archivo in filas}
+    _shard_usuarios.clear()
+    _catalogo_de = DB_NAME
+
+def _num_shards():
+    return len(_shards) + 1
+
+def ruta_shard(ruta, numero):
+    """
+    Archivo del shard `numero` de la base `ruta`: gastos.db -> gastos.shard1.db.
+    """
+    base, extension = os.path.splitext(ruta)
+    return f"{base}.shard{numero}{extension}"
+
+def shards():
+    """
+    {número: ruta} de los archivos de la base; con un solo archivo, {0: DB_NAME}.
+    """
+    get_connection()
+    return {0: DB_NAME, **_shards}
+
+# -------------------- Cambios de otros procesos --------------------
+# PRAGMA data_version cambia cuando confirma cualquier otra conexión, también las
+# de los otros hilos de este proceso. Para separar unas de otras, una conexión
+# aparte por archivo (solo para mirar data_version) se vuelve a leer al final de
+# cada escritura de este módulo, antes de que termine eventos.escritura(): lo que
+# esa conexión vea cambiado fuera de esos momentos lo escribió otro proceso.
+_monitor = {}  # ruta -> conexión para PRAGMA data_version
+_version_vista = {}  # ruta -> último data_version ya explicado
+_monitor_lock = threading.Lock()
+
+def _versiones_monitor(rutas):
+    # con _monitor_lock tomado
+    versiones = {}
+    for ruta in rutas:
+        conn = _monitor.get(ruta)
+        if conn is None:
+            conn = _monitor[ruta] = _open_connection(compartida=True, ruta=ruta)
+        versiones[ruta] = conn.execute("PRAGMA data_version").fetchone()[0]
+    return versiones
+
+def _escritura_propia_confirmada():
+    with _monitor_lock:
+        if _monitor:
+            _version_vista.update(_versiones_monitor(list(_monitor)))
+
+def cambios_externos():
+    """
+    True si otro proceso confirmó algo en la base (cualquier archivo, con shards)
+    desde la llamada anterior. Lo que confirman los hilos de este proceso no
+    cuenta: eso ya se publica como eventos. La primera llamada solo toma la
+    referencia.
+    """
+    rutas = list(shards().values())
+    with _monitor_lock:
+        versiones = _versiones_monitor(rutas)
+        # una escritura propia confirmada pero todavía no anotada no puede
+        # anotarse mientras tenemos el lock, y sigue contando como en curso
+        if not eventos.en_calma():
+            return False
+        cambio = any(_version_vista.get(r, v) != v for r, v in versiones.items())
+        _version_vista.update(versiones)
+    return cambio
+
+def _conexion_shard(numero):
     conn = get_connection()
-    cursor = conn.cursor()
-
-    # Tabla de usuarios
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS usuarios (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        nombre TEXT NOT NULL,
-        ingreso REAL NOT NULL,
-        ahorro_porcentaje REAL NOT NULL
-    )
-    """)
-
-    # Tabla de gastos fijos
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS gastos_fijos (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        usuario_id INTEGER NOT NULL,
-        categoria TEXT NOT NULL,
-        monto REAL NOT NULL,
-        FOREIGN KEY(usuario_id) REFERENCES usuarios(id)
-    )
-    """)
-
-    # Tabla de gastos variables
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS gastos_variables (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        usuario_id INTEGER NOT NULL,
-        categoria TEXT NOT NULL,
-        monto REAL NOT NULL,
-        fecha TEXT NOT NULL,
-        FOREIGN KEY(usuario_id) REFERENCES usuarios(id)
-    )
-    """)
+    if numero == 0:
+        return conn
+    clave = (threading.get_ident(), numero)
+    conn = _conexiones_shard.get(clave)
+    if conn is None:
+        conn = _open_connection(ruta=_shards[numero])
+        with _conexiones_lock:
+            _conexiones_shard[clave] = conn
+    return conn
+
+def _shard_de_usuario(usuario_id):
+    if not _shards:
+        return 0
+    shard = _shard_usuarios.get(usuario_id)
+    if shard is None:
+        row = get_connection().execute("SELECT shard FROM shard_usuarios WHERE usuario_id = ?",
+                                       (usuario_id,)).fetchone()
+        if row is None:
+            # no existe: las consultas no encuentran nada, igual que con un solo archivo
+            return 0
+        shard = _shard_usuarios[usuario_id] = row[0]
+    return shard
+
+def _shard_de_gasto(gasto_id):
+    if not _shards:
+        return 0
+    shard = gasto_id // RANGO_IDS_SHARD
+    return shard if shard in _shards else 0
+
+def _conexion_usuario(usuario_id):
+    return _conexion_shard(_shard_de_usuario(usuario_id))
+
+def _conexion_gasto(gasto_id):
+    return _conexion_shard(_shard_de_gasto(gasto_id))
+
+def _en_paralelo(fn):
+    """
+    Llama a fn(conn) una vez por shard, cada una en un hilo con sus propias
+    conexiones, y devuelve los resultados en orden de shard. Con un solo archivo
+    llama a fn(conn) aquí mismo.
+    """
+    global _pool_shards
+    if not _shards:
+        return [fn(get_connection())]
+    with _conexiones_lock:
+        if _pool_shards is None:
+            _pool_shards = ThreadPoolExecutor(HILOS_SHARDS, thread_name_prefix="shard")
+    # las conexiones prestadas se pueden usar desde otro hilo (abrir_conexion) y
+    # cada una la toma un solo hilo del pool mientras este espera
+    prestadas = _prestadas.get(threading.get_ident(), {})
+    futuros = [_pool_shards.submit(lambda n=n: fn(prestadas[n] if n in prestadas else _conexion_shard(n)))
+               for n in range(_num_shards())]
+    return [f.result() for f in futuros]
+
+def _unir_cursores(fn, ordenado=False):
+    """
+    fn(conn) devuelve un cursor; con shards se abre uno por shard en este hilo y se
+    recorren uno detrás de otro, o intercalados si cada uno viene ordenado.
+    """
+    if not _shards:
+        return fn(get_connection())
+    cursores = [fn(_conexion_shard(n)) for n in range(_num_shards())]
+    return heapq.merge(*cursores) if ordenado else itertools.chain(*cursores)
+
+# -------------------- Avisos de escritura --------------------
+# Funciones que se llaman como fn(usuario_id, tabla) después de cada escritura
+# confirmada (las usa la caché de clases.Usuario). usuario_id es None cuando pudo
+# cambiar cualquier usuario, por ejemplo al reconstruir los resúmenes.
+_write_listeners = []
+
+def add_write_listener(fn):
+    if fn not in _write_listeners:
+        _write_listeners.append(fn)
+
+def remove_write_listener(fn):
+    if fn in _write_listeners:
+        _write_listeners.remove(fn)
+
+def _notify_write(usuario_id, tabla):
+    pendientes = _grupos.get(threading.get_ident())
+    if pendientes is not None:
+        # dentro de escrituras_agrupadas: se avisa recién después del commit
+        pendientes.append((usuario_id, tabla))
+        return
+    for fn in list(_write_listeners):
+        fn(usuario_id, tabla)
+
+# Además de esos avisos, cada escritura emite dentro de su transacción un evento
+# con el detalle (eventos.py). Se juntan por hilo y se publican después del
+# commit de la transacción más externa o del grupo; si algo se deshace, sus
+# eventos se descartan con él.
+_eventos = {}  # id del hilo -> eventos de la transacción abierta
+
+def _emitir(evento):
+    lote = _eventos.get(threading.get_ident())
+    if lote is None:
+        # fuera de una transacción: lo que describe ya está confirmado
+        eventos.publicar((evento,))
+    else:
+        lote.append(evento)
+
+@contextlib.contextmanager
+def _eventos_al_confirmar():
+    tid = threading.get_ident()
+    lote = _eventos.get(tid)
+    if lote is not None:
+        # transacción anidada: publica la de afuera
+        marca = len(lote)
+        try:
+            yield
+        except BaseException:
+            del lote[marca:]
+            raise
+        return
+    lote = _eventos[tid] = []
+    with eventos.escritura():
+        try:
+            yield
+            _escritura_propia_confirmada()
+        finally:
+            del _eventos[tid]
+        eventos.publicar(lote)
+
+# -------------------- Transacciones --------------------
+# Cada escritura corre en su propia transacción, salvo dentro de
+# escrituras_agrupadas(): ahí todas las del hilo comparten una sola transacción
+# (un solo commit) y cada una queda aislada en un SAVEPOINT, así que si una falla
+# se deshace solo esa.
+# Las que leen antes de escribir usan inmediata=True (BEGIN IMMEDIATE): toman el
+# permiso de escritura al empezar, así otro proceso no puede cambiar lo leído y
+# la espera por el bloqueo ocurre al principio, donde el busy_timeout sí aplica.
+# Con shards, la primera escritura del grupo en cada archivo abre ahí su propia
+# transacción; al final se confirman una detrás de otra.
+_grupos = {}  # id del hilo -> avisos pendientes hasta el commit
+_grupos_conexiones = {}  # id del hilo -> conexiones con la transacción del grupo abierta
+
+@contextlib.contextmanager
+def _transaccion(conn, inmediata=False):
+    tid = threading.get_ident()
+    if tid not in _grupos:
+        with _eventos_al_confirmar():
+            if not inmediata:
+                with conn:
+                    yield conn
+                return
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+        return
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+        _grupos_conexiones[tid].append(conn)
+    lote = _eventos[tid]
+    marca = len(lote)
+    conn.execute("SAVEPOINT escritura")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK TO escritura")
+        conn.execute("RELEASE escritura")
+        del lote[marca:]
+        raise
+    conn.execute("RELEASE escritura")
+
+@contextlib.contextmanager
+def escrituras_agrupadas():
+    """
+    Agrupa las escrituras del hilo actual en una sola transacción (group commit).
+    Devuelve la lista de (usuario_id, tabla) que se van registrando; los avisos
+    a los listeners y los eventos se envían recién cuando el commit terminó bien.
+    Con shards, cada archivo tocado confirma por separado.
+    """
+    tid = threading.get_ident()
+    if tid in _grupos:
+        raise RuntimeError("escrituras_agrupadas no se puede anidar")
+    conn = get_connection()
+    # el grupo entero escribe: se toma el bloqueo de escritura desde el inicio
+    _reintentar(conn.execute, "BEGIN IMMEDIATE")
+    pendientes = _grupos[tid] = []
+    conexiones = _grupos_conexiones[tid] = [conn]
+    lote = _eventos[tid] = []
+    with eventos.escritura():
+        try:
+            yield pendientes
+            for c in conexiones:
+                c.commit()
+            _escritura_propia_confirmada()
+        except BaseException:
+            for c in conexiones:
+                c.rollback()
+            raise
+        finally:
+            del _grupos[tid]
+            del _grupos_conexiones[tid]
+            del _eventos[tid]
+        eventos.publicar(lote)
+    for usuario_id, tabla in pendientes:
+        for fn in list(_write_listeners):
+            fn(usuario_id, tabla)
+
+# -------------------- Escritura diferida --------------------
+# Modo opcional (habilitar_escritura_diferida() o GASTOS_ESCRITURA_DIFERIDA=1) para
+# cargas rápidas: insert_gasto_fijo / insert_gasto_variable se encolan y vuelven
+# enseguida, y un hilo las confirma en grupos de hasta `max_lote` o cada
+# `ventana_ms`, con un solo commit por grupo. Cualquier lectura, desde cualquier
+# hilo, espera antes a que la cola se vacíe, así que siempre se ven las escrituras
+# ya hechas. flush() (y la salida del programa) garantizan que todo quedó en disco.
+_diferida = None
+
+class ErrorEscrituraDiferida(Exception):
+    """
+    Escrituras diferidas que fallaron; `errores` guarda las excepciones originales.
+    """
+    def __init__(self, errores):
+        super().__init__(f"{len(errores)} escrituras diferidas fallaron: {errores[0]!r}")
+        self.errores = errores
+
+_DESPERTAR = object()  # marca en la cola: hay alguien esperando, confirmar ya
+
+class _EscritorDiferido(threading.Thread):
+    def __init__(self, max_lote, ventana_ms):
+        super().__init__(name="escritura-diferida", daemon=True)
+        self.max_lote = max_lote
+        self.ventana = ventana_ms / 1000.0
+        self._cola = queue.Queue()
+        self._cond = threading.Condition()
+        self._urgente = threading.Event()
+        self.encoladas = 0
+        self.confirmadas = 0
+        self.lotes = 0
+        self.errores = []
+
+    def encolar(self, fn, args):
+        with self._cond:
+            self.encoladas += 1
+            self._cola.put((fn, args))
+
+    def pendientes(self) -> bool:
+        return self.confirmadas < self.encoladas
+
+    def esperar(self, lanzar=True):
+        with self._cond:
+            objetivo = self.encoladas
+            if self.confirmadas < objetivo:
+                # que el escritor no espere el resto de la ventana
+                self._urgente.set()
+                self._cola.put(_DESPERTAR)
+                self._cond.wait_for(lambda: self.confirmadas >= objetivo)
+            if not lanzar:
+                return
+            errores, self.errores = self.errores, []
+        if errores:
+            raise ErrorEscrituraDiferida(errores)
+
+    def detener(self):
+        self._cola.put(None)
+        self._urgente.set()
+        self.join()
+
+    def _juntar(self, primero):
+        lote = [primero]
+        limite = time.monotonic() + self.ventana
+        while len(lote) < self.max_lote and lote[-1] is not None:
+            restante = limite - time.monotonic()
+            try:
+                if restante <= 0 or self._urgente.is_set():
+                    lote.append(self._cola.get_nowait())
+                else:
+                    lote.append(self._cola.get(timeout=restante))
+            except queue.Empty:
+                break
+        return lote
+
+    def run(self):
+        # cada escritura ya se contó en las métricas al encolarla
+        tid = threading.get_ident()
+        _en_llamada.add(tid)
+        try:
+            self._procesar()
+        finally:
+            _en_llamada.discard(tid)
+
+    def _procesar(self):
+        while True:
+            lote = self._juntar(self._cola.get())
+            fin = None in lote
+            lote = [x for x in lote if x is not None and x is not _DESPERTAR]
+            if not lote:
+                if fin:
+                    close_connection()
+                    return
+                continue
+            errores = []
+            try:
+                with escrituras_agrupadas():
+                    for fn, args in lote:
+                        try:
+                            fn(*args)
+                        except Exception as e:
+                            errores.append(e)
+            except Exception as e:
+                errores.append(e)
+            with self._cond:
+                self.confirmadas += len(lote)
+                self.lotes += 1
+                self.errores.extend(errores)
+                if not self.pendientes():
+                    self._urgente.clear()
+                self._cond.notify_all()
+            if fin:
+                close_connection()
+                return
+
+def _diferir(fn, args, usuario_id, tabla):
+    """
+    Encola la escritura si el modo diferido está activo y no estamos en el hilo
+    escritor ni dentro de escrituras_agrupadas(), que ya agrupa y debe tener la
+    escritura confirmada al salir. Devuelve True si quedó encolada.
+    """
+    tid = threading.get_ident()
+    if _diferida is None or tid == _diferida.ident or tid in _grupos:
+        return False
+    _diferida.encolar(fn, args)
+    # se avisa ya: quien tenga datos en caché los vuelve a leer, y esa lectura espera a la cola
+    _notify_write(usuario_id, tabla)
+    _emitir(eventos.CambioGeneral(usuario_id))
+    return True
+
+def habilitar_escritura_diferida(max_lote=500, ventana_ms=20):
+    global _diferida
+    if _diferida is not None:
+        return
+    _diferida = _EscritorDiferido(max_lote, ventana_ms)
+    _diferida.start()
+    atexit.register(deshabilitar_escritura_diferida)
+
+def deshabilitar_escritura_diferida():
+    """
+    Confirma lo pendiente y vuelve a escribir en cada llamada.
+    """
+    global _diferida
+    escritor = _diferida
+    if escritor is None:
+        return
+    try:
+        escritor.esperar()
+    finally:
+        _diferida = None
+        escritor.detener()
+        atexit.unregister(deshabilitar_escritura_diferida)
+
+def flush():
+    """
+    Espera a que todas las escrituras diferidas encoladas hasta ahora estén
+    confirmadas. Lanza ErrorEscrituraDiferida si alguna falló. Sin el modo
+    diferido no hace nada.
+    """
+    escritor = _diferida
+    if escritor is not None:
+        escritor.esperar()
+
+def escritura_diferida_stats():
+    escritor = _diferida
+    if escritor is None:
+        return None
+    return {"encoladas": escritor.encoladas, "confirmadas": escritor.confirmadas, "lotes": escritor.lotes}
+
+# -------------------- Trazas y métricas --------------------
+# Modo opcional (apagado por defecto, o GASTOS_TRAZAS=1): cada función pública se
+# envuelve para contar llamadas, latencia y filas devueltas, y las conexiones nuevas
+# miden cada sentencia y cada commit (ver instrumentacion.py).
+_metricas = None
+_originales = {}
+# Hilos dentro de una función pública instrumentada: las que esta llame (como
+# insert_usuario -> insert_usuario_return_id) no se cuentan otra vez. Por id del
+# hilo, como las conexiones.
+_en_llamada = set()
+
+# Infraestructura que no se instrumenta
+_NO_INSTRUMENTAR = {
+    "get_connection", "init_db", "close_connection", "close_all_connections", "abrir_conexion",
+    "conexion_prestada", "escrituras_agrupadas",
+    "add_write_listener", "remove_write_listener", "create_tables", "migrate", "get_schema_version",
+    "habilitar_trazas", "deshabilitar_trazas", "metricas", "iniciar_accion",
+    "habilitar_escritura_diferida", "deshabilitar_escritura_diferida", "flush", "escritura_diferida_stats",
+    "concurrencia_stats", "shards", "ruta_shard", "cambios_externos",
+}
+
+def _contar_filas(resultado):
+    if isinstance(resultado, list):
+        return len(resultado)
+    if isinstance(resultado, tuple):
+        return 1
+    return 0
+
+def _instrumentar(nombre, fn):
+    @functools.wraps(fn)
+    def envoltura(*args, **kwargs):
+        # deshabilitar_trazas() puede correr desde otro hilo en plena llamada:
+        # se registra en las métricas vigentes al empezar
+        metricas = _metricas
+        tid = threading.get_ident()
+        if metricas is None or tid in _en_llamada:
+            return fn(*args, **kwargs)
+        _en_llamada.add(tid)
+        t0 = time.perf_counter()
+        try:
+            resultado = fn(*args, **kwargs)
+        except Exception:
+            metricas.registrar_funcion(nombre, (time.perf_counter() - t0) * 1000, 0, True)
+            raise
+        finally:
+            _en_llamada.discard(tid)
+        metricas.registrar_funcion(nombre, (time.perf_counter() - t0) * 1000, _contar_filas(resultado), False)
+        return resultado
+    return envoltura
+
+def habilitar_trazas(max_acciones=20):
+    """
+    Activa las métricas y devuelve el objeto instrumentacion.Metricas. Cada hilo
+    reabre su conexión (ya medida) en cuanto no tenga una transacción abierta.
+    """
+    global _metricas, _generacion
+    if _metricas is not None:
+        return _metricas
+    import instrumentacion
+    _metricas = instrumentacion.Metricas(max_acciones)
+    modulo = globals()
+    for nombre, fn in list(modulo.items()):
+        if (inspect.isfunction(fn) and fn.__module__ == __name__
+                and not nombre.startswith("_") and nombre not in _NO_INSTRUMENTAR):
+            _originales[nombre] = fn
+            modulo[nombre] = _instrumentar(nombre, fn)
+    _generacion += 1
+    return _metricas
+
+def deshabilitar_trazas():
+    global _metricas, _generacion
+    globals().update(_originales)
+    _originales.clear()
+    _metricas = None
+    _generacion += 1
+
+def metricas():
+    """
+    Métricas acumuladas, o None si las trazas están apagadas.
+    """
+    return _metricas
+
+def iniciar_accion(nombre):
+    """
+    Marca el comienzo de una acción de la interfaz; las llamadas siguientes se le
+    atribuyen hasta que empiece otra. No hace nada con las trazas apagadas.
+    """
+    metricas = _metricas
+    if metricas is not None:
+        metricas.iniciar_accion(nombre)
+
+# Filas por transacción en las inserciones masivas
+BULK_CHUNK_SIZE = 5000
+
+# -------------------- Esquema y migraciones --------------------
+# Triggers que mantienen resumen_mensual y resumen_fijos al día (migración 4;
+# la 6 los vuelve a crear al reconstruir las tablas de gastos)
+_TRIGGERS_RESUMEN = [
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_gastos_variables_insert AFTER INSERT ON gastos_variables BEGIN
+        INSERT INTO resumen_mensual (usuario_id, mes, categoria, total, cantidad)
+        VALUES (NEW.usuario_id, substr(NEW.fecha, 1, 7), NEW.categoria, NEW.monto, 1)
+        ON CONFLICT (usuario_id, mes, categoria)
+        DO UPDATE SET total = total + excluded.total, cantidad = cantidad + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_gastos_variables_delete AFTER DELETE ON gastos_variables BEGIN
+        UPDATE resumen_mensual SET total = total - OLD.monto, cantidad = cantidad - 1
+        WHERE usuario_id = OLD.usuario_id AND mes = substr(OLD.fecha, 1, 7) AND categoria = OLD.categoria;
+        DELETE FROM resumen_mensual
+        WHERE usuario_id = OLD.usuario_id AND mes = substr(OLD.fecha, 1, 7) AND categoria = OLD.categoria
+          AND cantidad <= 0;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_gastos_variables_update
+    AFTER UPDATE OF usuario_id, categoria, monto, fecha ON gastos_variables BEGIN
+        UPDATE resumen_mensual SET total = total - OLD.monto, cantidad = cantidad - 1
+        WHERE usuario_id = OLD.usuario_id AND mes = substr(OLD.fecha, 1, 7) AND categoria = OLD.categoria;
+        DELETE FROM resumen_mensual
+        WHERE usuario_id = OLD.usuario_id AND mes = substr(OLD.fecha, 1, 7) AND categoria = OLD.categoria
+          AND cantidad <= 0;
+        INSERT INTO resumen_mensual (usuario_id, mes, categoria, total, cantidad)
+        VALUES (NEW.usuario_id, substr(NEW.fecha, 1, 7), NEW.categoria, NEW.monto, 1)
+        ON CONFLICT (usuario_id, mes, categoria)
+        DO UPDATE SET total = total + excluded.total, cantidad = cantidad + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_gastos_fijos_insert AFTER INSERT ON gastos_fijos BEGIN
+        INSERT INTO resumen_fijos (usuario_id, categoria, total, cantidad)
+        VALUES (NEW.usuario_id, NEW.categoria, NEW.monto, 1)
+        ON CONFLICT (usuario_id, categoria)
+        DO UPDATE SET total = total + excluded.total, cantidad = cantidad + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_gastos_fijos_delete AFTER DELETE ON gastos_fijos BEGIN
+        UPDATE resumen_fijos SET total = total - OLD.monto, cantidad = cantidad - 1
+        WHERE usuario_id = OLD.usuario_id AND categoria = OLD.categoria;
+        DELETE FROM resumen_fijos
+        WHERE usuario_id = OLD.usuario_id AND categoria = OLD.categoria AND cantidad <= 0;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_gastos_fijos_update
+    AFTER UPDATE OF usuario_id, categoria, monto ON gastos_fijos BEGIN
+        UPDATE resumen_fijos SET total = total - OLD.monto, cantidad = cantidad - 1
+        WHERE usuario_id = OLD.usuario_id AND categoria = OLD.categoria;
+        DELETE FROM resumen_fijos
+        WHERE usuario_id = OLD.usuario_id AND categoria = OLD.categoria AND cantidad <= 0;
+        INSERT INTO resumen_fijos (usuario_id, categoria, total, cantidad)
+        VALUES (NEW.usuario_id, NEW.categoria, NEW.monto, 1)
+        ON CONFLICT (usuario_id, categoria)
+        DO UPDATE SET total = total + excluded.total, cantidad = cantidad + 1;
+    END
+    """,
+]
+
+# Cada migración es (versión, [sentencias]). Se aplican en orden, una sola vez y
+# dentro de una transacción; la última versión aplicada queda en schema_version.
+# Para cambiar el esquema se agrega una migración nueva al final, nunca se edita
+# una ya publicada.
+MIGRATIONS = [
+    (1, [
+        # Tabla de usuarios
+        """
+        CREATE TABLE IF NOT EXISTS usuarios (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nombre TEXT NOT NULL,
+            ingreso REAL NOT NULL,
+            ahorro_porcentaje REAL NOT NULL
+        )
+        """,
+        # Tabla de gastos fijos
+        """
+        CREATE TABLE IF NOT EXISTS gastos_fijos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            usuario_id INTEGER NOT NULL,
+            categoria TEXT NOT NULL,
+            monto REAL NOT NULL,
+            FOREIGN KEY(usuario_id) REFERENCES usuarios(id)
+        )
+        """,
+        # Tabla de gastos variables
+        """
+        CREATE TABLE IF NOT EXISTS gastos_variables (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            usuario_id INTEGER NOT NULL,
+            categoria TEXT NOT NULL,
+            monto REAL NOT NULL,
+            fecha TEXT NOT NULL,
+            FOREIGN KEY(usuario_id) REFERENCES usuarios(id)
+        )
+        """,
+    ]),
+    (2, [
+        # Índices de cobertura: los totales por usuario se resuelven solo con el índice
+        "CREATE INDEX IF NOT EXISTS idx_gastos_fijos_usuario ON gastos_fijos(usuario_id, monto)",
+        "CREATE INDEX IF NOT EXISTS idx_gastos_variables_usuario_fecha ON gastos_variables(usuario_id, fecha, monto)",
+    ]),
+    (3, [
+        # Orden por categoría o monto en las tablas paginadas sin ordenar todo el historial
+        "CREATE INDEX IF NOT EXISTS idx_gastos_variables_usuario_categoria ON gastos_variables(usuario_id, categoria)",
+        "CREATE INDEX IF NOT EXISTS idx_gastos_variables_usuario_monto ON gastos_variables(usuario_id, monto)",
+    ]),
+    (4, [
+        # Totales acumulados por usuario/mes/categoría (variables) y por usuario/categoría
+        # (fijos). Los mantienen los triggers de abajo, así que los reportes y tendencias
+        # leen O(meses) filas en lugar de recorrer todo el historial.
+        """
+        CREATE TABLE IF NOT EXISTS resumen_mensual (
+            usuario_id INTEGER NOT NULL,
+            mes TEXT NOT NULL,
+            categoria TEXT NOT NULL,
+            total REAL NOT NULL,
+            cantidad INTEGER NOT NULL,
+            PRIMARY KEY (usuario_id, mes, categoria)
+        ) WITHOUT ROWID
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS resumen_fijos (
+            usuario_id INTEGER NOT NULL,
+            categoria TEXT NOT NULL,
+            total REAL NOT NULL,
+            cantidad INTEGER NOT NULL,
+            PRIMARY KEY (usuario_id, categoria)
+        ) WITHOUT ROWID
+        """,
+        *_TRIGGERS_RESUMEN,
+        # Carga inicial desde los gastos ya existentes
+        "DELETE FROM resumen_mensual",
+        "DELETE FROM resumen_fijos",
+        """
+        INSERT INTO resumen_mensual (usuario_id, mes, categoria, total, cantidad)
+        SELECT usuario_id, substr(fecha, 1, 7), categoria, SUM(monto), COUNT(*)
+        FROM gastos_variables GROUP BY 1, 2, 3
+        """,
+        """
+        INSERT INTO resumen_fijos (usuario_id, categoria, total, cantidad)
+        SELECT usuario_id, categoria, SUM(monto), COUNT(*)
+        FROM gastos_fijos GROUP BY 1, 2
+        """,
+    ]),
+    (5, [
+        # Búsqueda de usuarios por prefijo del nombre, sin distinguir mayúsculas,
+        # y listado alfabético paginado (buscar_usuarios)
+        "CREATE INDEX IF NOT EXISTS idx_usuarios_nombre ON usuarios(nombre COLLATE NOCASE)",
+    ]),
+    (6, [
+        # Importes en centavos y porcentajes en puntos básicos (ver "Importes" más
+        # abajo). SQLite no cambia el tipo de una columna: las tablas de gastos se
+        # reconstruyen con sus índices y triggers, y en usuarios se reemplazan las
+        # dos columnas. Los contadores de AUTOINCREMENT se conservan.
+        """
+        CREATE TABLE gastos_fijos_nuevo (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            usuario_id INTEGER NOT NULL,
+            categoria TEXT NOT NULL,
+            monto INTEGER NOT NULL,
+            FOREIGN KEY(usuario_id) REFERENCES usuarios(id)
+        )
+        """,
+        """
+        INSERT INTO gastos_fijos_nuevo (id, usuario_id, categoria, monto)
+        SELECT id, usuario_id, categoria, CAST(ROUND(monto * 100) AS INTEGER) FROM gastos_fijos
+        """,
+        """
+        CREATE TABLE gastos_variables_nuevo (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            usuario_id INTEGER NOT NULL,
+            categoria TEXT NOT NULL,
+            monto INTEGER NOT NULL,
+            fecha TEXT NOT NULL,
+            FOREIGN KEY(usuario_id) REFERENCES usuarios(id)
+        )
+        """,
+        """
+        INSERT INTO gastos_variables_nuevo (id, usuario_id, categoria, monto, fecha)
+        SELECT id, usuario_id, categoria, CAST(ROUND(monto * 100) AS INTEGER), fecha FROM gastos_variables
+        """,
+        """
+        DELETE FROM sqlite_sequence WHERE name IN ('gastos_fijos_nuevo', 'gastos_variables_nuevo')
+        """,
+        """
+        INSERT INTO sqlite_sequence (name, seq)
+        SELECT name || '_nuevo', seq FROM sqlite_sequence WHERE name IN ('gastos_fijos', 'gastos_variables')
+        """,
+        # borrar una tabla borra también sus índices y triggers
+        "DROP TABLE gastos_fijos",
+        "DROP TABLE gastos_variables",
+        "ALTER TABLE gastos_fijos_nuevo RENAME TO gastos_fijos",
+        "ALTER TABLE gastos_variables_nuevo RENAME TO gastos_variables",
+        "CREATE INDEX idx_gastos_fijos_usuario ON gastos_fijos(usuario_id, monto)",
+        "CREATE INDEX idx_gastos_variables_usuario_fecha ON gastos_variables(usuario_id, fecha, monto)",
+        "CREATE INDEX idx_gastos_variables_usuario_categoria ON gastos_variables(usuario_id, categoria)",
+        "CREATE INDEX idx_gastos_variables_usuario_monto ON gastos_variables(usuario_id, monto)",
+        "ALTER TABLE usuarios ADD COLUMN ingreso_centavos INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE usuarios ADD COLUMN ahorro_puntos INTEGER NOT NULL DEFAULT 0",
+        """
+        UPDATE usuarios SET ingreso_centavos = CAST(ROUND(ingreso * 100) AS INTEGER),
+                            ahorro_puntos = CAST(ROUND(ahorro_porcentaje * 100) AS INTEGER)
+        """,
+        "ALTER TABLE usuarios DROP COLUMN ingreso",
+        "ALTER TABLE usuarios DROP COLUMN ahorro_porcentaje",
+        "ALTER TABLE usuarios RENAME COLUMN ingreso_centavos TO ingreso",
+        "ALTER TABLE usuarios RENAME COLUMN ahorro_puntos TO ahorro_porcentaje",
+        # resúmenes con totales enteros, recalculados desde los gastos ya convertidos
+        "DROP TABLE resumen_mensual",
+        "DROP TABLE resumen_fijos",
+        """
+        CREATE TABLE resumen_mensual (
+            usuario_id INTEGER NOT NULL,
+            mes TEXT NOT NULL,
+            categoria TEXT NOT NULL,
+            total INTEGER NOT NULL,
+            cantidad INTEGER NOT NULL,
+            PRIMARY KEY (usuario_id, mes, categoria)
+        ) WITHOUT ROWID
+        """,
+        """
+        CREATE TABLE resumen_fijos (
+            usuario_id INTEGER NOT NULL,
+            categoria TEXT NOT NULL,
+            total INTEGER NOT NULL,
+            cantidad INTEGER NOT NULL,
+            PRIMARY KEY (usuario_id, categoria)
+        ) WITHOUT ROWID
+        """,
+        *_TRIGGERS_RESUMEN,
+        """
+        INSERT INTO resumen_mensual (usuario_id, mes, categoria, total, cantidad)
+        SELECT usuario_id, substr(fecha, 1, 7), categoria, SUM(monto), COUNT(*)
+        FROM gastos_variables GROUP BY 1, 2, 3
+        """,
+        """
+        INSERT INTO resumen_fijos (usuario_id, categoria, total, cantidad)
+        SELECT usuario_id, categoria, SUM(monto), COUNT(*)
+        FROM gastos_fijos GROUP BY 1, 2
+        """,
+    ]),
+    (7, [
+        # Catálogo de shards (ver "Shards" más arriba). Queda vacío mientras la base
+        # sea un solo archivo, y en los archivos de los shards no se usa.
+        """
+        CREATE TABLE IF NOT EXISTS shards (
+            numero INTEGER PRIMARY KEY,
+            archivo TEXT NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS shard_usuarios (
+            usuario_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            shard INTEGER NOT NULL
+        )
+        """,
+    ]),
+]
 
-    conn.commit()
-    conn.close()
+# -------------------- Importes --------------------
+# Desde la migración 6 los montos, ingresos y totales se guardan como centavos
+# enteros y el porcentaje de ahorro como puntos básicos (10.5 % -> 1050): las
+# sumas son enteras y exactas. Las funciones de este módulo siguen recibiendo y
+# devolviendo unidades y porcentajes como float; se convierte al escribir (abajo)
+# y al leer, en el mismo SQL, dividiendo por 100.0 una sola vez al final.
+def _centavos(monto):
+    return int(round(float(monto) * 100))
+
+def _puntos_basicos(porcentaje):
+    return int(round(float(porcentaje) * 100))
+
+_COLUMNAS_USUARIO = "id, nombre, ingreso / 100.0, ahorro_porcentaje / 100.0"
+_COLUMNAS_GASTO_FIJO = "id, usuario_id, categoria, monto / 100.0"
+_COLUMNAS_GASTO_VARIABLE = "id, usuario_id, categoria, monto / 100.0, fecha"
+
+def _fila_usuario(usuario_id, nombre, ingreso, ahorro):
+    # la fila tal como la devolvería una lectura (_COLUMNAS_USUARIO)
+    return (usuario_id, nombre, ingreso / 100.0, ahorro / 100.0)
+
+def get_schema_version(conn=None):
+    conn = conn or get_connection()
+    conn.execute("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)")
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+def migrate(conn=None):
+    """
+    Lleva la base de datos a la última versión del esquema. Es seguro llamarla
+    varias veces y sirve para actualizar un gastos.db existente en el lugar.
+    Devuelve la versión final.
+    """
+    conn = conn or get_connection()
+    actual = get_schema_version(conn)
+    for version, sentencias in MIGRATIONS:
+        if version <= actual:
+            continue
+        _reintentar(conn.execute, "BEGIN IMMEDIATE")
+        try:
+            # otro proceso pudo aplicarla mientras esperábamos el bloqueo
+            actual = get_schema_version(conn)
+            if version <= actual:
+                conn.rollback()
+                continue
+            for sql in sentencias:
+                conn.execute(sql)
+            conn.execute("INSERT INTO schema_version (version) VALUES (?)", (version,))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        actual = version
+    return actual
+
+# Se conserva el nombre original; equivale a init_db() sobre la ruta actual
+def create_tables():
+    init_db()
 
 
 # -------------------- CRUD USUARIOS --------------------
 def insert_usuario(nombre, ingreso, ahorro_porcentaje):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-    INSERT INTO usuarios (nombre, ingreso, ahorro_porcentaje)
-    VALUES (?, ?, ?)
-    """, (nombre, ingreso, ahorro_porcentaje))
-    conn.commit()
-    conn.close()
+    insert_usuario_return_id(nombre, ingreso, ahorro_porcentaje)
 
 # Nuevo: inserta y devuelve id
+@_con_reintentos
 def insert_usuario_return_id(nombre, ingreso, ahorro_porcentaje):
+    valores = (nombre, _centavos(ingreso), _puntos_basicos(ahorro_porcentaje))
+    if _shards:
+        # el id lo reparte el catálogo, para que sea único entre todos los shards
+        usuario_id = _alta_en_catalogo()
+        conn = _conexion_usuario(usuario_id)
+        try:
+            with _transaccion(conn):
+                conn.execute("""
+                INSERT INTO usuarios (id, nombre, ingreso, ahorro_porcentaje)
+                VALUES (?, ?, ?, ?)
+                """, (usuario_id,) + valores)
+                _emitir(eventos.UsuarioCreado(usuario_id, _fila_usuario(usuario_id, *valores)))
+        except BaseException:
+            _baja_en_catalogo(usuario_id)
+            raise
+        _notify_write(usuario_id, "usuarios")
+        return usuario_id
     conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-    INSERT INTO usuarios (nombre, ingreso, ahorro_porcentaje)
-    VALUES (?, ?, ?)
-    """, (nombre, ingreso, ahorro_porcentaje))
-    conn.commit()
-    last_id = cursor.lastrowid
-    conn.close()
-    return last_id
+    with _transaccion(conn):
+        cursor = conn.execute("""
+        INSERT INTO usuarios (nombre, ingreso, ahorro_porcentaje)
+        VALUES (?, ?, ?)
+        """, valores)
+        _emitir(eventos.UsuarioCreado(cursor.lastrowid, _fila_usuario(cursor.lastrowid, *valores)))
+    _notify_write(cursor.lastrowid, "usuarios")
+    return cursor.lastrowid
 
-def get_usuario(usuario_id):
+def _alta_en_catalogo():
+    # el shard sale del id nuevo (reparto por módulo); mover_usuario lo cambia después
     conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM usuarios WHERE id = ?", (usuario_id,))
-    usuario = cursor.fetchone()
-    conn.close()
-    return usuario
+    with _transaccion(conn):
+        usuario_id = conn.execute("INSERT INTO shard_usuarios (shard) VALUES (0)").lastrowid
+        shard = usuario_id % _num_shards()
+        conn.execute("UPDATE shard_usuarios SET shard = ? WHERE usuario_id = ?", (shard, usuario_id))
+    _shard_usuarios[usuario_id] = shard
+    return usuario_id
 
-def get_usuario_por_nombre(nombre):
+def _baja_en_catalogo(usuario_id):
     conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM usuarios WHERE nombre = ?", (nombre,))
-    usuario = cursor.fetchone()
-    conn.close()
-    return usuario
+    with _transaccion(conn):
+        conn.execute("DELETE FROM shard_usuarios WHERE usuario_id = ?", (usuario_id,))
+    _shard_usuarios.pop(usuario_id, None)
+
+def get_usuario(usuario_id):
+    conn = _conexion_usuario(usuario_id)
+    return conn.execute(f"SELECT {_COLUMNAS_USUARIO} FROM usuarios WHERE id = ?", (usuario_id,)).fetchone()
+
+def get_usuario_por_nombre(nombre):
+    filas = _en_paralelo(lambda conn: conn.execute(f"SELECT {_COLUMNAS_USUARIO} FROM usuarios WHERE nombre = ?",
+                                                   (nombre,)).fetchone())
+    return min((f for f in filas if f is not None), default=None)
 
+@_con_reintentos
 def update_usuario(usuario_id, nombre, ingreso, ahorro_porcentaje):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-    UPDATE usuarios
-    SET nombre = ?, ingreso = ?, ahorro_porcentaje = ?
-    WHERE id = ?
-    """, (nombre, ingreso, ahorro_porcentaje, usuario_id))
-    conn.commit()
-    conn.close()
+    conn = _conexion_usuario(usuario_id)
+    with _transaccion(conn):
+        row = conn.execute(f"""
+        UPDATE usuarios
+        SET nombre = ?, ingreso = ?, ahorro_porcentaje = ?
+        WHERE id = ?
+        RETURNING {_COLUMNAS_USUARIO}
+        """, (nombre, _centavos(ingreso), _puntos_basicos(ahorro_porcentaje), usuario_id)).fetchone()
+        if row:
+            _emitir(eventos.UsuarioActualizado(usuario_id, row))
+    _notify_write(usuario_id, "usuarios")
+
+@_con_reintentos
+def update_ahorro_porcentaje(usuario_id, porcentaje):
+    """
+    Cambia solo el porcentaje de ahorro y devuelve la fila del usuario ya
+    actualizada, o None si no existe. Lectura y escritura van en una misma
+    transacción inmediata: el nombre y el ingreso devueltos son los vigentes
+    aunque otro proceso los haya cambiado hace un momento.
+    """
+    conn = _conexion_usuario(usuario_id)
+    with _transaccion(conn, inmediata=True):
+        row = conn.execute(f"SELECT {_COLUMNAS_USUARIO} FROM usuarios WHERE id = ?", (usuario_id,)).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE usuarios SET ahorro_porcentaje = ? WHERE id = ?", (_puntos_basicos(porcentaje), usuario_id))
+        row = row[:3] + (_puntos_basicos(porcentaje) / 100.0,)
+        _emitir(eventos.UsuarioActualizado(usuario_id, row))
+    _notify_write(usuario_id, "usuarios")
+    return row
+
+def get_usuario_resumen(usuario_id):
+    """
+    Devuelve en una sola consulta:
+    (ingreso, ahorro, gastos_fijos, gastos_variables, presupuesto_disponible, compromiso_total)
+    o None si el usuario no existe.
+    """
+    conn = _conexion_usuario(usuario_id)
+    # todo en centavos enteros; el ahorro se redondea al centavo (centavos * puntos / 10000)
+    return conn.execute("""
+    SELECT ingreso / 100.0,
+           ahorro / 100.0,
+           fijos / 100.0,
+           variables / 100.0,
+           (ingreso - ahorro - fijos - variables) / 100.0,
+           (ahorro + fijos + variables) / 100.0
+    FROM (
+        SELECT u.ingreso AS ingreso,
+               (u.ingreso * u.ahorro_porcentaje + 5000) / 10000 AS ahorro,
+               (SELECT COALESCE(SUM(total),0) FROM resumen_fijos WHERE usuario_id = u.id) AS fijos,
+               (SELECT COALESCE(SUM(total),0) FROM resumen_mensual WHERE usuario_id = u.id) AS variables
+        FROM usuarios u
+        WHERE u.id = ?
+    )
+    """, (usuario_id,)).fetchone()
 
+@_con_reintentos
 def delete_usuario(usuario_id):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM usuarios WHERE id = ?", (usuario_id,))
-    conn.commit()
-    conn.close()
+    conn = _conexion_usuario(usuario_id)
+    with _transaccion(conn, inmediata=True):
+        _borrar_usuario(conn, usuario_id)
+        _emitir(eventos.UsuarioEliminado(usuario_id))
+    if _shards:
+        _baja_en_catalogo(usuario_id)
+    _notify_write(usuario_id, "usuarios")
+
+def _borrar_usuario(conn, usuario_id):
+    # con foreign_keys activo primero deben borrarse los gastos del usuario
+    conn.execute("DELETE FROM gastos_fijos WHERE usuario_id = ?", (usuario_id,))
+    conn.execute("DELETE FROM gastos_variables WHERE usuario_id = ?", (usuario_id,))
+    conn.execute("DELETE FROM usuarios WHERE id = ?", (usuario_id,))
 
 
 # -------------------- CRUD GASTOS FIJOS --------------------
+@_con_reintentos
 def insert_gasto_fijo(usuario_id, categoria, monto):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
+    if _diferir(insert_gasto_fijo, (usuario_id, categoria, monto), usuario_id, "gastos_fijos"):
+        return
+    centavos = _centavos(monto)
+    conn = _conexion_usuario(usuario_id)
+    with _transaccion(conn):
+        gasto_id = conn.execute("""
+        INSERT INTO gastos_fijos (usuario_id, categoria, monto)
+        VALUES (?, ?, ?)
+        """, (usuario_id, categoria, centavos)).lastrowid
+        _emitir(eventos.GastoInsertado(usuario_id, "gastos_fijos", centavos, gasto_id,
+                                       (gasto_id, usuario_id, categoria, centavos / 100.0)))
+    _notify_write(usuario_id, "gastos_fijos")
+
+def insert_gastos_fijos_bulk(rows, chunk_size=BULK_CHUNK_SIZE):
+    """
+    Inserta gastos fijos desde un iterable de (usuario_id, categoria, monto).
+    Devuelve la cantidad de filas insertadas.
+    """
+    return _insert_bulk("""
     INSERT INTO gastos_fijos (usuario_id, categoria, monto)
     VALUES (?, ?, ?)
-    """, (usuario_id, categoria, monto))
-    conn.commit()
-    conn.close()
+    """, ((u, c, _centavos(m)) for u, c, m in rows), chunk_size, "gastos_fijos")
 
 def get_gastos_fijos(usuario_id):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM gastos_fijos WHERE usuario_id = ?", (usuario_id,))
-    gastos = cursor.fetchall()
-    conn.close()
-    return gastos
+    conn = _conexion_usuario(usuario_id)
+    return conn.execute(f"SELECT {_COLUMNAS_GASTO_FIJO} FROM gastos_fijos WHERE usuario_id = ?", (usuario_id,)).fetchall()
 
 def total_gastos_fijos(usuario_id):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT COALESCE(SUM(monto),0) FROM gastos_fijos WHERE usuario_id = ?", (usuario_id,))
-    s = cursor.fetchone()[0]
-    conn.close()
-    return s
+    conn = _conexion_usuario(usuario_id)
+    return conn.execute("SELECT COALESCE(SUM(monto),0) / 100.0 FROM gastos_fijos WHERE usuario_id = ?", (usuario_id,)).fetchone()[0]
+
+def get_gasto_fijo(gasto_id):
+    conn = _conexion_gasto(gasto_id)
+    return conn.execute(f"SELECT {_COLUMNAS_GASTO_FIJO} FROM gastos_fijos WHERE id = ?", (gasto_id,)).fetchone()
 
+@_con_reintentos
 def update_gasto_fijo(gasto_id, categoria, monto):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-    UPDATE gastos_fijos
-    SET categoria = ?, monto = ?
-    WHERE id = ?
-    """, (categoria, monto, gasto_id))
-    conn.commit()
-    conn.close()
+    """
+    Actualiza un gasto fijo y devuelve la fila ya actualizada
+    (id, usuario_id, categoria, monto), o None si no existe.
+    """
+    conn = _conexion_gasto(gasto_id)
+    # inmediata: la fila anterior (para el delta del evento) es la que se reemplaza
+    with _transaccion(conn, inmediata=True):
+        anterior = conn.execute(f"SELECT {_COLUMNAS_GASTO_FIJO} FROM gastos_fijos WHERE id = ?", (gasto_id,)).fetchone()
+        row = conn.execute(f"""
+        UPDATE gastos_fijos
+        SET categoria = ?, monto = ?
+        WHERE id = ?
+        RETURNING {_COLUMNAS_GASTO_FIJO}
+        """, (categoria, _centavos(monto), gasto_id)).fetchone()
+        if row:
+            _emitir(eventos.GastoActualizado(row[1], "gastos_fijos", _centavos(row[3]) - _centavos(anterior[3]),
+                                             gasto_id, row, anterior))
+    if row:
+        _notify_write(row[1], "gastos_fijos")
+    return row
 
+@_con_reintentos
 def delete_gasto_fijo(gasto_id):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM gastos_fijos WHERE id = ?", (gasto_id,))
-    conn.commit()
-    conn.close()
+    conn = _conexion_gasto(gasto_id)
+    with _transaccion(conn):
+        row = conn.execute(f"DELETE FROM gastos_fijos WHERE id = ? RETURNING {_COLUMNAS_GASTO_FIJO}", (gasto_id,)).fetchone()
+        if row:
+            _emitir(eventos.GastoEliminado(row[1], "gastos_fijos", -_centavos(row[3]), gasto_id, row))
+    if row:
+        _notify_write(row[1], "gastos_fijos")
 
 
 # -------------------- CRUD GASTOS VARIABLES --------------------
+@_con_reintentos
 def insert_gasto_variable(usuario_id, categoria, monto, fecha):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
+    if _diferir(insert_gasto_variable, (usuario_id, categoria, monto, fecha), usuario_id, "gastos_variables"):
+        return
+    centavos = _centavos(monto)
+    conn = _conexion_usuario(usuario_id)
+    with _transaccion(conn):
+        gasto_id = conn.execute("""
+        INSERT INTO gastos_variables (usuario_id, categoria, monto, fecha)
+        VALUES (?, ?, ?, ?)
+        """, (usuario_id, categoria, centavos, fecha)).lastrowid
+        _emitir(eventos.GastoInsertado(usuario_id, "gastos_variables", centavos, gasto_id,
+                                       (gasto_id, usuario_id, categoria, centavos / 100.0, fecha)))
+    _notify_write(usuario_id, "gastos_variables")
+
+def insert_gastos_variables_bulk(rows, chunk_size=BULK_CHUNK_SIZE):
+    """
+    Inserta gastos variables desde un iterable de (usuario_id, categoria, monto, fecha).
+    El iterable se consume por bloques, así que puede ser un generador sobre un
+    archivo grande. Devuelve la cantidad de filas insertadas.
+    """
+    return _insert_bulk("""
     INSERT INTO gastos_variables (usuario_id, categoria, monto, fecha)
     VALUES (?, ?, ?, ?)
-    """, (usuario_id, categoria, monto, fecha))
-    conn.commit()
-    conn.close()
+    """, ((u, c, _centavos(m), f) for u, c, m, f in rows), chunk_size, "gastos_variables")
 
 def get_gastos_variables(usuario_id):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM gastos_variables WHERE usuario_id = ?", (usuario_id,))
-    gastos = cursor.fetchall()
-    conn.close()
-    return gastos
+    conn = _conexion_usuario(usuario_id)
+    return conn.execute(f"SELECT {_COLUMNAS_GASTO_VARIABLE} FROM gastos_variables WHERE usuario_id = ?", (usuario_id,)).fetchall()
 
 def total_gastos_variables(usuario_id):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT COALESCE(SUM(monto),0) FROM gastos_variables WHERE usuario_id = ?", (usuario_id,))
-    s = cursor.fetchone()[0]
-    conn.close()
-    return s
+    conn = _conexion_usuario(usuario_id)
+    return conn.execute("SELECT COALESCE(SUM(monto),0) / 100.0 FROM gastos_variables WHERE usuario_id = ?", (usuario_id,)).fetchone()[0]
 
+def get_gasto_variable(gasto_id):
+    conn = _conexion_gasto(gasto_id)
+    return conn.execute(f"SELECT {_COLUMNAS_GASTO_VARIABLE} FROM gastos_variables WHERE id = ?", (gasto_id,)).fetchone()
+
+@_con_reintentos
 def update_gasto_variable(gasto_id, categoria, monto, fecha):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-    UPDATE gastos_variables
-    SET categoria = ?, monto = ?, fecha = ?
-    WHERE id = ?
-    """, (categoria, monto, fecha, gasto_id))
-    conn.commit()
-    conn.close()
+    """
+    Actualiza un gasto variable y devuelve la fila ya actualizada
+    (id, usuario_id, categoria, monto, fecha), o None si no existe.
+    """
+    conn = _conexion_gasto(gasto_id)
+    # inmediata: la fila anterior (para el delta del evento) es la que se reemplaza
+    with _transaccion(conn, inmediata=True):
+        anterior = conn.execute(f"SELECT {_COLUMNAS_GASTO_VARIABLE} FROM gastos_variables WHERE id = ?", (gasto_id,)).fetchone()
+        row = conn.execute(f"""
+        UPDATE gastos_variables
+        SET categoria = ?, monto = ?, fecha = ?
+        WHERE id = ?
+        RETURNING {_COLUMNAS_GASTO_VARIABLE}
+        """, (categoria, _centavos(monto), fecha, gasto_id)).fetchone()
+        if row:
+            _emitir(eventos.GastoActualizado(row[1], "gastos_variables", _centavos(row[3]) - _centavos(anterior[3]),
+                                             gasto_id, row, anterior))
+    if row:
+        _notify_write(row[1], "gastos_variables")
+    return row
 
+@_con_reintentos
 def delete_gasto_variable(gasto_id):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM gastos_variables WHERE id = ?", (gasto_id,))
-    conn.commit()
-    conn.close()
+    conn = _conexion_gasto(gasto_id)
+    with _transaccion(conn):
+        row = conn.execute(f"DELETE FROM gastos_variables WHERE id = ? RETURNING {_COLUMNAS_GASTO_VARIABLE}", (gasto_id,)).fetchone()
+        if row:
+            _emitir(eventos.GastoEliminado(row[1], "gastos_variables", -_centavos(row[3]), gasto_id, row))
+    if row:
+        _notify_write(row[1], "gastos_variables")
+
+
+# -------------------- Resúmenes mensuales y por categoría --------------------
+# Leen de las tablas resumen_mensual / resumen_fijos (migración 4), nunca de los
+# gastos individuales. `desde` y `hasta` son meses "YYYY-MM" inclusivos.
+def _filtro_meses(desde, hasta):
+    sql, params = "", []
+    if desde is not None:
+        sql += " AND mes >= ?"
+        params.append(desde)
+    if hasta is not None:
+        sql += " AND mes <= ?"
+        params.append(hasta)
+    return sql, params
+
+def get_resumen_mensual(usuario_id, desde=None, hasta=None):
+    """
+    Gastos variables por mes: [(mes, total, cantidad), ...] en orden cronológico.
+    """
+    filtro, params = _filtro_meses(desde, hasta)
+    conn = _conexion_usuario(usuario_id)
+    return conn.execute(f"""
+    SELECT mes, SUM(total) / 100.0, SUM(cantidad) FROM resumen_mensual
+    WHERE usuario_id = ?{filtro}
+    GROUP BY mes ORDER BY mes
+    """, [usuario_id] + params).fetchall()
+
+def get_resumen_categorias(usuario_id, desde=None, hasta=None):
+    """
+    Gastos variables por categoría: [(categoria, total, cantidad), ...] de mayor a menor.
+    """
+    filtro, params = _filtro_meses(desde, hasta)
+    conn = _conexion_usuario(usuario_id)
+    return conn.execute(f"""
+    SELECT categoria, SUM(total) / 100.0, SUM(cantidad) FROM resumen_mensual
+    WHERE usuario_id = ?{filtro}
+    GROUP BY categoria ORDER BY 2 DESC
+    """, [usuario_id] + params).fetchall()
+
+def get_resumen_mensual_categorias(usuario_id, desde=None, hasta=None):
+    """
+    Desglose completo: [(mes, categoria, total, cantidad), ...].
+    """
+    filtro, params = _filtro_meses(desde, hasta)
+    conn = _conexion_usuario(usuario_id)
+    return conn.execute(f"""
+    SELECT mes, categoria, total / 100.0, cantidad FROM resumen_mensual
+    WHERE usuario_id = ?{filtro}
+    ORDER BY mes, categoria
+    """, [usuario_id] + params).fetchall()
+
+def get_resumen_fijos(usuario_id):
+    """
+    Gastos fijos por categoría: [(categoria, total, cantidad), ...].
+    """
+    conn = _conexion_usuario(usuario_id)
+    return conn.execute("""
+    SELECT categoria, total / 100.0, cantidad FROM resumen_fijos
+    WHERE usuario_id = ? ORDER BY total DESC
+    """, (usuario_id,)).fetchall()
+
+def _filtro_usuarios(usuario_ids, columna="usuario_id"):
+    if usuario_ids is None:
+        return "", []
+    usuario_ids = list(usuario_ids)
+    return f" AND {columna} IN ({', '.join('?' * len(usuario_ids))})", usuario_ids
+
+
+# -------------------- Datos para proyecciones --------------------
+# Lecturas de todos los usuarios a la vez (o de `usuario_ids`) para proyeccion.py.
+# Devuelven cursores para cargarlos directo en arreglos de NumPy.
+def cursor_usuarios_base(usuario_ids=None):
+    """
+    (id, ingreso, ahorro_porcentaje) en orden de id.
+    """
+    filtro, params = _filtro_usuarios(usuario_ids, "id")
+    return _unir_cursores(lambda conn: conn.execute(
+        f"SELECT id, ingreso / 100.0, ahorro_porcentaje / 100.0 FROM usuarios WHERE 1{filtro} ORDER BY id", params),
+        ordenado=True)
+
+def cursor_fijos_por_categoria(categorias, usuario_ids=None):
+    """
+    (usuario_id, codigo_categoria, total) desde resumen_fijos.
+    """
+    filtro, params = _filtro_usuarios(usuario_ids)
+    return _unir_cursores(lambda conn: conn.execute(f"""
+    SELECT usuario_id, {_codigo_categoria(categorias)}, total / 100.0
+    FROM resumen_fijos WHERE 1{filtro}
+    """, [*categorias] + params))
+
+def cursor_historial_variables(categorias, ventana, usuario_ids=None):
+    """
+    Últimos `ventana` meses con historial de cada usuario, desde resumen_mensual:
+    (usuario_id, meses_atras, codigo_categoria, total, meses_historial). meses_atras
+    es 0 para el último mes con gastos del usuario; meses_historial cuenta los
+    meses entre su primer y su último gasto.
+    """
+    filtro, params = _filtro_usuarios(usuario_ids)
+    num_mes = "(CAST(substr({0}, 1, 4) AS INTEGER) * 12 + CAST(substr({0}, 6, 2) AS INTEGER))"
+    return _unir_cursores(lambda conn: conn.execute(f"""
+    WITH limites AS (
+        SELECT usuario_id, {num_mes.format("MIN(mes)")} AS primero, {num_mes.format("MAX(mes)")} AS ultimo
+        FROM resumen_mensual WHERE 1{filtro} GROUP BY usuario_id
+    )
+    SELECT r.usuario_id, l.ultimo - {num_mes.format("r.mes")}, {_codigo_categoria(categorias)},
+           r.total / 100.0, l.ultimo - l.primero + 1
+    FROM resumen_mensual r JOIN limites l ON l.usuario_id = r.usuario_id
+    WHERE l.ultimo - {num_mes.format("r.mes")} < ?
+    """, params + [*categorias, ventana]))
+
+_RESUMEN_MENSUAL_CALCULADO = """
+    SELECT usuario_id, substr(fecha, 1, 7) AS mes, categoria, SUM(monto) AS total, COUNT(*) AS cantidad
+    FROM gastos_variables GROUP BY 1, 2, 3
+"""
+_RESUMEN_FIJOS_CALCULADO = """
+    SELECT usuario_id, categoria, SUM(monto) AS total, COUNT(*) AS cantidad
+    FROM gastos_fijos GROUP BY 1, 2
+"""
+
+@_con_reintentos
+def rebuild_resumenes():
+    """
+    Recalcula las tablas de resumen desde cero a partir de los gastos.
+    """
+    for numero in range(_num_shards()):
+        conn = _conexion_shard(numero)
+        with _transaccion(conn, inmediata=True):
+            conn.execute("DELETE FROM resumen_mensual")
+            conn.execute("DELETE FROM resumen_fijos")
+            conn.execute(f"INSERT INTO resumen_mensual (usuario_id, mes, categoria, total, cantidad) {_RESUMEN_MENSUAL_CALCULADO}")
+            conn.execute(f"INSERT INTO resumen_fijos (usuario_id, categoria, total, cantidad) {_RESUMEN_FIJOS_CALCULADO}")
+    _notify_write(None, None)
+    _emitir(eventos.CambioGeneral(None))
+
+def verify_resumenes(tolerancia=0.005):
+    """
+    Compara las tablas de resumen con un recálculo completo. Devuelve la lista de
+    diferencias como (tabla, usuario_id, clave, total_esperado, total_guardado);
+    vacía si todo cuadra. Los totales son enteros: con la tolerancia por defecto
+    cualquier diferencia de un centavo se informa. Con shards se revisan todos
+    en paralelo.
+    """
+    def comparar(conn):
+        diferencias = []
+        for tabla, calculado, claves in (
+            ("resumen_mensual", _RESUMEN_MENSUAL_CALCULADO, ("mes", "categoria")),
+            ("resumen_fijos", _RESUMEN_FIJOS_CALCULADO, ("categoria",)),
+        ):
+            union = " AND ".join(f"c.{k} = r.{k}" for k in ("usuario_id",) + claves)
+            clave = " || '/' || ".join(f"COALESCE(c.{k}, r.{k})" for k in claves)
+            # LEFT JOIN en ambos sentidos: filas faltantes, sobrantes o con otro total
+            rows = conn.execute(f"""
+            WITH c AS ({calculado})
+            SELECT COALESCE(c.usuario_id, r.usuario_id), {clave}, c.total / 100.0, r.total / 100.0
+            FROM c LEFT JOIN {tabla} r ON {union}
+            WHERE r.usuario_id IS NULL OR ABS(c.total - r.total) > ? OR c.cantidad != r.cantidad
+            UNION ALL
+            SELECT r.usuario_id, {clave}, NULL, r.total / 100.0
+            FROM {tabla} r LEFT JOIN c ON {union}
+            WHERE c.usuario_id IS NULL
+            """, (tolerancia * 100,)).fetchall()
+            diferencias.extend((tabla,) + tuple(r) for r in rows)
+        return diferencias
+    return [d for parte in _en_paralelo(comparar) for d in parte]
+
+
+# -------------------- Paginación --------------------
+# Columnas visibles y ordenables de cada tabla. Los nombres se validan contra esta
+# lista antes de armar el SQL.
+COLUMNAS_GASTOS = {
+    "gastos_fijos": ("id", "categoria", "monto"),
+    "gastos_variables": ("id", "categoria", "monto", "fecha"),
+}
+
+def get_gastos_page(tabla, usuario_id, orden="id", descendente=False, after=None, limit=200, categoria=None):
+    """
+    Devuelve una página de gastos de `tabla` con las columnas de COLUMNAS_GASTOS,
+    ordenada por `orden` y luego por id. La paginación es por clave (keyset):
+    `after` es (valor_orden, id) de la última fila de la página anterior, así que
+    pedir la página N cuesta lo mismo que pedir la primera.
+    """
+    columnas = COLUMNAS_GASTOS[tabla]
+    if orden not in columnas:
+        raise ValueError(f"Columna de orden inválida: {orden}")
+    seleccion = ", ".join("monto / 100.0" if c == "monto" else c for c in columnas)
+    sql = f"SELECT {seleccion} FROM {tabla} WHERE usuario_id = ?"
+    params = [usuario_id]
+    if categoria is not None:
+        sql += " AND categoria = ?"
+        params.append(categoria)
+    if after is not None:
+        sql += f" AND ({orden}, id) {'<' if descendente else '>'} (?, ?)"
+        params.extend((_centavos(after[0]), after[1]) if orden == "monto" else after)
+    direccion = "DESC" if descendente else "ASC"
+    sql += f" ORDER BY {orden} {direccion}, id {direccion} LIMIT ?"
+    params.append(limit)
+    conn = _conexion_usuario(usuario_id)
+    return conn.execute(sql, params).fetchall()
+
+def query_gastos_variables(usuario_id, desde=None, hasta=None, categorias=None, monto_min=None, monto_max=None,
+                           after=None, limit=500):
+    """
+    Página de gastos variables de un usuario, filtrada y en orden (fecha, id):
+    [(id, usuario_id, categoria, monto, fecha), ...]. `desde`/`hasta` son fechas
+    "YYYY-MM-DD" inclusivas, `categorias` un iterable de categorías y `after` el
+    (fecha, id) de la última fila de la página anterior. Recorre el índice
+    (usuario_id, fecha), así que cada página cuesta lo mismo sin importar cuántos
+    gastos tenga el usuario.
+    """
+    sql = f"SELECT {_COLUMNAS_GASTO_VARIABLE} FROM gastos_variables WHERE usuario_id = ?"
+    params = [usuario_id]
+    if desde is not None:
+        sql += " AND fecha >= ?"
+        params.append(desde)
+    if hasta is not None:
+        sql += " AND fecha <= ?"
+        params.append(hasta)
+    if categorias is not None:
+        categorias = list(categorias)
+        if not categorias:
+            return []
+        sql += f" AND categoria IN ({', '.join('?' * len(categorias))})"
+        params.extend(categorias)
+    if monto_min is not None:
+        sql += " AND monto >= ?"
+        params.append(_centavos(monto_min))
+    if monto_max is not None:
+        sql += " AND monto <= ?"
+        params.append(_centavos(monto_max))
+    if after is not None:
+        sql += " AND (fecha, id) > (?, ?)"
+        params.extend(after)
+    sql += " ORDER BY fecha, id LIMIT ?"
+    params.append(limit)
+    conn = _conexion_usuario(usuario_id)
+    return conn.execute(sql, params).fetchall()
+
+def _codigo_categoria(categorias):
+    # CASE que convierte la categoría en su posición dentro de `categorias` (-1 si no
+    # está); los nombres van como parámetros, antes que los del resto de la consulta
+    return "CASE categoria %s ELSE -1 END" % " ".join("WHEN ? THEN %d" % i for i in range(len(categorias)))
+
+def cursor_gastos_variables_columnas(usuario_id, categorias, desde=None, hasta=None):
+    """
+    Cursor sobre los gastos variables de un usuario en orden (fecha, id), con filas
+    (id, codigo_categoria, centavos, dia) listas para cargarse en arreglos: el código
+    es la posición de la categoría en `categorias` (-1 si no está), el monto va en
+    centavos enteros, tal como está guardado, y `dia` son los días desde 1970-01-01.
+    Las conversiones las hace SQLite; el cursor no se consume aquí.
+    """
+    sql = f"""
+    SELECT id, {_codigo_categoria(categorias)}, monto,
+           CAST(julianday(fecha) - 2440587.5 AS INTEGER)
+    FROM gastos_variables WHERE usuario_id = ?"""
+    params = [*categorias, usuario_id]
+    if desde is not None:
+        sql += " AND fecha >= ?"
+        params.append(desde)
+    if hasta is not None:
+        sql += " AND fecha <= ?"
+        params.append(hasta)
+    sql += " ORDER BY fecha, id"
+    conn = _conexion_usuario(usuario_id)
+    return conn.execute(sql, params)
+
+
+# -------------------- Exportación --------------------
+def cursor_gastos_exportacion(tabla, usuario_ids=None):
+    """
+    Cursor sobre todos los gastos de `tabla` (o los de `usuario_ids`) en orden de
+    id, con las columnas de _COLUMNAS_GASTO_FIJO / _COLUMNAS_GASTO_VARIABLE. Se
+    recorre sin cargar nada en memoria; ver exportador.py. Con shards se intercalan
+    los cursores de cada uno, cada shard con su propia foto de los datos.
+    """
+    columnas = {"gastos_fijos": _COLUMNAS_GASTO_FIJO, "gastos_variables": _COLUMNAS_GASTO_VARIABLE}[tabla]
+    filtro, params = _filtro_usuarios(usuario_ids)
+    return _unir_cursores(lambda conn: conn.execute(f"SELECT {columnas} FROM {tabla} WHERE 1{filtro} ORDER BY id",
+                                                    params), ordenado=True)
+
+
+# -------------------- Inserción masiva --------------------
+def _escribir_bloque(conn, sql, bloque, tabla):
+    with _transaccion(conn):
+        conn.executemany(sql, bloque)
+        # un evento por usuario con la cantidad y la suma (en centavos) del bloque
+        por_usuario = {}
+        for r in bloque:
+            cantidad, centavos = por_usuario.get(r[0], (0, 0))
+            por_usuario[r[0]] = (cantidad + 1, centavos + r[2])
+        for usuario_id, (cantidad, centavos) in por_usuario.items():
+            _emitir(eventos.GastosInsertados(usuario_id, tabla, centavos, cantidad))
+
+def _insert_bulk(sql, rows, chunk_size, tabla):
+    # Un executemany y un commit por bloque: chunk_size filas cuestan un solo fsync
+    total = 0
+    it = iter(rows)
+    while True:
+        bloque = list(itertools.islice(it, chunk_size))
+        if not bloque:
+            return total
+        por_shard = {0: bloque}
+        if _shards:
+            por_shard = {}
+            for r in bloque:
+                por_shard.setdefault(_shard_de_usuario(r[0]), []).append(r)
+        for shard, filas in por_shard.items():
+            # cada bloque se reintenta por separado: los ya confirmados no se repiten
+            _reintentar(_escribir_bloque, _conexion_shard(shard), sql, filas, tabla)
+        total += len(bloque)
+        for usuario_id in {r[0] for r in bloque}:
+            _notify_write(usuario_id, tabla)
 
 
 def get_all_usuarios():
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM usuarios")
-    rows = cursor.fetchall()
-    conn.close()
-    return rows
-
-# Crear las tablas al importar el módulo y crear la conexión
-get_connection()
-create_tables()
\ No newline at end of file
+    partes = _en_paralelo(lambda conn: conn.execute(f"SELECT {_COLUMNAS_USUARIO} FROM usuarios").fetchall())
+    return [u for parte in partes for u in parte]
+
+# NOCASE solo iguala las letras ASCII; al intercalar shards se compara igual
+_NOCASE = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+
+def _clave_nocase(usuario):
+    return usuario[1].translate(_NOCASE), usuario[0]
+
+def buscar_usuarios(prefijo="", limite=50, after=None):
+    """
+    Usuarios cuyo nombre empieza con `prefijo` (sin distinguir mayúsculas), en
+    orden alfabético, como (id, nombre, ingreso, ahorro_porcentaje). La
+    paginación es por clave: `after` es (nombre, id) de la última fila ya
+    recibida. Recorre idx_usuarios_nombre, así que no depende de cuántos
+    usuarios haya.
+    """
+    sql = f"SELECT {_COLUMNAS_USUARIO} FROM usuarios WHERE 1"
+    params = []
+    if prefijo:
+        # rango [prefijo, prefijo + último carácter posible); NOCASE solo iguala ASCII
+        sql += " AND nombre COLLATE NOCASE >= ? AND nombre COLLATE NOCASE < ?"
+        params += [prefijo, prefijo + "\U0010ffff"]
+    if after is not None:
+        sql += " AND (nombre COLLATE NOCASE, id) > (?, ?)"
+        params += list(after)
+    sql += " ORDER BY nombre COLLATE NOCASE, id LIMIT ?"
+    params.append(limite)
+    partes = _en_paralelo(lambda conn: conn.execute(sql, params).fetchall())
+    if len(partes) == 1:
+        return partes[0]
+    return list(itertools.islice(heapq.merge(*partes, key=_clave_nocase), limite))
+
+def get_usuario_ids():
+    partes = _en_paralelo(lambda conn: [r[0] for r in conn.execute("SELECT id FROM usuarios ORDER BY id")])
+    return partes[0] if len(partes) == 1 else list(heapq.merge(*partes))
+
+
+# -------------------- Administración de shards --------------------
+# Cambian el catálogo, que cada proceso lee una sola vez al abrir la base: hay que
+# usarlas con la aplicación cerrada (o reiniciarla después).
+def crear_shards(total):
+    """
+    Reparte la base en `total` archivos. El principal es el shard 0 y los demás se
+    crean a su lado (ver ruta_shard). Los usuarios que ya existen quedan en el
+    shard 0 hasta que se muevan (mover_usuario, equilibrar); los nuevos se
+    reparten por id. Sobre una base ya repartida agrega los shards que faltan.
+    Devuelve shards().
+    """
+    flush()
+    principal = get_connection()
+    actual = _num_shards()
+    if total <= actual:
+        raise ValueError(f"La base ya tiene {actual} shards")
+    nuevos = {}
+    for numero in range(actual, total):
+        ruta = ruta_shard(DB_NAME, numero)
+        if os.path.exists(ruta):
+            raise FileExistsError(f"Ya existe {ruta}")
+        conn = _open_connection(ruta=ruta)
+        try:
+            with conn:
+                # los gastos de este shard toman sus ids desde numero * RANGO_IDS_SHARD
+                conn.executemany("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)",
+                                 [(tabla, numero * RANGO_IDS_SHARD) for tabla in ("gastos_fijos", "gastos_variables")])
+        finally:
+            conn.close()
+        nuevos[numero] = os.path.basename(ruta)
+    with _transaccion(principal, inmediata=True):
+        if actual == 1:
+            principal.execute("INSERT INTO shard_usuarios (usuario_id, shard) SELECT id, 0 FROM usuarios")
+            # los ids de usuarios borrados tampoco se reutilizan
+            principal.execute("DELETE FROM sqlite_sequence WHERE name = 'shard_usuarios'")
+            principal.execute("""
+            INSERT INTO sqlite_sequence (name, seq)
+            SELECT 'shard_usuarios', seq FROM sqlite_sequence WHERE name = 'usuarios'
+            """)
+        principal.executemany("INSERT INTO shards (numero, archivo) VALUES (?, ?)", nuevos.items())
+    _cargar_catalogo(principal)
+    return shards()
+
+def _copiar_usuario(origen, destino, usuario_id):
+    # copia las filas tal como están guardadas; los gastos toman ids del destino
+    usuario = origen.execute("SELECT id, nombre, ingreso, ahorro_porcentaje FROM usuarios WHERE id = ?",
+                             (usuario_id,)).fetchone()
+    if usuario is None:
+        raise ValueError(f"El usuario {usuario_id} no está en su shard")
+    destino.execute("INSERT INTO usuarios (id, nombre, ingreso, ahorro_porcentaje) VALUES (?, ?, ?, ?)", usuario)
+    fijos = destino.executemany(
+        "INSERT INTO gastos_fijos (usuario_id, categoria, monto) VALUES (?, ?, ?)",
+        origen.execute("SELECT usuario_id, categoria, monto FROM gastos_fijos WHERE usuario_id = ? ORDER BY id",
+                       (usuario_id,))).rowcount
+    variables = destino.executemany(
+        "INSERT INTO gastos_variables (usuario_id, categoria, monto, fecha) VALUES (?, ?, ?, ?)",
+        origen.execute("SELECT usuario_id, categoria, monto, fecha FROM gastos_variables WHERE usuario_id = ? "
+                       "ORDER BY id", (usuario_id,))).rowcount
+    return fijos, variables
+
+def mover_usuario(usuario_id, destino):
+    """
+    Mueve un usuario, con sus gastos y resúmenes, al shard `destino`. Sus gastos
+    reciben ids nuevos del rango del destino. Los archivos confirman por separado
+    (primero el destino, después el catálogo y por último el borrado en el
+    origen): si se corta en el medio, volver a llamarla limpia lo que haya quedado.
+    Devuelve {"origen", "destino", "fijos", "variables"}.
+    """
+    flush()
+    if not 0 <= destino < _num_shards():
+        raise ValueError(f"Shard inexistente: {destino}")
+    catalogo = get_connection()
+    row = catalogo.execute("SELECT shard FROM shard_usuarios WHERE usuario_id = ?", (usuario_id,)).fetchone()
+    if row is None:
+        raise ValueError(f"Usuario inexistente: {usuario_id}")
+    origen = row[0]
+    resultado = {"origen": origen, "destino": destino, "fijos": 0, "variables": 0}
+    # restos de un movimiento interrumpido en cualquier shard que no sea el vigente
+    for numero in range(_num_shards()):
+        if numero != origen:
+            conn = _conexion_shard(numero)
+            with _transaccion(conn, inmediata=True):
+                _borrar_usuario(conn, usuario_id)
+    if origen != destino:
+        conn_origen, conn_destino = _conexion_shard(origen), _conexion_shard(destino)
+        with _transaccion(conn_origen, inmediata=True):
+            with _transaccion(conn_destino, inmediata=True):
+                resultado["fijos"], resultado["variables"] = _copiar_usuario(conn_origen, conn_destino, usuario_id)
+            # si el origen es el principal, el catálogo se confirma junto con el borrado
+            with contextlib.nullcontext() if origen == 0 else _transaccion(catalogo):
+                catalogo.execute("UPDATE shard_usuarios SET shard = ? WHERE usuario_id = ?", (destino, usuario_id))
+            _borrar_usuario(conn_origen, usuario_id)
+        _shard_usuarios[usuario_id] = destino
+    _notify_write(usuario_id, "usuarios")
+    # los gastos tienen ids nuevos: quien los tenga cargados debe releerlos
+    _emitir(eventos.CambioGeneral(usuario_id))
+    return resultado
+
+def carga_shards():
+    """
+    Usuarios y gastos de cada shard: [{"shard", "ruta", "usuarios", "gastos"}, ...].
+    """
+    def contar(conn):
+        return conn.execute("""
+        SELECT (SELECT COUNT(*) FROM usuarios),
+               (SELECT COALESCE(SUM(cantidad), 0) FROM resumen_fijos)
+               + (SELECT COALESCE(SUM(cantidad), 0) FROM resumen_mensual)
+        """).fetchone()
+    rutas = shards()
+    return [{"shard": numero, "ruta": rutas[numero], "usuarios": usuarios, "gastos": gastos}
+            for numero, (usuarios, gastos) in enumerate(_en_paralelo(contar))]
+
+def equilibrar(tolerancia=0.1, max_movimientos=100, simular=False):
+    """
+    Mueve usuarios del shard con más gastos al que tiene menos hasta que ninguno
+    pase el promedio en más de `tolerancia` (0.1 = 10 %), hasta que no quede un
+    movimiento que acerque a los dos o hasta `max_movimientos`. Devuelve el plan
+    como [(usuario_id, origen, destino, gastos), ...]; con simular=True no mueve nada.
+    """
+    def gastos_por_usuario(conn):
+        return dict(conn.execute("""
+        SELECT u.id, (SELECT COALESCE(SUM(cantidad), 0) FROM resumen_fijos WHERE usuario_id = u.id)
+                     + (SELECT COALESCE(SUM(cantidad), 0) FROM resumen_mensual WHERE usuario_id = u.id)
+        FROM usuarios u
+        """).fetchall())
+    usuarios = _en_paralelo(gastos_por_usuario)
+    cargas = [sum(u.values()) for u in usuarios]
+    limite = sum(cargas) / len(cargas) * (1 + tolerancia)
+    plan = []
+    while len(plan) < max_movimientos:
+        mayor = max(range(len(cargas)), key=cargas.__getitem__)
+        menor = min(range(len(cargas)), key=cargas.__getitem__)
+        diferencia = cargas[mayor] - cargas[menor]
+        if cargas[mayor] <= limite:
+            break
+        # el usuario que deja a los dos shards más parejos sin invertir la diferencia
+        candidatos = [(uid, g) for uid, g in usuarios[mayor].items() if 0 < g < diferencia]
+        if not candidatos:
+            break
+        uid, gastos = min(candidatos, key=lambda c: abs(diferencia / 2 - c[1]))
+        usuarios[menor][uid] = usuarios[mayor].pop(uid)
+        cargas[mayor] -= gastos
+        cargas[menor] += gastos
+        plan.append((uid, mayor, menor, gastos))
+    if not simular:
+        for uid, _origen, destino, _gastos in plan:
+            mover_usuario(uid, destino)
+    return plan
+
+
+# -------------------- Línea de comandos --------------------
+# python db_manager.py resumen --verify | --rebuild
+# python db_manager.py shards [--crear N | --mover USUARIO SHARD | --equilibrar [--simular]]
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Mantenimiento de la base de datos de gastos")
+    parser.add_argument("--db", help="ruta de la base de datos (por defecto GASTOS_DB o gastos.db)")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p_resumen = sub.add_parser("resumen", help="verificar o reconstruir las tablas de resumen")
+    p_resumen.add_argument("--rebuild", action="store_true", help="recalcular los resúmenes desde los gastos")
+    p_resumen.add_argument("--verify", action="store_true", help="comparar los resúmenes con un recálculo")
+    p_shards = sub.add_parser("shards", help="repartir la base en varios archivos y mover usuarios entre ellos")
+    accion = p_shards.add_mutually_exclusive_group()
+    accion.add_argument("--crear", type=int, metavar="N", help="llevar la base a N shards")
+    accion.add_argument("--mover", type=int, nargs=2, metavar=("USUARIO", "SHARD"), help="mover un usuario")
+    accion.add_argument("--equilibrar", action="store_true", help="repartir los gastos de forma pareja")
+    p_shards.add_argument("--tolerancia", type=float, default=0.1, help="desvío admitido sobre el promedio")
+    p_shards.add_argument("--simular", action="store_true", help="con --equilibrar, solo mostrar el plan")
+    args = parser.parse_args()
+    init_db(args.db)
+
+    if args.comando == "resumen":
+        if args.rebuild:
+            rebuild_resumenes()
+            print("Resúmenes reconstruidos.")
+        if args.verify or not args.rebuild:
+            diferencias = verify_resumenes()
+            for d in diferencias:
+                print("Diferencia:", d)
+            print("Resúmenes correctos." if not diferencias else f"{len(diferencias)} diferencias encontradas.")
+            raise SystemExit(1 if diferencias else 0)
+
+    if args.comando == "shards":
+        if args.crear:
+            crear_shards(args.crear)
+        elif args.mover:
+            r = mover_usuario(*args.mover)
+            print(f"Usuario {args.mover[0]}: shard {r['origen']} -> {r['destino']}, "
+                  f"{r['fijos']} gastos fijos y {r['variables']} variables.")
+        elif args.equilibrar:
+            plan = equilibrar(args.tolerancia, simular=args.simular)
+            for uid, origen, destino, gastos in plan:
+                print(f"Usuario {uid}: shard {origen} -> {destino} ({gastos} gastos)")
+            print(f"{len(plan)} movimientos{' (simulación)' if args.simular else ''}.")
+        for c in carga_shards():
+            print(f"shard {c['shard']}: {c['usuarios']} usuarios, {c['gastos']} gastos  {c['ruta']}")
@@ -0,0 +1,126 @@
+"""
+Eventos de cambio de la base: qué escritura se hizo, sobre qué ids y con qué
+diferencia de importes.
+
+db_manager publica un evento por cada escritura recién cuando su transacción
+confirmó (dentro de escrituras_agrupadas, al terminar el grupo); si se deshace,
+sus eventos se descartan. Los suscriptores se llaman en el hilo que escribió:
+
+    import eventos
+    eventos.suscribir(lambda e: print(e))
+
+Los importes de las filas van en unidades, como los devuelven las lecturas de
+db_manager; `delta_centavos` es lo que cambió el total del usuario en esa tabla,
+en centavos enteros, para llevar totales al día sin volver a sumar.
+"""
+import contextlib
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass(frozen=True)
+class Evento:
+    usuario_id: Optional[int]
+
+
+@dataclass(frozen=True)
+class CambioGeneral(Evento):
+    """
+    Cambió algo sin detalle fila a fila (resúmenes reconstruidos, un usuario
+    movido de shard, una escritura diferida todavía en cola). usuario_id None:
+    cualquier usuario. Quien tenga datos guardados debe volver a leerlos.
+    """
+
+
+@dataclass(frozen=True)
+class UsuarioCreado(Evento):
+    fila: tuple  # (id, nombre, ingreso, ahorro_porcentaje)
+
+
+@dataclass(frozen=True)
+class UsuarioActualizado(Evento):
+    fila: tuple  # como quedó guardado
+
+
+@dataclass(frozen=True)
+class UsuarioEliminado(Evento):
+    pass
+
+
+@dataclass(frozen=True)
+class EventoGasto(Evento):
+    tabla: str  # "gastos_fijos" o "gastos_variables"
+    delta_centavos: int
+
+
+@dataclass(frozen=True)
+class GastoInsertado(EventoGasto):
+    gasto_id: int
+    fila: tuple  # (id, usuario_id, categoria, monto[, fecha])
+
+
+@dataclass(frozen=True)
+class GastoActualizado(EventoGasto):
+    gasto_id: int
+    fila: tuple
+    anterior: tuple
+
+
+@dataclass(frozen=True)
+class GastoEliminado(EventoGasto):
+    gasto_id: int
+    anterior: tuple
+
+
+@dataclass(frozen=True)
+class GastosInsertados(EventoGasto):
+    """
+    Inserción masiva: un evento por usuario y bloque, sin las filas.
+    """
+    cantidad: int
+
+
+# -------------------- Suscriptores --------------------
+_suscriptores = []
+_lock = threading.Lock()
+_en_curso = 0  # escrituras empezadas cuyos eventos todavía no se publicaron
+
+def suscribir(fn):
+    with _lock:
+        if fn not in _suscriptores:
+            _suscriptores.append(fn)
+
+def cancelar(fn):
+    with _lock:
+        if fn in _suscriptores:
+            _suscriptores.remove(fn)
+
+def publicar(lote):
+    for evento in lote:
+        for fn in list(_suscriptores):
+            fn(evento)
+
+@contextlib.contextmanager
+def escritura():
+    """
+    Marca una escritura en curso desde antes de empezar hasta que sus eventos
+    se publicaron (la usa db_manager alrededor de cada transacción).
+    """
+    global _en_curso
+    with _lock:
+        _en_curso += 1
+    try:
+        yield
+    finally:
+        with _lock:
+            _en_curso -= 1
+
+def en_calma() -> bool:
+    """
+    True si no hay escrituras en curso en este proceso. Una lectura que empezó
+    y terminó en calma, sin eventos del mismo usuario en el medio, no incluye
+    ninguna escritura cuyo evento falte llegar: se puede guardar y corregir
+    después con los deltas.
+    """
+    return _en_curso == 0
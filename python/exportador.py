@@ -0,0 +1,197 @@
+"""
+Exportación y respaldo de gastos.db con la aplicación en marcha.
+
+- exportar: escribe los gastos (fijos, variables o ambos; de todos los usuarios
+  o de algunos) en CSV o JSON Lines a medida que los lee del cursor, así que la
+  memoria no crece con el tamaño de la base. Todo sale de una misma foto de la
+  base aunque otros sigan escribiendo. Un CSV de gastos variables se puede
+  volver a cargar con importador.py (usa las columnas fecha, categoria y monto).
+- respaldo: copia la base con la API de backup de SQLite, unas pocas páginas por
+  paso y con una pausa entre pasos, así los escritores nunca esperan más que un
+  paso. La copia se arma en un archivo temporal que al final reemplaza al destino.
+  Si la base está repartida en shards se copia cada archivo.
+
+Uso (desde la carpeta python/):
+    python exportador.py exportar --formato csv --salida gastos.csv
+    python exportador.py exportar --usuarios 1 5 --tipos variable --formato jsonl
+    python exportador.py respaldo copia.db --paginas 1024 --pausa-ms 5
+"""
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+import time
+
+import db_manager
+
+FORMATOS = ("csv", "jsonl")
+TABLAS = {"fijo": "gastos_fijos", "variable": "gastos_variables"}
+COLUMNAS = ["tipo", "id", "usuario_id", "categoria", "monto", "fecha"]
+
+
+# -------------------- Exportación --------------------
+def iter_gastos(usuario_ids=None, tipos=tuple(TABLAS)):
+    """
+    Genera una tupla con COLUMNAS por gasto (fecha es None en los fijos). Usa una
+    conexión propia con una transacción de lectura abierta durante todo el
+    recorrido: con WAL no frena a nadie y todas las tablas salen del mismo momento.
+    """
+    db_manager.flush()
+    conn = db_manager.abrir_conexion()
+    try:
+        conn.execute("BEGIN")
+        for tipo in tipos:
+            # la conexión se presta solo para abrir el cursor; entre fila y fila
+            # el hilo sigue usando la suya
+            with db_manager.conexion_prestada(conn):
+                cursor = db_manager.cursor_gastos_exportacion(TABLAS[tipo], usuario_ids)
+            for row in cursor:
+                yield (tipo,) + row + (None,) * (len(COLUMNAS) - 1 - len(row))
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+def exportar(f, formato: str = "csv", usuario_ids=None, tipos=tuple(TABLAS)) -> int:
+    """
+    Escribe los gastos en el archivo de texto `f` y devuelve cuántos escribió.
+    """
+    total = 0
+    if formato == "csv":
+        escritor = csv.writer(f)
+        escritor.writerow(COLUMNAS)
+        for tipo, gid, uid, categoria, monto, fecha in iter_gastos(usuario_ids, tipos):
+            escritor.writerow((tipo, gid, uid, categoria, f"{monto:.2f}", fecha or ""))
+            total += 1
+    elif formato == "jsonl":
+        for fila in iter_gastos(usuario_ids, tipos):
+            f.write(json.dumps(dict(zip(COLUMNAS, fila)), ensure_ascii=False) + "\n")
+            total += 1
+    else:
+        raise ValueError(f"Formato desconocido: {formato}")
+    return total
+
+
+# -------------------- Respaldo --------------------
+class _Reiniciada(Exception):
+    pass
+
+
+def respaldar(destino: str, paginas: int = 256, pausa_ms: float = 10, max_reinicios: int = 3,
+              verificar: bool = True, progreso=None) -> dict:
+    """
+    Copia la base en uso a `destino` sin detener la aplicación. Cada paso copia
+    `paginas` páginas y después se esperan `pausa_ms`. Si otra conexión escribe
+    durante la copia SQLite la recomienza; pasados `max_reinicios` el resto se
+    copia en un solo paso (con WAL eso tampoco frena a los escritores, solo
+    demora el checkpoint). progreso(copiadas, total) se llama tras cada paso.
+    Con shards, cada uno se copia al lado de `destino` (copia.shard1.db, ...) y
+    el principal va al final, ya apuntando a esas copias.
+    Devuelve {"paginas", "pasos", "reinicios", "segundos"} sumando todos los archivos.
+    """
+    rutas = db_manager.shards()
+    copias = {numero: db_manager.ruta_shard(destino, numero) if numero else destino for numero in rutas}
+    if {os.path.abspath(c) for c in copias.values()} & {os.path.abspath(r) for r in rutas.values()}:
+        raise ValueError("El destino no puede ser la base en uso.")
+    db_manager.flush()
+    t0 = time.perf_counter()
+    total = {"paginas": 0, "pasos": 0, "reinicios": 0}
+    catalogo = {numero: os.path.basename(c) for numero, c in copias.items() if numero}
+    for numero in sorted(rutas, reverse=True):
+        r = _respaldar_archivo(numero, copias[numero], paginas, pausa_ms, max_reinicios, verificar, progreso,
+                               catalogo if numero == 0 else None)
+        for clave in total:
+            total[clave] += r[clave]
+    total["segundos"] = round(time.perf_counter() - t0, 3)
+    return total
+
+
+def _respaldar_archivo(shard, destino, paginas, pausa_ms, max_reinicios, verificar, progreso, catalogo):
+    estado = {"pasos": 0, "reinicios": 0, "restantes": None, "total": 0}
+
+    def avance(_status, restantes, total):
+        estado["pasos"] += 1
+        estado["total"] = total
+        if estado["restantes"] is not None and restantes > estado["restantes"]:
+            estado["reinicios"] += 1
+            if estado["reinicios"] > max_reinicios:
+                raise _Reiniciada()
+        estado["restantes"] = restantes
+        if progreso is not None:
+            progreso(total - restantes, total)
+        if restantes and pausa_ms:
+            time.sleep(pausa_ms / 1000)
+
+    temporal = destino + ".tmp"
+    origen = db_manager.abrir_conexion(shard)
+    try:
+        for _ in range(2):
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            copia = sqlite3.connect(temporal)
+            try:
+                if estado["reinicios"] > max_reinicios:
+                    origen.backup(copia)
+                    estado["pasos"] += 1
+                else:
+                    origen.backup(copia, pages=paginas, progress=avance)
+                if catalogo:
+                    # el principal de la copia apunta a las copias de los shards
+                    with copia:
+                        copia.executemany("UPDATE shards SET archivo = ? WHERE numero = ?",
+                                          [(archivo, numero) for numero, archivo in catalogo.items()])
+                # el respaldo queda en un solo archivo, sin -wal al lado
+                copia.execute("PRAGMA journal_mode = DELETE")
+                if verificar and copia.execute("PRAGMA quick_check").fetchone()[0] != "ok":
+                    raise sqlite3.DatabaseError("El respaldo no pasó PRAGMA quick_check")
+            except _Reiniciada:
+                continue
+            finally:
+                copia.close()
+            break
+    finally:
+        origen.close()
+    os.replace(temporal, destino)
+    return {"paginas": estado["total"], "pasos": estado["pasos"], "reinicios": estado["reinicios"]}
+
+
+# -------------------- Línea de comandos --------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", help="ruta de la base de datos (por defecto GASTOS_DB o gastos.db)")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p_exp = sub.add_parser("exportar", help="gastos en CSV o JSON Lines")
+    p_exp.add_argument("--formato", choices=FORMATOS, default="csv")
+    p_exp.add_argument("--usuarios", type=int, nargs="+", help="ids de usuario (por defecto, todos)")
+    p_exp.add_argument("--tipos", choices=list(TABLAS), nargs="+", default=list(TABLAS))
+    p_exp.add_argument("--salida", help="archivo de salida (por defecto, salida estándar)")
+    p_resp = sub.add_parser("respaldo", help="copia en caliente con la API de backup")
+    p_resp.add_argument("destino")
+    p_resp.add_argument("--paginas", type=int, default=256, help="páginas por paso")
+    p_resp.add_argument("--pausa-ms", type=float, default=10, help="espera entre pasos")
+    p_resp.add_argument("--max-reinicios", type=int, default=3)
+    p_resp.add_argument("--sin-verificar", action="store_true", help="omitir PRAGMA quick_check")
+    args = parser.parse_args(argv)
+    db_manager.init_db(args.db)
+
+    if args.comando == "exportar":
+        f = open(args.salida, "w", newline="", encoding="utf-8") if args.salida else sys.stdout
+        try:
+            total = exportar(f, args.formato, args.usuarios, args.tipos)
+        finally:
+            if args.salida:
+                f.close()
+        print(f"{total} gastos exportados.", file=sys.stderr)
+    else:
+        def progreso(copiadas, total):
+            print(f"\r{copiadas}/{total} páginas", end="", file=sys.stderr)
+        r = respaldar(args.destino, args.paginas, args.pausa_ms, args.max_reinicios,
+                      not args.sin_verificar, progreso)
+        print(f"\nRespaldo en {args.destino}: {r['paginas']} páginas, {r['pasos']} pasos, "
+              f"{r['reinicios']} reinicios, {r['segundos']} s.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
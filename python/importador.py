@@ -0,0 +1,156 @@
+import csv
+import datetime
+import math
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional
+
+import db_manager
+from clases import CATEGORIES
+
+# Nombres de columna aceptados (en minúsculas) para cada campo. Cubre el formato
+# propio (fecha, categoria, monto) y los encabezados típicos de los extractos bancarios.
+COLUMNAS_FECHA = ("fecha", "date", "fecha operacion", "fecha valor")
+COLUMNAS_CATEGORIA = ("categoria", "categoría", "category", "concepto", "descripcion", "descripción")
+COLUMNAS_MONTO = ("monto", "importe", "amount", "cargo", "debito", "débito", "debe")
+# Columnas que solo traen cargos: ahí el signo no distingue gastos de abonos
+COLUMNAS_SOLO_CARGOS = ("cargo", "debito", "débito", "debe")
+# Columna de abonos de los extractos con cargos y abonos por separado
+COLUMNAS_ABONO = ("abono", "haber", "credito", "crédito", "credit")
+# Un saldo solo aparece en los extractos bancarios, que traen el importe con
+# signo: cargos negativos y depósitos positivos
+COLUMNAS_SALDO = ("saldo", "balance")
+
+FORMATOS_FECHA = ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d/%m/%y", "%Y/%m/%d")
+
+
+@dataclass
+class ResultadoImportacion:
+    insertados: int = 0
+    omitidos: int = 0
+    abonos: int = 0  # filas con signo de ingreso (depósitos, devoluciones): no son gastos
+    errores: List[str] = field(default_factory=list)
+
+    # Solo se guardan los primeros errores para no crecer con archivos grandes
+    MAX_ERRORES = 20
+
+    def registrar_error(self, linea: int, motivo: str):
+        self.omitidos += 1
+        if len(self.errores) < self.MAX_ERRORES:
+            self.errores.append(f"línea {linea}: {motivo}")
+
+
+def _buscar_columna(encabezados, candidatos):
+    normalizados = {h.strip().lower(): h for h in encabezados if h}
+    for c in candidatos:
+        if c in normalizados:
+            return normalizados[c]
+    return None
+
+
+def parse_monto(texto: str) -> float:
+    """
+    Convierte montos como "1234.5", "-1.234,50", "$ 99,90" o "(99,90)" a float,
+    conservando el signo. El último separador (punto o coma) se toma como
+    separador decimal.
+    """
+    t = texto.strip().replace(" ", "").replace("$", "").replace("€", "")
+    if t.startswith("(") and t.endswith(")"):
+        # notación contable para montos negativos
+        t = "-" + t[1:-1]
+    if "," in t and "." in t:
+        if t.rfind(",") > t.rfind("."):
+            t = t.replace(".", "").replace(",", ".")
+        else:
+            t = t.replace(",", "")
+    elif "," in t:
+        t = t.replace(",", ".")
+    return float(t)
+
+
+def parse_fecha(texto: str) -> str:
+    t = texto.strip()
+    for fmt in FORMATOS_FECHA:
+        try:
+            return datetime.datetime.strptime(t, fmt).date().isoformat()
+        except ValueError:
+            continue
+    raise ValueError(f"fecha no reconocida: {texto!r}")
+
+
+def normalizar_categoria(texto: str) -> str:
+    t = (texto or "").strip()
+    for c in CATEGORIES:
+        if c.lower() == t.lower():
+            return c
+    return "Otros"
+
+
+def leer_gastos(f, usuario_id: int, resultado: ResultadoImportacion,
+                gastos_negativos: Optional[bool] = None) -> Iterator[tuple]:
+    """
+    Genera tuplas (usuario_id, categoria, monto, fecha) a partir de un archivo CSV
+    ya abierto, fila por fila. Las filas inválidas se cuentan en `resultado`.
+
+    gastos_negativos indica la convención de signo del archivo: True para los
+    extractos con signo (cargos negativos, depósitos positivos), False para el
+    formato propio (gastos positivos). Con None se deduce solo de los
+    encabezados, nunca de los montos: un archivo con columna de saldo es un
+    extracto con signo; cualquier otro, formato propio. Las filas con el signo
+    contrario son abonos (depósitos, devoluciones): no se importan y se cuentan
+    en `resultado.abonos`. Con cargos y abonos en columnas separadas ("cargo" y
+    "abono", "debe" y "haber") el signo no importa: se importa la columna de
+    cargos y las filas que solo traen abono son abonos.
+    """
+    muestra = f.read(4096)
+    f.seek(0)
+    try:
+        dialecto = csv.Sniffer().sniff(muestra, delimiters=",;\t|")
+    except csv.Error:
+        dialecto = csv.excel
+    lector = csv.DictReader(f, dialect=dialecto)
+    encabezados = lector.fieldnames or []
+    col_fecha = _buscar_columna(encabezados, COLUMNAS_FECHA)
+    col_monto = _buscar_columna(encabezados, COLUMNAS_MONTO)
+    col_categoria = _buscar_columna(encabezados, COLUMNAS_CATEGORIA)
+    col_abono = _buscar_columna(encabezados, COLUMNAS_ABONO)
+    if col_fecha is None or col_monto is None:
+        raise ValueError("El archivo debe tener columnas de fecha y monto.")
+    solo_cargos = col_monto.strip().lower() in COLUMNAS_SOLO_CARGOS
+    if gastos_negativos is None:
+        gastos_negativos = _buscar_columna(encabezados, COLUMNAS_SALDO) is not None
+
+    for fila in lector:
+        linea = lector.line_num
+        if (solo_cargos and col_abono and not (fila.get(col_monto) or "").strip()
+                and (fila.get(col_abono) or "").strip()):
+            resultado.abonos += 1
+            continue
+        try:
+            monto = parse_monto(fila.get(col_monto) or "")
+            fecha = parse_fecha(fila.get(col_fecha) or "")
+        except ValueError as e:
+            resultado.registrar_error(linea, str(e))
+            continue
+        if not math.isfinite(monto) or monto == 0:
+            resultado.registrar_error(linea, "monto inválido")
+            continue
+        if not solo_cargos and (monto > 0) == bool(gastos_negativos):
+            resultado.abonos += 1
+            continue
+        categoria = normalizar_categoria(fila.get(col_categoria) if col_categoria else "")
+        yield (usuario_id, categoria, abs(monto), fecha)
+
+
+def importar_gastos_variables(path: str, usuario_id: int,
+                              gastos_negativos: Optional[bool] = None) -> ResultadoImportacion:
+    """
+    Importa gastos variables desde un CSV (propio o extracto bancario) sin cargar
+    el archivo completo en memoria. Solo entran los cargos, guardados en valor
+    absoluto; los abonos se omiten (ver leer_gastos para la convención de signo)
+    y las categorías desconocidas se guardan como "Otros".
+    """
+    resultado = ResultadoImportacion()
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        filas = leer_gastos(f, usuario_id, resultado, gastos_negativos)
+        resultado.insertados = db_manager.insert_gastos_variables_bulk(filas)
+    return resultado
@@ -0,0 +1,330 @@
+"""
+Métricas de la capa de datos: llamadas, latencias, filas devueltas y commits.
+
+Solo se usa cuando se activa con db_manager.habilitar_trazas(); con las trazas
+apagadas db_manager no importa este módulo y no paga ningún costo extra.
+"""
+import collections
+import json
+import re
+import sqlite3
+import threading
+import time
+
+# Límites superiores de los buckets del histograma, en milisegundos
+BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, float("inf"))
+
+_ESPACIOS = re.compile(r"\s+")
+
+
+def normalizar_sql(sql: str) -> str:
+    return _ESPACIOS.sub(" ", sql).strip()[:200]
+
+
+class Histograma:
+    __slots__ = ("cuentas", "total_ms", "n", "max_ms")
+
+    def __init__(self):
+        self.cuentas = [0] * len(BUCKETS_MS)
+        self.total_ms = 0.0
+        self.n = 0
+        self.max_ms = 0.0
+
+    def agregar(self, ms: float):
+        for i, limite in enumerate(BUCKETS_MS):
+            if ms <= limite:
+                self.cuentas[i] += 1
+                break
+        self.total_ms += ms
+        self.n += 1
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def percentil(self, p: float) -> float:
+        """
+        Aproximación por bucket: límite superior del bucket que contiene el percentil.
+        """
+        if not self.n:
+            return 0.0
+        objetivo = p * self.n
+        acumulado = 0
+        for limite, cuenta in zip(BUCKETS_MS, self.cuentas):
+            acumulado += cuenta
+            if acumulado >= objetivo:
+                return min(limite, self.max_ms)
+        return self.max_ms
+
+    def a_dict(self) -> dict:
+        return {
+            "n": self.n,
+            "total_ms": round(self.total_ms, 4),
+            "media_ms": round(self.total_ms / self.n, 4) if self.n else 0.0,
+            "p50_ms": self.percentil(0.5),
+            "p95_ms": self.percentil(0.95),
+            "max_ms": round(self.max_ms, 4),
+            "buckets": {("+Inf" if l == float("inf") else str(l)): c for l, c in zip(BUCKETS_MS, self.cuentas)},
+        }
+
+
+class Estadistica:
+    __slots__ = ("latencia", "filas", "errores")
+
+    def __init__(self):
+        self.latencia = Histograma()
+        self.filas = 0
+        self.errores = 0
+
+
+class Accion:
+    """
+    Llamadas a db_manager atribuidas a una acción de la interfaz (un clic, un cambio
+    de usuario...). Incluye el trabajo que esa acción dejó corriendo en segundo plano.
+    """
+    def __init__(self, nombre: str):
+        self.nombre = nombre
+        self.inicio = time.time()
+        self.funciones = collections.defaultdict(lambda: [0, 0.0])  # nombre -> [llamadas, ms]
+
+    def a_dict(self) -> dict:
+        return {
+            "nombre": self.nombre,
+            "inicio": self.inicio,
+            "funciones": {f: {"llamadas": n, "total_ms": round(ms, 4)} for f, (n, ms) in self.funciones.items()},
+        }
+
+
+class Metricas:
+    def __init__(self, max_acciones: int = 20):
+        self._lock = threading.Lock()
+        self.funciones = collections.defaultdict(Estadistica)
+        self.sentencias = collections.defaultdict(Estadistica)
+        self.commits = Histograma()
+        self.trazas = collections.Counter()  # tipo de sentencia ejecutada por SQLite -> cantidad
+        self.acciones = collections.deque(maxlen=max_acciones)
+        self._accion = None
+
+    # -- registro --
+    def iniciar_accion(self, nombre: str):
+        with self._lock:
+            self._accion = Accion(nombre)
+            self.acciones.append(self._accion)
+
+    def registrar_funcion(self, nombre: str, ms: float, filas: int, error: bool):
+        with self._lock:
+            e = self.funciones[nombre]
+            e.latencia.agregar(ms)
+            e.filas += filas
+            e.errores += error
+            if self._accion is not None:
+                f = self._accion.funciones[nombre]
+                f[0] += 1
+                f[1] += ms
+
+    def registrar_sentencia(self, sql: str, ms: float, filas: int):
+        with self._lock:
+            e = self.sentencias[normalizar_sql(sql)]
+            e.latencia.agregar(ms)
+            e.filas += filas
+
+    def registrar_commit(self, ms: float):
+        with self._lock:
+            self.commits.agregar(ms)
+
+    def registrar_traza(self, sql: str):
+        # callback de sqlite3: se llama con cada sentencia que SQLite ejecuta,
+        # incluidos BEGIN/COMMIT implícitos y los cuerpos de los triggers
+        if sql.startswith("--"):
+            tipo = "TRIGGER"
+        else:
+            tipo = sql.lstrip().split(" ", 1)[0].upper() or "?"
+        with self._lock:
+            self.trazas[tipo] += 1
+
+    def reiniciar(self):
+        with self._lock:
+            self.funciones.clear()
+            self.sentencias.clear()
+            self.commits = Histograma()
+            self.trazas.clear()
+            self.acciones.clear()
+            self._accion = None
+
+    # -- consultas --
+    def top_acciones(self, n: int = 10, ultimas: int = None):
+        """
+        Funciones con más tiempo acumulado en las últimas `ultimas` acciones:
+        [(funcion, llamadas, total_ms), ...].
+        """
+        with self._lock:
+            acciones = list(self.acciones)[-ultimas:] if ultimas else list(self.acciones)
+            total = collections.defaultdict(lambda: [0, 0.0])
+            for a in acciones:
+                for f, (llamadas, ms) in a.funciones.items():
+                    total[f][0] += llamadas
+                    total[f][1] += ms
+        return sorted(((f, v[0], v[1]) for f, v in total.items()), key=lambda x: x[2], reverse=True)[:n]
+
+    def top_sentencias(self, n: int = 10):
+        with self._lock:
+            items = [(sql, e.latencia.n, e.latencia.total_ms, e.latencia.percentil(0.95), e.filas)
+                     for sql, e in self.sentencias.items()]
+        return sorted(items, key=lambda x: x[2], reverse=True)[:n]
+
+    # -- exportación --
+    def a_dict(self) -> dict:
+        with self._lock:
+            return {
+                "funciones": {f: dict(e.latencia.a_dict(), filas=e.filas, errores=e.errores)
+                              for f, e in self.funciones.items()},
+                "sentencias": {s: dict(e.latencia.a_dict(), filas=e.filas) for s, e in self.sentencias.items()},
+                "commits": self.commits.a_dict(),
+                "trazas": dict(self.trazas),
+                "acciones": [a.a_dict() for a in self.acciones],
+            }
+
+    def a_json(self, **kwargs) -> str:
+        return json.dumps(self.a_dict(), ensure_ascii=False, **kwargs)
+
+    def a_prometheus(self) -> str:
+        """
+        Formato de texto de Prometheus (latencias en segundos).
+        """
+        lineas = []
+
+        def histograma(nombre, etiqueta, valor, h):
+            acumulado = 0
+            for limite, cuenta in zip(BUCKETS_MS, h.cuentas):
+                acumulado += cuenta
+                le = "+Inf" if limite == float("inf") else repr(limite / 1000)
+                lineas.append(f'{nombre}_bucket{{{etiqueta}="{valor}",le="{le}"}} {acumulado}')
+            lineas.append(f'{nombre}_sum{{{etiqueta}="{valor}"}} {h.total_ms / 1000}')
+            lineas.append(f'{nombre}_count{{{etiqueta}="{valor}"}} {h.n}')
+
+        def escapar(texto):
+            return texto.replace("\\", "\\\\").replace('"', '\\"')
+
+        with self._lock:
+            lineas.append("# TYPE gastos_db_funcion_duracion_segundos histogram")
+            for f, e in sorted(self.funciones.items()):
+                histograma("gastos_db_funcion_duracion_segundos", "funcion", f, e.latencia)
+            lineas.append("# TYPE gastos_db_funcion_filas_total counter")
+            for f, e in sorted(self.funciones.items()):
+                lineas.append(f'gastos_db_funcion_filas_total{{funcion="{f}"}} {e.filas}')
+            lineas.append("# TYPE gastos_db_funcion_errores_total counter")
+            for f, e in sorted(self.funciones.items()):
+                lineas.append(f'gastos_db_funcion_errores_total{{funcion="{f}"}} {e.errores}')
+            lineas.append("# TYPE gastos_db_sentencia_duracion_segundos histogram")
+            for s, e in sorted(self.sentencias.items()):
+                histograma("gastos_db_sentencia_duracion_segundos", "sql", escapar(s), e.latencia)
+            lineas.append("# TYPE gastos_db_commit_duracion_segundos histogram")
+            acumulado = 0
+            for limite, cuenta in zip(BUCKETS_MS, self.commits.cuentas):
+                acumulado += cuenta
+                le = "+Inf" if limite == float("inf") else repr(limite / 1000)
+                lineas.append(f'gastos_db_commit_duracion_segundos_bucket{{le="{le}"}} {acumulado}')
+            lineas.append(f"gastos_db_commit_duracion_segundos_sum {self.commits.total_ms / 1000}")
+            lineas.append(f"gastos_db_commit_duracion_segundos_count {self.commits.n}")
+            lineas.append("# TYPE gastos_db_sentencias_sqlite_total counter")
+            for tipo, n in sorted(self.trazas.items()):
+                lineas.append(f'gastos_db_sentencias_sqlite_total{{tipo="{tipo}"}} {n}')
+        return "\n".join(lineas) + "\n"
+
+
+# -------------------- Conexión medida --------------------
+class _CursorMedido:
+    """
+    Envuelve el cursor devuelto por execute: SQLite avanza la consulta a medida que
+    se leen filas, así que el tiempo de fetch también cuenta para la sentencia.
+    """
+    __slots__ = ("_cursor", "_metricas", "_sql", "_ms", "_filas", "_cerrado")
+
+    def __init__(self, cursor, metricas, sql, ms):
+        self._cursor = cursor
+        self._metricas = metricas
+        self._sql = sql
+        self._ms = ms
+        self._filas = 0
+        self._cerrado = False
+
+    def _medir(self, fn, *args):
+        t0 = time.perf_counter()
+        res = fn(*args)
+        self._ms += (time.perf_counter() - t0) * 1000
+        return res
+
+    def fetchone(self):
+        row = self._medir(self._cursor.fetchone)
+        if row is None:
+            self._registrar()
+        else:
+            self._filas += 1
+        return row
+
+    def fetchall(self):
+        rows = self._medir(self._cursor.fetchall)
+        self._filas += len(rows)
+        self._registrar()
+        return rows
+
+    def fetchmany(self, size=None):
+        rows = self._medir(self._cursor.fetchmany, size or self._cursor.arraysize)
+        self._filas += len(rows)
+        if not rows:
+            self._registrar()
+        return rows
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        row = self.fetchone()
+        if row is None:
+            raise StopIteration
+        return row
+
+    def _registrar(self):
+        if not self._cerrado:
+            self._cerrado = True
+            self._metricas.registrar_sentencia(self._sql, self._ms, self._filas)
+
+    def __del__(self):
+        # consultas que no se leyeron hasta el final (fetchone de una sola fila, DML)
+        self._registrar()
+
+    def __getattr__(self, nombre):
+        return getattr(self._cursor, nombre)
+
+
+class ConexionMedida(sqlite3.Connection):
+    """
+    Conexión que mide cada execute/executemany y cada commit. Se crea con
+    sqlite3.connect(..., factory=ConexionMedida) y luego se llama a medir().
+    """
+    def medir(self, metricas: Metricas):
+        self._metricas = metricas
+        self.set_trace_callback(metricas.registrar_traza)
+
+    def execute(self, sql, params=()):
+        t0 = time.perf_counter()
+        cursor = super().execute(sql, params)
+        return _CursorMedido(cursor, self._metricas, sql, (time.perf_counter() - t0) * 1000)
+
+    def executemany(self, sql, params):
+        t0 = time.perf_counter()
+        cursor = super().executemany(sql, params)
+        ms = (time.perf_counter() - t0) * 1000
+        self._metricas.registrar_sentencia(sql, ms, 0)
+        return cursor
+
+    def commit(self):
+        t0 = time.perf_counter()
+        super().commit()
+        self._metricas.registrar_commit((time.perf_counter() - t0) * 1000)
+
+    def __exit__(self, exc_type, exc, tb):
+        # `with conn:` confirma sin pasar por commit(), se mide aquí
+        t0 = time.perf_counter()
+        res = super().__exit__(exc_type, exc, tb)
+        if exc_type is None:
+            self._metricas.registrar_commit((time.perf_counter() - t0) * 1000)
+        return res
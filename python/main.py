@@ -1,9 +1,15 @@
+import argparse
+
 import db_manager
-import ui_main
 
-def run():
-    db_manager.create_tables()
+def run(argv=None):
+    parser = argparse.ArgumentParser(description="Control de Gastos Personales")
+    parser.add_argument("--db", help="ruta de la base de datos (por defecto GASTOS_DB o gastos.db)")
+    args = parser.parse_args(argv)
+    db_manager.init_db(args.db)
+    # PyQt5 solo se carga cuando realmente se abre la interfaz
+    import ui_main
     ui_main.main()
 
 if __name__ == "__main__":
-    run()
\ No newline at end of file
+    run()
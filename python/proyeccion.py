@@ -0,0 +1,199 @@
+"""
+Proyección del presupuesto mes a mes para todos los usuarios a la vez.
+
+Por cada usuario se toma el ingreso, el porcentaje de ahorro, los gastos fijos por
+categoría (se repiten todos los meses) y el historial mensual de gastos variables
+por categoría (las tablas de resumen). Los gastos variables se extrapolan con el
+promedio de los últimos `ventana` meses con historial y, opcionalmente, con su
+tendencia lineal. Todo se calcula con arreglos de NumPy de forma
+(escenario, usuario, mes), así que proyectar miles de usuarios y varios escenarios
+cuesta unas pocas operaciones vectorizadas.
+
+Uso:
+    p = proyectar(meses=24, escenarios=[Escenario("Base"),
+                                         Escenario("Ahorro 20%", ahorro_porcentaje=20),
+                                         Escenario("Sin alquiler", factores_fijos={"Alquiler": 0})])
+    p.de_usuario(1, "Ahorro 20%")["disponible"]
+"""
+import datetime
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import numpy as np
+
+import db_manager
+from clases import CATEGORIES
+
+MESES_MIN = 1
+MESES_MAX = 60
+
+
+@dataclass(slots=True)
+class Escenario:
+    """
+    Variante "qué pasaría si". ahorro_porcentaje=None conserva el de cada usuario;
+    los factores multiplican los gastos de una categoría (0 los elimina).
+    """
+    nombre: str
+    ahorro_porcentaje: Optional[float] = None
+    factores_fijos: Dict[str, float] = field(default_factory=dict)
+    factores_variables: Dict[str, float] = field(default_factory=dict)
+
+
+class Proyeccion:
+    """
+    Resultado de proyectar(): arreglos de forma (escenario, usuario, mes), salvo
+    `ingreso`, `ahorro` y `fijos`, que no cambian de un mes a otro
+    (forma (escenario, usuario)).
+    """
+    def __init__(self, usuario_ids, meses, escenarios, ingreso, ahorro, fijos, variables):
+        self.usuario_ids = usuario_ids
+        self.meses = meses
+        self.escenarios = escenarios
+        self.ingreso = ingreso
+        self.ahorro = ahorro
+        self.fijos = fijos
+        self.variables = variables
+        self.disponible = (ingreso - ahorro - fijos)[:, :, None] - variables
+        self.ahorro_acumulado = np.cumsum(np.broadcast_to(ahorro[:, :, None], variables.shape), axis=2)
+        self.disponible_acumulado = np.cumsum(self.disponible, axis=2)
+        self._posicion = {int(uid): i for i, uid in enumerate(usuario_ids)}
+
+    def _indice_escenario(self, escenario) -> int:
+        if isinstance(escenario, int):
+            return escenario
+        return [e.nombre for e in self.escenarios].index(escenario)
+
+    def de_usuario(self, usuario_id: int, escenario=0) -> dict:
+        """
+        Serie mensual de un usuario en un escenario (índice o nombre), con listas
+        de floats listas para mostrar.
+        """
+        s = self._indice_escenario(escenario)
+        u = self._posicion[usuario_id]
+        n = len(self.meses)
+        return {
+            "escenario": self.escenarios[s].nombre,
+            "meses": list(self.meses),
+            "ingreso": [round(float(self.ingreso[s, u]), 2)] * n,
+            "ahorro": [round(float(self.ahorro[s, u]), 2)] * n,
+            "fijos": [round(float(self.fijos[s, u]), 2)] * n,
+            "variables": np.round(self.variables[s, u], 2).tolist(),
+            "disponible": np.round(self.disponible[s, u], 2).tolist(),
+            "ahorro_acumulado": np.round(self.ahorro_acumulado[s, u], 2).tolist(),
+            "disponible_acumulado": np.round(self.disponible_acumulado[s, u], 2).tolist(),
+        }
+
+    def meses_en_deficit(self) -> np.ndarray:
+        """
+        Cantidad de meses con presupuesto negativo, forma (escenario, usuario).
+        """
+        return (self.disponible < 0).sum(axis=2)
+
+
+def _meses_siguientes(desde: datetime.date, n: int) -> List[str]:
+    inicio = np.datetime64(desde, "M") + 1
+    return [str(m) for m in np.arange(inicio, inicio + n)]
+
+
+def _factores(escenarios, campo) -> np.ndarray:
+    # (escenario, categoria)
+    f = np.ones((len(escenarios), len(CATEGORIES)))
+    for s, e in enumerate(escenarios):
+        for categoria, factor in getattr(e, campo).items():
+            f[s, CATEGORIES.index(categoria)] = factor
+    return f
+
+
+def _filas_de(ids, posicion, uids) -> np.ndarray:
+    # índice de cada fila dentro de `ids`; con todos los usuarios los ids vienen
+    # ordenados y alcanza con searchsorted
+    if posicion is None:
+        return np.searchsorted(ids, uids)
+    return np.fromiter((posicion[int(x)] for x in uids), dtype=np.intp, count=len(uids))
+
+
+def _codigos(codigos) -> np.ndarray:
+    # categorías desconocidas cuentan como "Otros"
+    return np.where(codigos < 0, CATEGORIES.index("Otros"), codigos)
+
+
+def _historial(ids, posicion, ventana, tendencia):
+    """
+    Promedio mensual por categoría (usuario, categoria) y, si se pide, la pendiente
+    de la recta ajustada sobre la ventana (0 si no).
+    """
+    u_count, c_count = len(ids), len(CATEGORIES)
+    filas = np.fromiter(
+        db_manager.cursor_historial_variables(CATEGORIES, ventana, None if posicion is None else list(posicion)),
+        dtype=[("uid", "i8"), ("atras", "i4"), ("codigo", "i2"), ("total", "f8"), ("historial", "i4")],
+    )
+    u = _filas_de(ids, posicion, filas["uid"])
+    codigos = _codigos(filas["codigo"])
+
+    # meses usados por usuario: la ventana, o menos si su historial es más corto
+    n = np.zeros(u_count)
+    n[u] = np.minimum(filas["historial"], ventana)
+    suma = np.zeros((u_count, c_count))
+    np.add.at(suma, (u, codigos), filas["total"])
+    con_datos = n > 0
+    media = np.zeros((u_count, c_count))
+    media[con_datos] = suma[con_datos] / n[con_datos, None]
+    pendiente = np.zeros((u_count, c_count))
+    if tendencia:
+        # mínimos cuadrados con t = 0 en el último mes y t = -(n-1) en el primero;
+        # los meses sin gastos cuentan como 0
+        t = -filas["atras"].astype(float)
+        suma_ty = np.zeros((u_count, c_count))
+        np.add.at(suma_ty, (u, codigos), t * filas["total"])
+        t_medio = -(n - 1) / 2
+        sxx = n * (n * n - 1) / 12
+        ok = sxx > 0
+        pendiente[ok] = (suma_ty[ok] - t_medio[ok, None] * suma[ok]) / sxx[ok, None]
+        media = media - pendiente * t_medio[:, None]  # valor de la recta en t = 0
+    return media, pendiente
+
+
+def proyectar(usuario_ids=None, meses: int = 12, escenarios: List[Escenario] = None, ventana: int = 6,
+              tendencia: bool = False, desde: datetime.date = None) -> Proyeccion:
+    """
+    Proyecta `meses` meses (1 a 60) a partir del mes siguiente a `desde` (hoy por
+    defecto) para `usuario_ids` (todos si es None) y cada escenario (solo "Base"
+    si no se indican).
+    """
+    if not MESES_MIN <= meses <= MESES_MAX:
+        raise ValueError(f"meses debe estar entre {MESES_MIN} y {MESES_MAX}")
+    if ventana < 1:
+        raise ValueError("ventana debe ser al menos 1")
+    escenarios = escenarios or [Escenario("Base")]
+    desde = desde or datetime.date.today()
+
+    if usuario_ids is not None:
+        usuario_ids = [int(x) for x in usuario_ids]
+    base = np.fromiter(db_manager.cursor_usuarios_base(usuario_ids),
+                       dtype=[("id", "i8"), ("ingreso", "f8"), ("ahorro", "f8")])
+    ids = base["id"].copy()
+    posicion = None if usuario_ids is None else {int(x): i for i, x in enumerate(ids)}
+
+    fijos_cat = np.zeros((len(ids), len(CATEGORIES)))
+    f = np.fromiter(db_manager.cursor_fijos_por_categoria(CATEGORIES, None if posicion is None else list(posicion)),
+                    dtype=[("uid", "i8"), ("codigo", "i2"), ("total", "f8")])
+    np.add.at(fijos_cat, (_filas_de(ids, posicion, f["uid"]), _codigos(f["codigo"])), f["total"])
+
+    media, pendiente = _historial(ids, posicion, ventana, tendencia)
+
+    # escenarios: (escenario, usuario)
+    pct = np.array([np.nan if e.ahorro_porcentaje is None else e.ahorro_porcentaje for e in escenarios])
+    pct = np.where(np.isnan(pct)[:, None], base["ahorro"][None, :], pct[:, None])
+    ingreso = np.broadcast_to(base["ingreso"][None, :], pct.shape)
+    ahorro = ingreso * pct / 100.0
+    fijos = (fijos_cat @ _factores(escenarios, "factores_fijos").T).T
+
+    # gastos variables: (escenario, usuario) + pendiente * t, con t = 1..meses
+    fv = _factores(escenarios, "factores_variables").T
+    t = np.arange(1, meses + 1, dtype=float)
+    variables = (media @ fv).T[:, :, None] + (pendiente @ fv).T[:, :, None] * t[None, None, :]
+    # con tendencia a la baja la recta puede cruzar el cero: no hay gastos negativos
+    np.maximum(variables, 0.0, out=variables)
+
+    return Proyeccion(ids, _meses_siguientes(desde, meses), escenarios, ingreso, ahorro, fijos, variables)
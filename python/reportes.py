@@ -0,0 +1,137 @@
+"""
+Reportes de fin de mes sin interfaz gráfica.
+
+Genera para cada usuario el mismo contenido que el reporte de la ventana principal
+(ingreso, ahorro, totales, presupuesto disponible y advertencia de sobrecompromiso)
+en texto, CSV o JSON Lines. Los usuarios se reparten entre varios procesos, cada uno
+con su propia conexión de solo lectura, y cada resultado se escribe apenas termina.
+
+Uso (desde la carpeta python/):
+    python reportes.py                          # todos los usuarios, texto
+    python reportes.py --formato csv --salida reporte.csv
+    python reportes.py --usuarios 1 5 7 --formato json
+    python reportes.py --procesos 8 --db /ruta/gastos.db
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+
+import db_manager
+from clases import Usuario
+
+FORMATOS = ("texto", "csv", "json")
+
+COLUMNAS_CSV = [
+    "usuario_id", "nombre", "ingreso", "ahorro_porcentaje", "ahorro", "gastos_fijos", "gastos_variables",
+    "presupuesto_disponible", "compromiso_total", "porcentaje_uso", "excede_ingreso",
+]
+
+
+def reporte_usuario(usuario_id: int):
+    """
+    Reporte de un usuario como dict (None si no existe).
+    """
+    u = Usuario.from_db(usuario_id)
+    if u is None:
+        return None
+    r = u.summary()
+    return {
+        "usuario_id": u.id,
+        "nombre": u.nombre,
+        "ingreso": r.ingreso,
+        "ahorro_porcentaje": u.ahorro_porcentaje,
+        "ahorro": r.ahorro,
+        "gastos_fijos": r.gastos_fijos,
+        "gastos_variables": r.gastos_variables,
+        "presupuesto_disponible": r.presupuesto_disponible,
+        "compromiso_total": r.compromiso_total,
+        "porcentaje_uso": r.porcentaje_uso,
+        "excede_ingreso": r.excede_ingreso,
+        "texto": r.lineas_reporte(u),
+    }
+
+
+# -------------------- Procesos --------------------
+def _init_proceso(db_path: str):
+    db_manager.init_db(db_path, solo_lectura=True)
+
+
+def _reporte_lote(ids):
+    return [r for r in (reporte_usuario(uid) for uid in ids) if r is not None]
+
+
+def _lotes(ids, tamano):
+    for i in range(0, len(ids), tamano):
+        yield ids[i:i + tamano]
+
+
+def generar(ids, db_path: str, procesos: int, lote: int = 50, ordenado: bool = False):
+    """
+    Genera los reportes de `ids` a medida que terminan. Con procesos <= 1 se
+    generan en este mismo proceso.
+    """
+    if procesos <= 1 or len(ids) <= lote:
+        _init_proceso(db_path)
+        for grupo in _lotes(ids, lote):
+            yield from _reporte_lote(grupo)
+        return
+    with multiprocessing.Pool(procesos, initializer=_init_proceso, initargs=(db_path,)) as pool:
+        mapa = pool.imap if ordenado else pool.imap_unordered
+        for resultados in mapa(_reporte_lote, _lotes(ids, lote)):
+            yield from resultados
+
+
+# -------------------- Salida --------------------
+class Escritor:
+    def __init__(self, f, formato: str):
+        self.f = f
+        self.formato = formato
+        self._csv = None
+        if formato == "csv":
+            self._csv = csv.DictWriter(f, fieldnames=COLUMNAS_CSV, extrasaction="ignore")
+            self._csv.writeheader()
+
+    def escribir(self, reporte: dict):
+        if self.formato == "texto":
+            self.f.write("\n".join(reporte["texto"]) + "\n\n")
+        elif self.formato == "csv":
+            self._csv.writerow(reporte)
+        else:
+            self.f.write(json.dumps(reporte, ensure_ascii=False) + "\n")
+        self.f.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", help="ruta de la base de datos (por defecto GASTOS_DB o gastos.db)")
+    parser.add_argument("--usuarios", type=int, nargs="+", help="ids de usuario (por defecto, todos)")
+    parser.add_argument("--formato", choices=FORMATOS, default="texto")
+    parser.add_argument("--salida", help="archivo de salida (por defecto, salida estándar)")
+    parser.add_argument("--procesos", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--lote", type=int, default=50, help="usuarios por tarea")
+    parser.add_argument("--ordenado", action="store_true", help="respetar el orden de los ids en la salida")
+    args = parser.parse_args(argv)
+
+    # el proceso principal aplica las migraciones; los procesos de trabajo solo leen
+    db_path = db_manager.init_db(args.db)
+    ids = args.usuarios or db_manager.get_usuario_ids()
+    db_manager.close_all_connections()
+
+    f = open(args.salida, "w", newline="", encoding="utf-8") if args.salida else sys.stdout
+    try:
+        escritor = Escritor(f, args.formato)
+        total = 0
+        for reporte in generar(ids, db_path, args.procesos, args.lote, args.ordenado):
+            escritor.escribir(reporte)
+            total += 1
+    finally:
+        if args.salida:
+            f.close()
+    print(f"{total} reportes generados.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+"""
+Servicio HTTP local (solo biblioteca estándar) que expone db_manager como JSON.
+
+Varios programas (la interfaz, scripts, un tablero) pueden compartir la misma
+base a través de un solo proceso:
+  - las lecturas usan un pool de conexiones de solo consulta, una por petición
+    en curso (y por shard), sin abrir ni cerrar el archivo en cada llamada;
+  - las escrituras pasan por un único hilo escritor. Lo que se acumula mientras
+    confirma un lote se aplica junto en la transacción siguiente (group commit):
+    un commit para muchas escrituras, y cada una sigue siendo atómica.
+
+Protocolo:
+    POST /api/<funcion>   {"args": [...], "kwargs": {...}}
+        -> {"resultado": ..., "tipo": "valor" | "fila" | "filas", "cambios": [[usuario_id, tabla], ...]}
+    GET  /salud           -> estado del pool y del escritor
+
+Uso (desde la carpeta python/):
+    python servicio.py --db gastos.db --puerto 8765
+"""
+import argparse
+import json
+import queue
+import sqlite3
+import sys
+import threading
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import db_manager
+
+PUERTO = 8765
+
+# Funciones de db_manager que se exponen
+LECTURAS = frozenset({
+    "get_usuario", "get_usuario_por_nombre", "get_all_usuarios", "get_usuario_ids", "buscar_usuarios",
+    "get_usuario_resumen",
+    "get_gastos_fijos", "get_gastos_variables", "total_gastos_fijos", "total_gastos_variables",
+    "get_gasto_fijo", "get_gasto_variable", "get_gastos_page", "query_gastos_variables",
+    "get_resumen_mensual", "get_resumen_categorias", "get_resumen_mensual_categorias", "get_resumen_fijos",
+    "cursor_gastos_variables_columnas",
+})
+ESCRITURAS = frozenset({
+    "insert_usuario", "insert_usuario_return_id", "update_usuario", "update_ahorro_porcentaje", "delete_usuario",
+    "insert_gasto_fijo", "update_gasto_fijo", "delete_gasto_fijo", "insert_gastos_fijos_bulk",
+    "insert_gasto_variable", "update_gasto_variable", "delete_gasto_variable", "insert_gastos_variables_bulk",
+})
+
+
+# -------------------- Pool de lectura --------------------
+class PoolConexiones:
+    """
+    `tamano` lecturas en curso a la vez. Con shards, cada lugar del pool tiene una
+    conexión de solo consulta por archivo (un pool por shard, del mismo tamaño), y
+    una petición se lleva las de todos los archivos, así que ninguna lectura abre
+    conexiones propias.
+    """
+    def __init__(self, tamano: int):
+        self.tamano = tamano
+        self._libres = queue.Queue()
+        for _ in range(tamano):
+            conexiones = {numero: db_manager.abrir_conexion(numero) for numero in db_manager.shards()}
+            for conn in conexiones.values():
+                conn.execute("PRAGMA query_only = ON")
+            self._libres.put(conexiones)
+
+    def ejecutar(self, fn, *args, **kwargs):
+        conexiones = self._libres.get()
+        try:
+            with db_manager.conexion_prestada(conexiones[0], conexiones):
+                resultado = fn(*args, **kwargs)
+                if hasattr(resultado, "__next__"):
+                    # los cursores (o la unión de los de cada shard) se leen antes
+                    # de devolver las conexiones
+                    resultado = list(resultado)
+                return resultado
+        finally:
+            self._libres.put(conexiones)
+
+    def cerrar(self):
+        while not self._libres.empty():
+            for conn in self._libres.get_nowait().values():
+                conn.close()
+
+    @property
+    def libres(self) -> int:
+        return self._libres.qsize()
+
+
+# -------------------- Escritor único --------------------
+class Escritor(threading.Thread):
+    """
+    Hilo que aplica todas las escrituras. Toma lo que haya en la cola (hasta
+    `max_lote`), lo ejecuta dentro de db_manager.escrituras_agrupadas() y recién
+    después del commit responde a cada petición con su resultado o su error.
+    """
+    def __init__(self, max_lote: int = 256):
+        super().__init__(name="escritor", daemon=True)
+        self.max_lote = max_lote
+        self._cola = queue.Queue()
+        self.escrituras = 0
+        self.lotes = 0
+
+    def enviar(self, fn, *args, **kwargs) -> Future:
+        futuro = Future()
+        self._cola.put((futuro, fn, args, kwargs))
+        return futuro
+
+    def detener(self):
+        self._cola.put(None)
+        self.join()
+
+    def run(self):
+        while True:
+            lote = [self._cola.get()]
+            while len(lote) < self.max_lote:
+                try:
+                    lote.append(self._cola.get_nowait())
+                except queue.Empty:
+                    break
+            fin = None in lote
+            lote = [x for x in lote if x is not None]
+            if lote:
+                self._aplicar(lote)
+            if fin:
+                db_manager.close_connection()
+                return
+
+    def _aplicar(self, lote):
+        respuestas = []
+        try:
+            with db_manager.escrituras_agrupadas() as cambios:
+                for futuro, fn, args, kwargs in lote:
+                    antes = len(cambios)
+                    try:
+                        resultado = fn(*args, **kwargs)
+                    except Exception as e:
+                        respuestas.append((futuro, None, e, []))
+                    else:
+                        respuestas.append((futuro, resultado, None, cambios[antes:]))
+        except Exception as e:
+            # falló el commit: no se guardó nada del lote
+            for futuro, *_ in lote:
+                futuro.set_exception(e)
+            return
+        self.escrituras += len(lote)
+        self.lotes += 1
+        for futuro, resultado, error, cambios_op in respuestas:
+            if error is not None:
+                futuro.set_exception(error)
+            else:
+                futuro.set_result((resultado, cambios_op))
+
+
+# -------------------- HTTP --------------------
+def _tipo(resultado):
+    if isinstance(resultado, tuple):
+        return "fila"
+    if isinstance(resultado, list) and resultado and isinstance(resultado[0], tuple):
+        return "filas"
+    return "valor"
+
+
+class _Manejador(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # conexiones persistentes entre peticiones
+    # cabeceras y cuerpo salen en dos escrituras: sin esto Nagle + ACK retardado suman ~40 ms
+    disable_nagle_algorithm = True
+    server: "ServidorGastos"
+
+    def _responder(self, estado: int, cuerpo: dict):
+        datos = json.dumps(cuerpo, ensure_ascii=False).encode("utf-8")
+        self.send_response(estado)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def do_GET(self):
+        if self.path == "/salud":
+            self._responder(200, self.server.estado())
+        else:
+            self._responder(404, {"error": "Ruta inexistente"})
+
+    def do_POST(self):
+        largo = int(self.headers.get("Content-Length") or 0)
+        cuerpo = self.rfile.read(largo)
+        if not self.path.startswith("/api/"):
+            self._responder(404, {"error": "Ruta inexistente"})
+            return
+        nombre = self.path[len("/api/"):]
+        if nombre not in LECTURAS and nombre not in ESCRITURAS:
+            self._responder(404, {"error": f"Función desconocida: {nombre}"})
+            return
+        try:
+            peticion = json.loads(cuerpo or b"{}")
+            args, kwargs = peticion.get("args", []), peticion.get("kwargs", {})
+        except (ValueError, AttributeError):
+            self._responder(400, {"error": "JSON inválido"})
+            return
+        # se busca en cada llamada para respetar las trazas de db_manager
+        fn = getattr(db_manager, nombre)
+        try:
+            if nombre in LECTURAS:
+                resultado, cambios = self.server.pool.ejecutar(fn, *args, **kwargs), []
+            else:
+                resultado, cambios = self.server.escritor.enviar(fn, *args, **kwargs).result()
+        except (TypeError, ValueError) as e:
+            self._responder(400, {"error": str(e), "tipo_error": type(e).__name__})
+        except sqlite3.IntegrityError as e:
+            self._responder(409, {"error": str(e), "tipo_error": type(e).__name__})
+        except Exception as e:
+            self._responder(500, {"error": str(e), "tipo_error": type(e).__name__})
+        else:
+            self._responder(200, {"resultado": resultado, "tipo": _tipo(resultado), "cambios": cambios})
+
+    def log_message(self, formato, *args):
+        if self.server.verbose:
+            super().log_message(formato, *args)
+
+
+class ServidorGastos(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, direccion, pool: int = 8, max_lote: int = 256, verbose: bool = False):
+        super().__init__(direccion, _Manejador)
+        self.verbose = verbose
+        self.pool = PoolConexiones(pool)
+        self.escritor = Escritor(max_lote)
+        self.escritor.start()
+
+    def estado(self) -> dict:
+        return {
+            "ok": True,
+            "db": db_manager.DB_NAME,
+            "pool": self.pool.tamano,
+            "pool_libres": self.pool.libres,
+            "escrituras": self.escritor.escrituras,
+            "lotes": self.escritor.lotes,
+            "escrituras_por_lote": round(self.escritor.escrituras / self.escritor.lotes, 2) if self.escritor.lotes else 0.0,
+        }
+
+    def cerrar(self):
+        self.shutdown()
+        self.server_close()
+        self.escritor.detener()
+        self.pool.cerrar()
+
+
+def crear_servidor(host: str = "127.0.0.1", puerto: int = PUERTO, db: str = None, pool: int = 8,
+                   max_lote: int = 256, verbose: bool = False) -> ServidorGastos:
+    """
+    Aplica las migraciones y crea el servidor (sin arrancarlo: serve_forever()).
+    Con puerto=0 el sistema elige uno libre (server_address lo informa).
+    """
+    db_manager.init_db(db)
+    return ServidorGastos((host, puerto), pool, max_lote, verbose)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", help="ruta de la base de datos (por defecto GASTOS_DB o gastos.db)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=PUERTO)
+    parser.add_argument("--pool", type=int, default=8, help="conexiones de lectura")
+    parser.add_argument("--max-lote", type=int, default=256, help="escrituras por commit como máximo")
+    parser.add_argument("--verbose", action="store_true", help="registrar cada petición")
+    args = parser.parse_args(argv)
+
+    servidor = crear_servidor(args.host, args.puerto, args.db, args.pool, args.max_lote, args.verbose)
+    host, puerto = servidor.server_address[:2]
+    print(f"Sirviendo {db_manager.DB_NAME} en http://{host}:{puerto}", file=sys.stderr)
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.cerrar()
+
+
+if __name__ == "__main__":
+    main()
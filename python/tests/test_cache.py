@@ -0,0 +1,104 @@
+"""
+Caché de usuarios (clases.CacheUsuarios): los resúmenes guardados se corrigen
+con los eventos de cada escritura y nunca quedan desfasados de la base, tampoco
+para objetos que salieron del mapa.
+
+Desde la carpeta python/:
+    python -m unittest discover tests
+"""
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+import clases
+import db_manager
+from clases import Usuario
+
+
+class CacheUsuariosTest(unittest.TestCase):
+    def setUp(self):
+        self.carpeta = tempfile.TemporaryDirectory()
+        self.ruta = os.path.join(self.carpeta.name, "gastos.db")
+        db_manager.init_db(self.ruta)
+        clases.cache_usuarios.limpiar()
+        self.capacidad = clases.cache_usuarios.capacidad
+
+    def tearDown(self):
+        clases.cache_usuarios.capacidad = self.capacidad
+        db_manager.close_all_connections()
+        clases.cache_usuarios.limpiar()
+        self.carpeta.cleanup()
+
+    def assertIgualBase(self, u):
+        self.assertEqual(u.summary(), clases.ResumenUsuario(*db_manager.get_usuario_resumen(u.id)))
+
+    def test_resumen_corregido_con_eventos(self):
+        u = Usuario.create("ana", 1000, 10)
+        u.summary()
+        u.agregar_gasto_fijo("Comida", 100)
+        u.agregar_gasto_variable("Ocio", 20.05, "2024-01-01")
+        self.assertIs(Usuario.from_db(u.id), u)
+        r = u.resumen_en_cache()
+        self.assertIsNotNone(r)
+        self.assertEqual(r.presupuesto_disponible, 779.95)
+        self.assertIgualBase(u)
+
+    def test_desalojado_y_escrito(self):
+        clases.cache_usuarios.capacidad = 2
+        u = Usuario.create("ana", 1000, 10)
+        u.summary()
+        for i in range(3):
+            Usuario.create(f"otro{i}", 100, 0).summary()
+        self.assertIsNone(Usuario.en_cache(u.id))
+        self.assertIsNone(u.resumen_en_cache())
+        u.agregar_gasto_variable("Ocio", 50, "2024-01-01")
+        self.assertEqual(u.summary().gastos_variables, 50.0)
+        self.assertIgualBase(u)
+        # el objeto suelto no vuelve a guardar un resumen que nadie corregiría
+        self.assertIsNone(u.resumen_en_cache())
+        v = Usuario.from_db(u.id)
+        self.assertIsNot(v, u)
+        v.summary()
+        u.agregar_gasto_fijo("Vivienda", 300)
+        self.assertEqual(v.resumen_en_cache().gastos_fijos, 300.0)
+        self.assertIgualBase(v)
+        self.assertIgualBase(u)
+
+    def test_limpiar_suelta_los_resumenes(self):
+        u = Usuario.create("ana", 1000, 10)
+        u.summary()
+        clases.cache_usuarios.limpiar()
+        u.agregar_gasto_fijo("Comida", 100)
+        self.assertIsNone(u.resumen_en_cache())
+        self.assertIgualBase(u)
+
+    def test_escrituras_de_otro_hilo_no_vacian_la_cache(self):
+        u = Usuario.create("ana", 1000, 10)
+        u.summary()
+        hilo = threading.Thread(target=db_manager.insert_gasto_fijo, args=(u.id, "Comida", 100))
+        hilo.start()
+        hilo.join()
+        self.assertIs(Usuario.from_db(u.id), u)
+        self.assertEqual(u.resumen_en_cache().gastos_fijos, 100.0)
+        self.assertIgualBase(u)
+
+    def test_escrituras_de_otro_proceso(self):
+        u = Usuario.create("ana", 1000, 10)
+        u.summary()
+        Usuario.from_db(u.id)
+        # una conexión que no es de db_manager, como la de otro proceso
+        conn = sqlite3.connect(self.ruta)
+        with conn:
+            conn.execute("INSERT INTO gastos_fijos (usuario_id, categoria, monto) VALUES (?, 'Salud', 4000)",
+                         (u.id,))
+        conn.close()
+        v = Usuario.from_db(u.id)
+        self.assertIsNot(v, u)
+        self.assertEqual(v.summary().gastos_fijos, 40.0)
+        self.assertIgualBase(u)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+"""
+Importación de gastos desde CSV: convención de signo y abonos.
+
+Desde la carpeta python/:
+    python -m unittest discover tests
+"""
+import io
+import os
+import tempfile
+import unittest
+
+import db_manager
+import importador
+
+
+def leer(texto, **kwargs):
+    resultado = importador.ResultadoImportacion()
+    filas = list(importador.leer_gastos(io.StringIO(texto), 1, resultado, **kwargs))
+    return filas, resultado
+
+
+class ParseMontoTest(unittest.TestCase):
+    def test_conserva_el_signo(self):
+        self.assertEqual(importador.parse_monto("1.234,50"), 1234.5)
+        self.assertEqual(importador.parse_monto("-$ 3,5"), -3.5)
+        self.assertEqual(importador.parse_monto("(20,00)"), -20.0)
+
+
+class LeerGastosTest(unittest.TestCase):
+    def test_formato_propio_con_signos_mezclados(self):
+        # una devolución negativa no convierte el archivo en un extracto con signo
+        filas, resultado = leer("fecha;categoria;monto\n"
+                                "2024-03-01;Comida;1.234,50\n"
+                                "2024-03-02;xx;-5\n"
+                                "2024-03-03;Transporte;10\n")
+        self.assertEqual(filas, [(1, "Comida", 1234.5, "2024-03-01"), (1, "Transporte", 10.0, "2024-03-03")])
+        self.assertEqual((resultado.abonos, resultado.omitidos), (1, 0))
+
+    def test_extracto_con_saldo(self):
+        filas, resultado = leer("Fecha;Concepto;Importe;Saldo\n"
+                                "01/02/2024;Comida;-1.234,50;100\n"
+                                "02/02/2024;Nómina;2.500,00;2600\n"
+                                "04/02/2024;Transporte;(20,00);2580\n")
+        self.assertEqual(filas, [(1, "Comida", 1234.5, "2024-02-01"), (1, "Transporte", 20.0, "2024-02-04")])
+        self.assertEqual(resultado.abonos, 1)
+
+    def test_signo_explicito(self):
+        filas, resultado = leer("fecha,categoria,monto\n2024-01-01,Transporte,-10\n2024-01-02,Otros,5\n",
+                                gastos_negativos=True)
+        self.assertEqual(filas, [(1, "Transporte", 10.0, "2024-01-01")])
+        self.assertEqual(resultado.abonos, 1)
+
+    def test_cargos_y_abonos_separados(self):
+        filas, resultado = leer("fecha,descripcion,debe,haber\n"
+                                "2024-01-01,Transporte,10.00,\n"
+                                "2024-01-02,Transferencia,,500\n"
+                                "2024-01-03,Salud,-3.50,\n")
+        self.assertEqual(filas, [(1, "Transporte", 10.0, "2024-01-01"), (1, "Salud", 3.5, "2024-01-03")])
+        self.assertEqual((resultado.abonos, resultado.omitidos), (1, 0))
+
+    def test_montos_invalidos(self):
+        filas, resultado = leer("fecha,categoria,monto\n2024-01-01,Transporte,0\n2024-01-02,Transporte,abc\n")
+        self.assertEqual(filas, [])
+        self.assertEqual(resultado.omitidos, 2)
+
+
+class ImportarGastosTest(unittest.TestCase):
+    def setUp(self):
+        self.carpeta = tempfile.TemporaryDirectory()
+        db_manager.init_db(os.path.join(self.carpeta.name, "gastos.db"))
+        self.usuario_id = db_manager.insert_usuario_return_id("ana", 1000, 10)
+
+    def tearDown(self):
+        db_manager.close_all_connections()
+        self.carpeta.cleanup()
+
+    def test_formato_propio_con_signos_mezclados(self):
+        ruta = os.path.join(self.carpeta.name, "gastos.csv")
+        with open(ruta, "w", encoding="utf-8") as f:
+            f.write("fecha;categoria;monto\n2024-03-01;Comida;1.234,50\n2024-03-02;xx;-5\n")
+        resultado = importador.importar_gastos_variables(ruta, self.usuario_id)
+        self.assertEqual((resultado.insertados, resultado.abonos), (1, 1))
+        self.assertEqual([g[2:] for g in db_manager.get_gastos_variables(self.usuario_id)],
+                         [("Comida", 1234.5, "2024-03-01")])
+
+
+if __name__ == "__main__":
+    unittest.main()
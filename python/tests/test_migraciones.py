@@ -0,0 +1,127 @@
+"""
+Migraciones sobre una base creada con el esquema original (importes REAL y sin
+schema_version), como un gastos.db de antes de las migraciones.
+
+Desde la carpeta python/:
+    python -m unittest discover tests
+"""
+import os
+import sqlite3
+import tempfile
+import unittest
+
+import clases
+import db_manager
+
+# -------------------- Esquema original --------------------
+ESQUEMA_ORIGINAL = [
+    """
+    CREATE TABLE IF NOT EXISTS usuarios (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nombre TEXT NOT NULL,
+        ingreso REAL NOT NULL,
+        ahorro_porcentaje REAL NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS gastos_fijos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        usuario_id INTEGER NOT NULL,
+        categoria TEXT NOT NULL,
+        monto REAL NOT NULL,
+        FOREIGN KEY(usuario_id) REFERENCES usuarios(id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS gastos_variables (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        usuario_id INTEGER NOT NULL,
+        categoria TEXT NOT NULL,
+        monto REAL NOT NULL,
+        fecha TEXT NOT NULL,
+        FOREIGN KEY(usuario_id) REFERENCES usuarios(id)
+    )
+    """,
+]
+
+USUARIOS = [("ana", 100.05, 12.5), ("beto", 2500.0, 10.0)]
+FIJOS = [(1, "Vivienda", 19.99), (1, "Servicios", 0.1 + 0.2), (2, "Salud", 1234.56)]
+VARIABLES = [
+    (1, "Comida", 0.1, "2024-01-03"),
+    (1, "Comida", 0.2, "2024-01-15"),
+    (1, "Ocio", 7.35, "2024-02-01"),
+    (2, "Transporte", 45.5, "2024-02-10"),
+    (2, "Otros", 3.0, "2024-02-11"),  # se borra: el siguiente id no debe reutilizarse
+]
+
+
+class MigracionCentavosTest(unittest.TestCase):
+    def setUp(self):
+        self.carpeta = tempfile.TemporaryDirectory()
+        self.ruta = os.path.join(self.carpeta.name, "gastos.db")
+        conn = sqlite3.connect(self.ruta)
+        for sql in ESQUEMA_ORIGINAL:
+            conn.execute(sql)
+        conn.executemany("INSERT INTO usuarios (nombre, ingreso, ahorro_porcentaje) VALUES (?, ?, ?)", USUARIOS)
+        conn.executemany("INSERT INTO gastos_fijos (usuario_id, categoria, monto) VALUES (?, ?, ?)", FIJOS)
+        conn.executemany("INSERT INTO gastos_variables (usuario_id, categoria, monto, fecha) VALUES (?, ?, ?, ?)",
+                         VARIABLES)
+        conn.execute("DELETE FROM gastos_variables WHERE id = ?", (len(VARIABLES),))
+        conn.commit()
+        conn.close()
+        db_manager.init_db(self.ruta)
+
+    def tearDown(self):
+        db_manager.close_all_connections()
+        clases.cache_usuarios.limpiar()
+        self.carpeta.cleanup()
+
+    def test_llega_a_la_ultima_version(self):
+        self.assertEqual(db_manager.get_schema_version(), db_manager.MIGRATIONS[-1][0])
+        # volver a migrar no hace nada
+        self.assertEqual(db_manager.migrate(), db_manager.MIGRATIONS[-1][0])
+
+    def test_importes_guardados_como_enteros(self):
+        conn = db_manager.get_connection()
+        self.assertEqual(conn.execute("SELECT ingreso, ahorro_porcentaje FROM usuarios ORDER BY id").fetchall(),
+                         [(10005, 1250), (250000, 1000)])
+        self.assertEqual([r[0] for r in conn.execute("SELECT monto FROM gastos_fijos ORDER BY id")],
+                         [1999, 30, 123456])
+        self.assertEqual([r[0] for r in conn.execute("SELECT monto FROM gastos_variables ORDER BY id")],
+                         [10, 20, 735, 4550])
+        for tabla, columna in (("usuarios", "ingreso"), ("usuarios", "ahorro_porcentaje"),
+                               ("gastos_fijos", "monto"), ("gastos_variables", "monto")):
+            tipos = conn.execute(f"SELECT DISTINCT typeof({columna}) FROM {tabla}").fetchall()
+            self.assertEqual(tipos, [("integer",)], f"{tabla}.{columna}")
+
+    def test_lecturas_devuelven_las_mismas_unidades(self):
+        self.assertEqual(db_manager.get_usuario(1), (1, "ana", 100.05, 12.5))
+        self.assertEqual(sorted(r[3] for r in db_manager.get_gastos_fijos(1)), [0.3, 19.99])
+        self.assertEqual(db_manager.get_gastos_variables(2), [(4, 2, "Transporte", 45.5, "2024-02-10")])
+
+    def test_resumenes_recalculados(self):
+        self.assertEqual(db_manager.verify_resumenes(), [])
+        # ahorro: 100.05 al 12.5 % = 12.50625 -> 12.51, redondeando mitades hacia arriba
+        ingreso, ahorro, fijos, variables, disponible, compromiso = db_manager.get_usuario_resumen(1)
+        self.assertEqual((ingreso, ahorro, fijos, variables), (100.05, 12.51, 20.29, 7.65))
+        self.assertEqual(disponible, 59.6)
+        self.assertEqual(compromiso, 40.45)
+        u = clases.Usuario.from_db(1)
+        self.assertEqual(u.calcular_ahorro(), ahorro)
+
+    def test_autoincrement_conservado(self):
+        db_manager.insert_gasto_variable(2, "Otros", 1, "2024-03-01")
+        ids = sorted(r[0] for r in db_manager.get_gastos_variables(2))
+        self.assertEqual(ids, [4, len(VARIABLES) + 1])
+        self.assertEqual(db_manager.verify_resumenes(), [])
+
+
+class CalcularAhorroTest(unittest.TestCase):
+    def test_redondea_como_la_base(self):
+        # 100.05 al 50 % es 50.025: en float da 50.02, en centavos 50.03
+        self.assertEqual(clases.Usuario(1, "x", 100.05, 50).calcular_ahorro(), 50.03)
+        self.assertEqual(clases.Usuario(1, "x", 0.0, 10).calcular_ahorro(), 0.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+"""
+Servicio HTTP (servicio.py) con su cliente: una escritura respondida ya está
+confirmada en disco, también con la escritura diferida activa, y con shards las
+lecturas van por el pool de solo consulta de cada archivo.
+
+Desde la carpeta python/:
+    python -m unittest discover tests
+"""
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import clases
+import cliente
+import db_manager
+import servicio
+
+
+class ServicioTest(unittest.TestCase):
+    def setUp(self):
+        self.carpeta = tempfile.TemporaryDirectory()
+        self.ruta = os.path.join(self.carpeta.name, "gastos.db")
+        with mock.patch.dict(os.environ, {"GASTOS_ESCRITURA_DIFERIDA": "1"}):
+            self.servidor = servicio.crear_servidor(puerto=0, db=self.ruta, pool=2)
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+        self.cliente = cliente.ClienteServicio("http://127.0.0.1:%d" % self.servidor.server_address[1])
+
+    def tearDown(self):
+        self.cliente.cerrar()
+        self.servidor.cerrar()
+        db_manager.deshabilitar_escritura_diferida()
+        db_manager.close_all_connections()
+        clases.cache_usuarios.limpiar()
+        self.carpeta.cleanup()
+
+    def filas_en_disco(self, sql, *args):
+        conn = sqlite3.connect(self.ruta)
+        try:
+            return conn.execute(sql, args).fetchall()
+        finally:
+            conn.close()
+
+    def test_escritura_confirmada_al_responder(self):
+        self.assertIsNotNone(db_manager.escritura_diferida_stats())
+        avisos = []
+        self.cliente.add_write_listener(lambda usuario_id, tabla: avisos.append((usuario_id, tabla)))
+        uid = self.cliente.insert_usuario_return_id("ana", 1000, 10)
+        self.cliente.insert_gasto_fijo(uid, "Comida", 100)
+        self.cliente.insert_gasto_variable(uid, "Salud", 12.5, "2024-01-01")
+        # sin pasar por db_manager, que esperaría a la cola antes de leer
+        self.assertEqual(self.filas_en_disco("SELECT COUNT(*) FROM gastos_fijos WHERE usuario_id = ?", uid), [(1,)])
+        self.assertEqual(self.filas_en_disco("SELECT COUNT(*) FROM gastos_variables WHERE usuario_id = ?", uid),
+                         [(1,)])
+        self.assertEqual(db_manager.escritura_diferida_stats()["encoladas"], 0)
+        self.assertIn((uid, "gastos_fijos"), avisos)
+        self.assertIn((uid, "gastos_variables"), avisos)
+
+
+class ServicioShardsTest(unittest.TestCase):
+    def setUp(self):
+        self.carpeta = tempfile.TemporaryDirectory()
+        ruta = os.path.join(self.carpeta.name, "gastos.db")
+        db_manager.init_db(ruta)
+        self.usuarios = [db_manager.insert_usuario_return_id(f"usuario{i}", 1000, 10) for i in range(3)]
+        for uid in self.usuarios:
+            db_manager.insert_gasto_fijo(uid, "Alquiler", 300)
+            db_manager.insert_gasto_variable(uid, "Comida", 12.5, "2024-01-01")
+        db_manager.crear_shards(3)
+        db_manager.mover_usuario(self.usuarios[1], 1)
+        db_manager.mover_usuario(self.usuarios[2], 2)
+        self.servidor = servicio.crear_servidor(puerto=0, db=ruta, pool=2)
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+        self.cliente = cliente.ClienteServicio("http://127.0.0.1:%d" % self.servidor.server_address[1])
+
+    def tearDown(self):
+        self.cliente.cerrar()
+        self.servidor.cerrar()
+        db_manager.close_all_connections()
+        clases.cache_usuarios.limpiar()
+        self.carpeta.cleanup()
+
+    def test_lecturas_por_el_pool(self):
+        antes = set(db_manager._conexiones_shard)
+        for uid in self.usuarios:
+            self.assertEqual([g[2:] for g in self.cliente.get_gastos_fijos(uid)], [("Alquiler", 300.0)])
+            self.assertEqual(self.cliente.get_usuario_resumen(uid)[2:4], (300.0, 12.5))
+        self.assertEqual(sorted(u[0] for u in self.cliente.get_all_usuarios()), self.usuarios)
+        self.assertEqual(self.cliente.get_usuario_por_nombre("usuario2")[0], self.usuarios[2])
+        # ni los hilos de las peticiones ni los de las consultas en paralelo abrieron conexiones propias
+        self.assertEqual(set(db_manager._conexiones_shard), antes)
+
+    def test_pool_de_solo_consulta_en_cada_shard(self):
+        for uid in self.usuarios:
+            with self.assertRaises(sqlite3.OperationalError):
+                self.servidor.pool.ejecutar(db_manager.insert_gasto_fijo, uid, "Salud", 1)
+        # el escritor sí escribe en el shard del usuario
+        self.cliente.insert_gasto_fijo(self.usuarios[2], "Salud", 1)
+        self.assertEqual(len(self.cliente.get_gastos_fijos(self.usuarios[2])), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
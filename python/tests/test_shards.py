@@ -0,0 +1,112 @@
+"""
+Mover usuarios entre shards no debe perder ni duplicar gastos ni dejar los
+resúmenes desfasados (verify_resumenes).
+
+Desde la carpeta python/:
+    python -m unittest discover tests
+"""
+import os
+import sqlite3
+import tempfile
+import unittest
+
+import clases
+import db_manager
+
+
+class MoverUsuarioTest(unittest.TestCase):
+    def setUp(self):
+        self.carpeta = tempfile.TemporaryDirectory()
+        self.ruta = os.path.join(self.carpeta.name, "gastos.db")
+        db_manager.init_db(self.ruta)
+        self.usuarios = [db_manager.insert_usuario_return_id(f"usuario{i}", 1000 + i * 0.01, 10 + i)
+                         for i in range(4)]
+        for i, uid in enumerate(self.usuarios):
+            db_manager.insert_gasto_fijo(uid, "Vivienda", 300.1 + i)
+            db_manager.insert_gasto_fijo(uid, "Servicios", 0.1 + 0.2)
+            db_manager.insert_gastos_variables_bulk(
+                (uid, ("Comida", "Ocio", "Transporte")[j % 3], 0.1 * (j + 1), f"2024-{j % 12 + 1:02d}-15")
+                for j in range(30 + i))
+        db_manager.crear_shards(3)
+
+    def tearDown(self):
+        db_manager.close_all_connections()
+        clases.cache_usuarios.limpiar()
+        self.carpeta.cleanup()
+
+    def foto(self, uid):
+        # lo que ve la aplicación de un usuario, sin los ids de los gastos
+        return (db_manager.get_usuario(uid), db_manager.get_usuario_resumen(uid),
+                sorted(r[2:] for r in db_manager.get_gastos_fijos(uid)),
+                sorted(r[2:] for r in db_manager.get_gastos_variables(uid)))
+
+    def filas_en(self, numero, uid):
+        conn = sqlite3.connect(db_manager.shards()[numero])
+        try:
+            return [conn.execute(f"SELECT COUNT(*) FROM {tabla} WHERE {columna} = ?", (uid,)).fetchone()[0]
+                    for tabla, columna in (("usuarios", "id"), ("gastos_fijos", "usuario_id"),
+                                           ("gastos_variables", "usuario_id"), ("resumen_fijos", "usuario_id"),
+                                           ("resumen_mensual", "usuario_id"))]
+        finally:
+            conn.close()
+
+    def test_mover_conserva_datos_y_resumenes(self):
+        uid = self.usuarios[1]
+        antes = {u: self.foto(u) for u in self.usuarios}
+        resultado = db_manager.mover_usuario(uid, 2)
+        self.assertEqual(resultado, {"origen": 0, "destino": 2, "fijos": 2, "variables": 31})
+        self.assertEqual(db_manager.verify_resumenes(), [])
+        self.assertEqual({u: self.foto(u) for u in self.usuarios}, antes)
+        self.assertEqual(self.filas_en(0, uid), [0, 0, 0, 0, 0])
+        self.assertEqual(self.filas_en(2, uid)[:3], [1, 2, 31])
+        ids = [r[0] for r in db_manager.get_gastos_variables(uid)]
+        self.assertTrue(all(i // db_manager.RANGO_IDS_SHARD == 2 for i in ids))
+
+    def test_escrituras_despues_de_mover(self):
+        uid = self.usuarios[2]
+        db_manager.mover_usuario(uid, 1)
+        db_manager.insert_gasto_variable(uid, "Salud", 12.34, "2024-03-01")
+        gasto_id = max(r[0] for r in db_manager.get_gastos_variables(uid))
+        self.assertEqual(gasto_id // db_manager.RANGO_IDS_SHARD, 1)
+        db_manager.update_gasto_variable(gasto_id, "Otros", 0.66, "2024-04-01")
+        fijo_id = min(r[0] for r in db_manager.get_gastos_fijos(uid))
+        db_manager.delete_gasto_fijo(fijo_id)
+        self.assertEqual(db_manager.verify_resumenes(), [])
+        self.assertEqual(self.filas_en(1, uid)[:3], [1, 1, 33])
+
+    def test_ida_y_vuelta(self):
+        antes = {u: self.foto(u) for u in self.usuarios}
+        for uid in self.usuarios:
+            db_manager.mover_usuario(uid, 1)
+            db_manager.mover_usuario(uid, 2)
+        db_manager.mover_usuario(self.usuarios[0], 0)
+        self.assertEqual(db_manager.verify_resumenes(), [])
+        self.assertEqual({u: self.foto(u) for u in self.usuarios}, antes)
+
+    def test_reintentar_limpia_restos(self):
+        # un movimiento cortado después de copiar al destino deja filas sueltas
+        uid = self.usuarios[3]
+        conn = sqlite3.connect(db_manager.shards()[2])
+        with conn:
+            conn.execute("INSERT INTO usuarios (id, nombre, ingreso, ahorro_porcentaje) VALUES (?, 'resto', 1, 1)",
+                         (uid,))
+            conn.execute("INSERT INTO gastos_fijos (usuario_id, categoria, monto) VALUES (?, 'Otros', 100)", (uid,))
+        conn.close()
+        self.assertEqual(self.filas_en(2, uid), [1, 1, 0, 1, 0])
+        antes = self.foto(uid)
+        db_manager.mover_usuario(uid, 0)
+        self.assertEqual(self.filas_en(2, uid), [0, 0, 0, 0, 0])
+        self.assertEqual(db_manager.verify_resumenes(), [])
+        self.assertEqual(self.foto(uid), antes)
+
+    def test_equilibrar(self):
+        antes = {u: self.foto(u) for u in self.usuarios}
+        plan = db_manager.equilibrar(tolerancia=0.5)
+        self.assertTrue(plan)
+        self.assertEqual(db_manager.verify_resumenes(), [])
+        self.assertEqual({u: self.foto(u) for u in self.usuarios}, antes)
+        self.assertEqual(sum(c["usuarios"] for c in db_manager.carga_shards()), len(self.usuarios))
+
+
+if __name__ == "__main__":
+    unittest.main()
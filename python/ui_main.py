@@ -1,18 +1,665 @@
-from PyQt5 import QtWidgets, QtCore
+from PyQt5 import QtWidgets, QtCore, QtGui
+import itertools
 import sys
+import threading
 import db_manager
-from clases import Usuario
+import eventos
+import clases
+from clases import Usuario, CATEGORIES
 import datetime
 
-# categorías definidas
-CATEGORIES = ["Alquiler", "Comida", "Transporte", "Servicios", "Entretenimiento", "Salud", "Deudas","Otros"]
+class _WorkerSignals(QtCore.QObject):
+    terminado = QtCore.pyqtSignal(int, object)
+    fallo = QtCore.pyqtSignal(int, str)
+
+
+class DbWorker(QtCore.QRunnable):
+    """
+    Ejecuta una función de la capa de datos fuera del hilo de la interfaz.
+    db_manager abre una conexión propia para cada hilo del pool.
+    """
+    def __init__(self, ticket: int, fn, args):
+        super().__init__()
+        self.ticket = ticket
+        self.fn = fn
+        self.args = args
+        self.signals = _WorkerSignals()
+
+    def run(self):
+        try:
+            resultado = self.fn(*self.args)
+        except Exception as e:
+            self.signals.fallo.emit(self.ticket, str(e))
+        else:
+            self.signals.terminado.emit(self.ticket, resultado)
+
+
+class DbExecutor(QtCore.QObject):
+    """
+    Cola de consultas en un QThreadPool con resultados entregados en el hilo de la
+    interfaz. Las peticiones con la misma `clave` se reemplazan: si la anterior aún
+    no empezó se cancela, y si ya está corriendo su resultado se descarta. Las
+    peticiones sin clave (escrituras) siempre se entregan.
+    """
+    ocupado = QtCore.pyqtSignal(bool)
+
+    def __init__(self, parent=None, max_hilos: int = 2):
+        super().__init__(parent)
+        self.pool = QtCore.QThreadPool(self)
+        self.pool.setMaxThreadCount(max_hilos)
+        self._tickets = itertools.count(1)
+        self._vigente = {}   # clave -> último ticket
+        self._en_curso = {}  # ticket -> (clave, worker, on_ok, on_error)
+        self._ocupado = False
+
+    def submit(self, clave, fn, *args, on_ok=None, on_error=None) -> int:
+        anterior = self._vigente.get(clave) if clave is not None else None
+        if anterior in self._en_curso and self.pool.tryTake(self._en_curso[anterior][1]):
+            del self._en_curso[anterior]
+        ticket = next(self._tickets)
+        worker = DbWorker(ticket, fn, args)
+        # el pool no lo borra al terminar: su resultado puede seguir en la cola de
+        # eventos y tryTake no debe tocar un objeto ya destruido. Se libera en _tomar.
+        worker.setAutoDelete(False)
+        worker.signals.terminado.connect(self._on_terminado)
+        worker.signals.fallo.connect(self._on_fallo)
+        if clave is not None:
+            self._vigente[clave] = ticket
+        self._en_curso[ticket] = (clave, worker, on_ok, on_error)
+        self._actualizar_ocupado()
+        self.pool.start(worker)
+        return ticket
+
+    def esperar(self):
+        self.pool.waitForDone()
+
+    def _tomar(self, ticket):
+        entrada = self._en_curso.pop(ticket, None)
+        self._actualizar_ocupado()
+        if entrada is None:
+            return None
+        clave = entrada[0]
+        if clave is not None:
+            if self._vigente.get(clave) != ticket:
+                return None  # reemplazada por una petición más nueva
+            del self._vigente[clave]
+        return entrada
+
+    def _on_terminado(self, ticket, resultado):
+        entrada = self._tomar(ticket)
+        if entrada and entrada[2]:
+            entrada[2](resultado)
+
+    def _on_fallo(self, ticket, mensaje):
+        entrada = self._tomar(ticket)
+        if entrada and entrada[3]:
+            entrada[3](mensaje)
+
+    def _actualizar_ocupado(self):
+        ocupado = bool(self._en_curso)
+        if ocupado != self._ocupado:
+            self._ocupado = ocupado
+            self.ocupado.emit(ocupado)
+
+
+class PuenteEventos(QtCore.QObject):
+    """
+    Trae los eventos de db_manager (publicados en el hilo que escribió) al hilo
+    de la interfaz. Los que llegan antes de que la interfaz los atienda se
+    entregan juntos en un solo lote.
+    """
+    lote = QtCore.pyqtSignal(list)
+    _hay_eventos = QtCore.pyqtSignal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._pendientes = []
+        self._lock = threading.Lock()
+        self._hay_eventos.connect(self._entregar, QtCore.Qt.QueuedConnection)
+        eventos.suscribir(self._recibir)
+
+    def _recibir(self, evento):
+        with self._lock:
+            primero = not self._pendientes
+            self._pendientes.append(evento)
+        if primero:
+            self._hay_eventos.emit()
+
+    def _entregar(self):
+        with self._lock:
+            lote, self._pendientes = self._pendientes, []
+        if lote:
+            self.lote.emit(lote)
+
+    def cerrar(self):
+        eventos.cancelar(self._recibir)
+
+
+class GastosTableModel(QtCore.QAbstractTableModel):
+    """
+    Modelo de solo lectura para las tablas de gastos. Carga las filas por páginas
+    (fetchMore) a medida que la vista hace scroll; el orden y el filtro por
+    categoría se resuelven en SQL. Las páginas se leen en el DbExecutor y se
+    agregan cuando llegan; una página pedida antes de recargar se descarta.
+    """
+    PAGE_SIZE = 200
+    fallo = QtCore.pyqtSignal(str)
+
+    def __init__(self, tabla: str, usuario_id: int, encabezados, db: DbExecutor, parent=None):
+        super().__init__(parent)
+        self.tabla = tabla
+        self.usuario_id = usuario_id
+        self.columnas = db_manager.COLUMNAS_GASTOS[tabla]
+        self.encabezados = encabezados
+        self.db = db
+        self.orden = "id"
+        self.descendente = False
+        self.categoria = None
+        self._rows = []
+        self._agotado = False
+        self._carga = 0  # cambia al recargar
+        self._pidiendo = False
+
+    # -- interfaz de Qt --
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.columnas)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        valor = self._rows[index.row()][index.column()]
+        if role == QtCore.Qt.DisplayRole:
+            if self.columnas[index.column()] == "monto":
+                return f"{valor:.2f}"
+            return str(valor)
+        if role == QtCore.Qt.TextAlignmentRole and self.columnas[index.column()] == "monto":
+            return int(QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter)
+        return None
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if role == QtCore.Qt.DisplayRole and orientation == QtCore.Qt.Horizontal:
+            return self.encabezados[section]
+        return None
+
+    def canFetchMore(self, parent=QtCore.QModelIndex()):
+        return not parent.isValid() and not self._agotado and not self._pidiendo
+
+    def fetchMore(self, parent=QtCore.QModelIndex()):
+        if parent.isValid() or self._agotado or self._pidiendo:
+            return
+        after = None
+        if self._rows:
+            ultima = self._rows[-1]
+            after = (ultima[self.columnas.index(self.orden)], ultima[0])
+        self._pidiendo = True
+        carga = self._carga
+        self.db.submit(("pagina", id(self)), db_manager.get_gastos_page, self.tabla, self.usuario_id,
+                       self.orden, self.descendente, after, self.PAGE_SIZE, self.categoria,
+                       on_ok=lambda rows: self._agregar_pagina(carga, rows),
+                       on_error=lambda mensaje: self._fallo_pagina(carga, mensaje))
+
+    def _agregar_pagina(self, carga, rows):
+        if carga != self._carga:
+            return
+        self._pidiendo = False
+        if len(rows) < self.PAGE_SIZE:
+            self._agotado = True
+        # lo que ya agregó un evento mientras se leía la página no se repite
+        cargados = {r[0] for r in self._rows}
+        rows = [r for r in rows if r[0] not in cargados]
+        if rows:
+            self.beginInsertRows(QtCore.QModelIndex(), len(self._rows), len(self._rows) + len(rows) - 1)
+            self._rows.extend(rows)
+            self.endInsertRows()
+
+    def _fallo_pagina(self, carga, mensaje):
+        if carga != self._carga:
+            return
+        # no se reintenta solo (la vista volvería a pedirla enseguida); sí al recargar
+        self._pidiendo = False
+        self._agotado = True
+        self.fallo.emit(mensaje)
+
+    def sort(self, column, order=QtCore.Qt.AscendingOrder):
+        self.orden = self.columnas[column]
+        self.descendente = order == QtCore.Qt.DescendingOrder
+        self.reload()
+
+    # -- uso desde el diálogo --
+    def reload(self):
+        self.beginResetModel()
+        self._rows = []
+        self._agotado = False
+        self._carga += 1
+        self._pidiendo = False
+        self.endResetModel()
+
+    def set_categoria(self, categoria):
+        self.categoria = categoria
+        self.reload()
+
+    def gasto_id(self, row: int):
+        if 0 <= row < len(self._rows):
+            return self._rows[row][0]
+        return None
+
+    def _buscar_fila(self, gasto_id):
+        return next((i for i, r in enumerate(self._rows) if r[0] == gasto_id), None)
+
+    def eliminar_fila(self, gasto_id):
+        i = self._buscar_fila(gasto_id)
+        if i is None:
+            return
+        self.beginRemoveRows(QtCore.QModelIndex(), i, i)
+        del self._rows[i]
+        self.endRemoveRows()
+
+    # -- eventos de db_manager --
+    def _antes(self, a, b) -> bool:
+        # si la fila `a` va antes que `b` con el orden actual (el mismo que usa SQL)
+        i = self.columnas.index(self.orden)
+        return ((a[i], a[0]) < (b[i], b[0])) != self.descendente
+
+    def _posicion(self, fila) -> int:
+        lo, hi = 0, len(self._rows)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._antes(self._rows[mid], fila):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def aplicar_evento(self, evento):
+        """
+        Agrega, reemplaza o quita solo la fila del gasto afectado, en su lugar
+        según el orden. Una fila que cae después de la última cargada no se
+        agrega: llega con la próxima página. Lo que no trae filas (inserción
+        masiva, cambios generales) recarga la tabla.
+        """
+        if evento.usuario_id not in (None, self.usuario_id):
+            return
+        if isinstance(evento, (eventos.CambioGeneral, eventos.UsuarioEliminado)) or (
+                isinstance(evento, eventos.GastosInsertados) and evento.tabla == self.tabla):
+            self.reload()
+            return
+        if not isinstance(evento, eventos.EventoGasto) or evento.tabla != self.tabla:
+            return
+        fila = getattr(evento, "fila", None)
+        if fila is not None:
+            fila = fila[:1] + fila[2:]  # sin usuario_id, como COLUMNAS_GASTOS
+            if self.categoria is not None and fila[1] != self.categoria:
+                fila = None
+        i = self._buscar_fila(evento.gasto_id)
+        if i is not None and fila is not None:
+            ultima = len(self._rows) - 1
+            if ((i == 0 or self._antes(self._rows[i - 1], fila))
+                    and (i == ultima and self._agotado or i < ultima and self._antes(fila, self._rows[i + 1]))):
+                # sigue en el mismo lugar: se reemplaza
+                self._rows[i] = fila
+                self.dataChanged.emit(self.index(i, 0), self.index(i, len(self.columnas) - 1))
+                return
+        if i is not None:
+            self.beginRemoveRows(QtCore.QModelIndex(), i, i)
+            del self._rows[i]
+            self.endRemoveRows()
+        if fila is not None:
+            j = self._posicion(fila)
+            if j < len(self._rows) or self._agotado:
+                self.beginInsertRows(QtCore.QModelIndex(), j, j)
+                self._rows.insert(j, fila)
+                self.endInsertRows()
+
+
+class UsuariosModel(QtCore.QAbstractListModel):
+    """
+    Lista de usuarios en orden alfabético que se carga por páginas (fetchMore),
+    opcionalmente filtrada por un prefijo del nombre. La usan el combo de
+    usuarios y el buscador. Los usuarios elegidos desde el buscador que aún no
+    se cargaron quedan fijados al principio de la lista. Como en
+    GastosTableModel, las páginas se leen en el DbExecutor.
+    """
+    PAGE_SIZE = 100
+    fallo = QtCore.pyqtSignal(str)
+
+    def __init__(self, db: DbExecutor, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.prefijo = ""
+        self._fijados = []
+        self._rows = []
+        self._after = None  # (nombre, id) de la última fila pedida
+        self._agotado = False
+        self._carga = 0  # cambia al recargar
+        self._pidiendo = False
+        self._al_cargar = None
+
+    # -- interfaz de Qt --
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self._fijados) + len(self._rows)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        uid, nombre, ingreso, _ahorro = self._fila(index.row())
+        if role in (QtCore.Qt.DisplayRole, QtCore.Qt.EditRole):
+            return f"{nombre} (Ingreso: {ingreso})"
+        if role == QtCore.Qt.UserRole:
+            return uid
+        return None
+
+    def canFetchMore(self, parent=QtCore.QModelIndex()):
+        return not parent.isValid() and not self._agotado and not self._pidiendo
+
+    def fetchMore(self, parent=QtCore.QModelIndex()):
+        if parent.isValid() or self._agotado or self._pidiendo:
+            return
+        self._pidiendo = True
+        carga = self._carga
+        self.db.submit(("pagina", id(self)), db_manager.buscar_usuarios, self.prefijo, self.PAGE_SIZE,
+                       self._after, on_ok=lambda rows: self._agregar_pagina(carga, rows),
+                       on_error=lambda mensaje: self._fallo_pagina(carga, mensaje))
+
+    def _agregar_pagina(self, carga, rows):
+        if carga != self._carga:
+            return
+        self._pidiendo = False
+        if len(rows) < self.PAGE_SIZE:
+            self._agotado = True
+        if rows:
+            self._after = (rows[-1][1], rows[-1][0])
+        # los fijados ya están arriba: no se repiten
+        fijados = {r[0] for r in self._fijados}
+        rows = [r for r in rows if r[0] not in fijados]
+        if rows:
+            inicio = self.rowCount()
+            self.beginInsertRows(QtCore.QModelIndex(), inicio, inicio + len(rows) - 1)
+            self._rows.extend(rows)
+            self.endInsertRows()
+        self._cargada()
+
+    def _fallo_pagina(self, carga, mensaje):
+        if carga != self._carga:
+            return
+        self._pidiendo = False
+        self._agotado = True
+        self.fallo.emit(mensaje)
+        self._cargada()
+
+    def _cargada(self):
+        al_cargar, self._al_cargar = self._al_cargar, None
+        if al_cargar is not None:
+            al_cargar()
+
+    # -- uso desde la ventana --
+    def _fila(self, i: int):
+        return self._fijados[i] if i < len(self._fijados) else self._rows[i - len(self._fijados)]
+
+    def reload(self, prefijo: str = None, al_cargar=None):
+        """
+        Vuelve a pedir la primera página; `al_cargar` se llama cuando llegó (o
+        falló), con las filas ya en el modelo.
+        """
+        self.beginResetModel()
+        if prefijo is not None:
+            self.prefijo = prefijo
+        self._fijados = []
+        self._rows = []
+        self._after = None
+        self._agotado = False
+        self._carga += 1
+        self._pidiendo = False
+        self._al_cargar = al_cargar
+        self.endResetModel()
+        self.fetchMore()
+
+    def usuario(self, row: int):
+        if 0 <= row < self.rowCount():
+            return self._fila(row)
+        return None
+
+    def buscar_fila(self, usuario_id: int):
+        return next((i for i in range(self.rowCount()) if self._fila(i)[0] == usuario_id), None)
+
+    def fijar(self, row_data) -> int:
+        """
+        Devuelve la posición del usuario; si todavía no se había cargado se
+        agrega al principio sin recargar el resto.
+        """
+        i = self.buscar_fila(row_data[0])
+        if i is not None:
+            return i
+        self.beginInsertRows(QtCore.QModelIndex(), 0, 0)
+        self._fijados.insert(0, tuple(row_data))
+        self.endInsertRows()
+        return 0
+
+    def actualizar_fila(self, row_data):
+        """
+        Reemplaza un usuario ya cargado (mismo id) sin recargar el resto.
+        """
+        i = self.buscar_fila(row_data[0])
+        if i is None:
+            return
+        if i < len(self._fijados):
+            self._fijados[i] = tuple(row_data)
+        else:
+            self._rows[i - len(self._fijados)] = tuple(row_data)
+        self.dataChanged.emit(self.index(i), self.index(i))
+
+    def eliminar_fila(self, usuario_id: int):
+        i = self.buscar_fila(usuario_id)
+        if i is None:
+            return
+        self.beginRemoveRows(QtCore.QModelIndex(), i, i)
+        if i < len(self._fijados):
+            del self._fijados[i]
+        else:
+            del self._rows[i - len(self._fijados)]
+        self.endRemoveRows()
+
+
+class ProyeccionWidget(QtWidgets.QWidget):
+    """
+    Pestaña "Proyección": presupuesto mes a mes del usuario actual y, al lado, el
+    disponible en los escenarios "qué pasaría si" (ver proyeccion.py).
+    """
+    def __init__(self, ventana: "MainWindow"):
+        super().__init__(ventana)
+        self.ventana = ventana
+        v = QtWidgets.QVBoxLayout(self)
+
+        h = QtWidgets.QHBoxLayout()
+        h.addWidget(QtWidgets.QLabel("Meses:"))
+        self.spin_meses = QtWidgets.QSpinBox()
+        self.spin_meses.setRange(12, 60)
+        self.spin_meses.setSingleStep(12)
+        h.addWidget(self.spin_meses)
+        self.chk_tendencia = QtWidgets.QCheckBox("Usar tendencia")
+        h.addWidget(self.chk_tendencia)
+        h.addWidget(QtWidgets.QLabel("Ahorro alternativo %:"))
+        self.spin_ahorro_alt = QtWidgets.QSpinBox()
+        self.spin_ahorro_alt.setRange(0, 100)
+        self.spin_ahorro_alt.setValue(20)
+        h.addWidget(self.spin_ahorro_alt)
+        h.addWidget(QtWidgets.QLabel("Sin gasto fijo:"))
+        self.cmb_sin_fijo = QtWidgets.QComboBox()
+        self.cmb_sin_fijo.addItem("(ninguno)", None)
+        for c in CATEGORIES:
+            self.cmb_sin_fijo.addItem(c, c)
+        h.addWidget(self.cmb_sin_fijo)
+        self.btn_proyectar = QtWidgets.QPushButton("Proyectar")
+        h.addWidget(self.btn_proyectar)
+        h.addStretch()
+        v.addLayout(h)
+
+        self.tabla = QtWidgets.QTableWidget()
+        self.tabla.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.tabla.verticalHeader().setDefaultSectionSize(22)
+        self.tabla.horizontalHeader().setStretchLastSection(True)
+        v.addWidget(self.tabla)
+
+        self.btn_proyectar.clicked.connect(ventana.accion("Proyectar", self.actualizar))
+
+    def escenarios(self):
+        import proyeccion
+        escenarios = [proyeccion.Escenario("Base"),
+                      proyeccion.Escenario(f"Ahorro {self.spin_ahorro_alt.value()}%",
+                                           ahorro_porcentaje=self.spin_ahorro_alt.value())]
+        categoria = self.cmb_sin_fijo.currentData()
+        if categoria is not None:
+            escenarios.append(proyeccion.Escenario(f"Sin {categoria}", factores_fijos={categoria: 0}))
+        return escenarios
+
+    def actualizar(self):
+        uid = self.ventana.current_usuario_id()
+        if uid is None:
+            self.tabla.clear()
+            self.tabla.setRowCount(0)
+            return
+        try:
+            escenarios = self.escenarios()
+        except ImportError:
+            QtWidgets.QMessageBox.warning(self, "Proyección", "La proyección necesita NumPy instalado.")
+            return
+        self.ventana.db.submit("proyeccion", _calcular_proyeccion, uid, self.spin_meses.value(), escenarios,
+                               self.chk_tendencia.isChecked(), on_ok=self.mostrar, on_error=self.ventana.on_db_error)
+
+    def mostrar(self, series):
+        if not series:
+            return
+        base = series[0]
+        columnas = ["Mes", "Fijos", "Variables", "Disponible", "Ahorro acumulado"]
+        columnas += [f"Disponible ({s['escenario']})" for s in series[1:]]
+        self.tabla.clear()
+        self.tabla.setColumnCount(len(columnas))
+        self.tabla.setHorizontalHeaderLabels(columnas)
+        self.tabla.setRowCount(len(base["meses"]))
+        for i, mes in enumerate(base["meses"]):
+            valores = [base["fijos"][i], base["variables"][i], base["disponible"][i], base["ahorro_acumulado"][i]]
+            valores += [s["disponible"][i] for s in series[1:]]
+            self.tabla.setItem(i, 0, QtWidgets.QTableWidgetItem(mes))
+            for j, valor in enumerate(valores, start=1):
+                item = QtWidgets.QTableWidgetItem(f"{valor:.2f}")
+                item.setTextAlignment(QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter)
+                if valor < 0:
+                    item.setForeground(QtGui.QBrush(QtGui.QColor("red")))
+                self.tabla.setItem(i, j, item)
+        self.tabla.resizeColumnsToContents()
+
+
+class DiagnosticoDialog(QtWidgets.QDialog):
+    """
+    Panel oculto (Ctrl+Shift+D): funciones y sentencias más costosas de las
+    últimas acciones de la interfaz, a partir de las métricas de db_manager.
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Diagnóstico de base de datos")
+        self.resize(850, 550)
+        v = QtWidgets.QVBoxLayout(self)
+
+        h = QtWidgets.QHBoxLayout()
+        self.chk_trazas = QtWidgets.QCheckBox("Trazas activas")
+        self.chk_trazas.setChecked(db_manager.metricas() is not None)
+        self.chk_trazas.toggled.connect(self.on_trazas)
+        h.addWidget(self.chk_trazas)
+        h.addWidget(QtWidgets.QLabel("Últimas acciones:"))
+        self.spin_acciones = QtWidgets.QSpinBox()
+        self.spin_acciones.setRange(1, 100)
+        self.spin_acciones.setValue(10)
+        self.spin_acciones.valueChanged.connect(self.actualizar)
+        h.addWidget(self.spin_acciones)
+        h.addStretch()
+        v.addLayout(h)
+
+        self.lbl_acciones = QtWidgets.QLabel()
+        self.lbl_acciones.setWordWrap(True)
+        v.addWidget(self.lbl_acciones)
+
+        self.tbl_funciones = self._tabla(["función", "llamadas", "total ms"])
+        v.addWidget(QtWidgets.QLabel("Funciones con más tiempo acumulado:"))
+        v.addWidget(self.tbl_funciones)
+        self.tbl_sentencias = self._tabla(["sentencia", "veces", "total ms", "p95 ms", "filas"])
+        v.addWidget(QtWidgets.QLabel("Sentencias con más tiempo acumulado (desde que se activaron las trazas):"))
+        v.addWidget(self.tbl_sentencias)
+
+        h2 = QtWidgets.QHBoxLayout()
+        for texto, slot in (("Actualizar", self.actualizar), ("Reiniciar", self.reiniciar),
+                            ("Exportar JSON", lambda: self.exportar("json")),
+                            ("Exportar Prometheus", lambda: self.exportar("prom"))):
+            btn = QtWidgets.QPushButton(texto)
+            btn.clicked.connect(slot)
+            h2.addWidget(btn)
+        h2.addStretch()
+        btn_close = QtWidgets.QPushButton("Cerrar")
+        btn_close.clicked.connect(self.accept)
+        h2.addWidget(btn_close)
+        v.addLayout(h2)
+
+        self.actualizar()
+
+    def _tabla(self, encabezados):
+        tbl = QtWidgets.QTableWidget(0, len(encabezados))
+        tbl.setHorizontalHeaderLabels(encabezados)
+        tbl.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        tbl.horizontalHeader().setSectionResizeMode(0, QtWidgets.QHeaderView.Stretch)
+        return tbl
+
+    def _llenar(self, tbl, filas):
+        tbl.setRowCount(len(filas))
+        for i, fila in enumerate(filas):
+            for j, valor in enumerate(fila):
+                texto = f"{valor:.3f}" if isinstance(valor, float) else str(valor)
+                tbl.setItem(i, j, QtWidgets.QTableWidgetItem(texto))
+
+    def on_trazas(self, activas: bool):
+        if activas:
+            db_manager.habilitar_trazas()
+        else:
+            db_manager.deshabilitar_trazas()
+        self.actualizar()
+
+    def actualizar(self):
+        m = db_manager.metricas()
+        if m is None:
+            self.lbl_acciones.setText("Trazas desactivadas.")
+            self._llenar(self.tbl_funciones, [])
+            self._llenar(self.tbl_sentencias, [])
+            return
+        n = self.spin_acciones.value()
+        acciones = [a.nombre for a in list(m.acciones)[-n:]]
+        self.lbl_acciones.setText("Acciones: " + (", ".join(acciones) or "ninguna"))
+        self._llenar(self.tbl_funciones, m.top_acciones(15, ultimas=n))
+        self._llenar(self.tbl_sentencias, m.top_sentencias(15))
+
+    def reiniciar(self):
+        m = db_manager.metricas()
+        if m is not None:
+            m.reiniciar()
+        self.actualizar()
+
+    def exportar(self, formato: str):
+        m = db_manager.metricas()
+        if m is None:
+            QtWidgets.QMessageBox.information(self, "Exportar", "Activa las trazas primero.")
+            return
+        filtro = "JSON (*.json)" if formato == "json" else "Prometheus (*.prom *.txt)"
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Exportar métricas", "", filtro)
+        if not path:
+            return
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(m.a_json(indent=2) if formato == "json" else m.a_prometheus())
+
 
 class MainWindow(QtWidgets.QMainWindow):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Control de Gastos Personales")
         self.resize(800, 500)
-        db_manager.create_tables()
 
         central = QtWidgets.QWidget()
         self.setCentralWidget(central)
@@ -20,11 +667,27 @@ class MainWindow(QtWidgets.QMainWindow):
 
         # Top: usuarios
         h_usr = QtWidgets.QHBoxLayout()
+        # Consultas fuera del hilo de la interfaz (el indicador de ocupado va abajo)
+        self.db = DbExecutor(self)
+
+        # el combo carga los usuarios por páginas al desplegarse; el buscador
+        # consulta por prefijo a medida que se escribe
+        self.modelo_usuarios = UsuariosModel(self.db, self)
         self.cmb_usuarios = QtWidgets.QComboBox()
+        self.cmb_usuarios.setModel(self.modelo_usuarios)
+        self.cmb_usuarios.setMinimumContentsLength(25)
+        self.txt_buscar = QtWidgets.QLineEdit()
+        self.txt_buscar.setPlaceholderText("Buscar usuario...")
+        self.modelo_busqueda = UsuariosModel(self.db, self)
+        self.completer = QtWidgets.QCompleter(self.modelo_busqueda, self)
+        # el filtro lo hace la consulta: el completer muestra lo que devuelve
+        self.completer.setCompletionMode(QtWidgets.QCompleter.UnfilteredPopupCompletion)
+        self.txt_buscar.setCompleter(self.completer)
         self.btn_refresh = QtWidgets.QPushButton("Refrescar")
         self.btn_nuevo = QtWidgets.QPushButton("Crear usuario")
         h_usr.addWidget(QtWidgets.QLabel("Usuario:"))
         h_usr.addWidget(self.cmb_usuarios)
+        h_usr.addWidget(self.txt_buscar)
         h_usr.addWidget(self.btn_refresh)
         h_usr.addWidget(self.btn_nuevo)
         layout.addLayout(h_usr)
@@ -34,9 +697,11 @@ class MainWindow(QtWidgets.QMainWindow):
         self.btn_add_fijo = QtWidgets.QPushButton("Agregar gasto fijo")
         self.btn_add_variable = QtWidgets.QPushButton("Agregar gasto variable")
         self.btn_ver_gastos = QtWidgets.QPushButton("Listar gastos")
+        self.btn_importar = QtWidgets.QPushButton("Importar")
         h_actions.addWidget(self.btn_add_fijo)
         h_actions.addWidget(self.btn_add_variable)
         h_actions.addWidget(self.btn_ver_gastos)
+        h_actions.addWidget(self.btn_importar)
         layout.addLayout(h_actions)
 
         # Extra widgets: ahorro spin y progress bar (añade más widgets distintos)
@@ -55,29 +720,82 @@ class MainWindow(QtWidgets.QMainWindow):
         h_extra.addWidget(self.progress_usage)
         layout.addLayout(h_extra)
 
-        # Reporte
+        # Pestañas: reporte actual y proyección
+        self.tabs = QtWidgets.QTabWidget()
         self.txt_reporte = QtWidgets.QTextEdit()
         self.txt_reporte.setReadOnly(True)
-        layout.addWidget(self.txt_reporte)
+        self.tabs.addTab(self.txt_reporte, "Reporte")
+        self.proyeccion = ProyeccionWidget(self)
+        self.tabs.addTab(self.proyeccion, "Proyección")
+        layout.addWidget(self.tabs)
+
+        # Indicador de consultas en curso
+        self.busy = QtWidgets.QProgressBar()
+        self.busy.setRange(0, 0)
+        self.busy.setMaximumWidth(120)
+        self.busy.hide()
+        self.statusBar().addPermanentWidget(self.busy)
+        self.db.ocupado.connect(self.set_ocupado)
+        self.modelo_usuarios.fallo.connect(self.on_db_error)
+        self.modelo_busqueda.fallo.connect(self.on_db_error)
+
+        # Cambios en la base: se aplica solo lo que cambió (ver _aplicar_eventos)
+        self.tablas_abiertas = []
+        self.eventos = PuenteEventos(self)
+        self.eventos.lote.connect(self._aplicar_eventos)
 
-        # Conexiones
-        self.btn_refresh.clicked.connect(self.refresh_users)
-        self.btn_nuevo.clicked.connect(self.create_user)
-        self.cmb_usuarios.currentIndexChanged.connect(self.on_user_changed)
-        self.btn_add_fijo.clicked.connect(lambda: self.show_add_gasto_dialog(tipo="fijo"))
-        self.btn_add_variable.clicked.connect(lambda: self.show_add_gasto_dialog(tipo="variable"))
-        self.btn_ver_gastos.clicked.connect(self.show_gastos_dialog)
-        self.btn_update_ahorro.clicked.connect(self.update_ahorro)
+        # Conexiones (cada una es una "acción" para el panel de diagnóstico)
+        self.btn_refresh.clicked.connect(self.accion("Refrescar", self.refresh_users))
+        self.btn_nuevo.clicked.connect(self.accion("Crear usuario", self.create_user))
+        self.txt_buscar.textEdited.connect(self.buscar_usuarios)
+        self.completer.activated[QtCore.QModelIndex].connect(self.elegir_busqueda)
+        self.cmb_usuarios.currentIndexChanged.connect(
+            self.accion("Cambiar usuario", lambda: self.on_user_changed(self.cmb_usuarios.currentIndex())))
+        self.btn_add_fijo.clicked.connect(self.accion("Agregar gasto fijo", lambda: self.show_add_gasto_dialog(tipo="fijo")))
+        self.btn_add_variable.clicked.connect(self.accion("Agregar gasto variable", lambda: self.show_add_gasto_dialog(tipo="variable")))
+        self.btn_ver_gastos.clicked.connect(self.accion("Listar gastos", self.show_gastos_dialog))
+        self.btn_importar.clicked.connect(self.accion("Importar", self.importar_gastos))
+        self.btn_update_ahorro.clicked.connect(self.accion("Actualizar ahorro", self.update_ahorro))
+        self.tabs.currentChanged.connect(self.accion("Cambiar pestaña", self.actualizar_proyeccion))
 
+        # Panel oculto de diagnóstico
+        QtWidgets.QShortcut(QtGui.QKeySequence("Ctrl+Shift+D"), self, self.show_diagnostico)
+
+        db_manager.iniciar_accion("Inicio")
         self.refresh_users()
 
+    def accion(self, nombre: str, fn):
+        """
+        Envuelve un slot para que las consultas que dispare se atribuyan a `nombre`
+        en las métricas de db_manager (si las trazas están activas).
+        """
+        def slot(*_):
+            db_manager.iniciar_accion(nombre)
+            fn()
+        return slot
+
+    def show_diagnostico(self):
+        DiagnosticoDialog(self).exec_()
+
+    def set_ocupado(self, ocupado: bool):
+        self.busy.setVisible(ocupado)
+        if ocupado:
+            self.statusBar().showMessage("Consultando base de datos...")
+        else:
+            self.statusBar().clearMessage()
+
+    def on_db_error(self, mensaje: str):
+        QtWidgets.QMessageBox.warning(self, "Error de base de datos", mensaje)
+
     def refresh_users(self):
+        # "Refrescar" vuelve a leer todo, también lo que cambió otro proceso
+        clases.cache_usuarios.limpiar()
+        # solo la primera página; el resto se pide al recorrer el combo. Hasta
+        # que llegue el combo no avisa cambios: se elige el primero al final
         self.cmb_usuarios.blockSignals(True)
-        self.cmb_usuarios.clear()
-        rows = db_manager.get_all_usuarios()
-        for r in rows:
-            uid, nombre, ingreso, ahorro = r
-            self.cmb_usuarios.addItem(f"{nombre} (Ingreso: {ingreso})", uid)
+        self.modelo_usuarios.reload(al_cargar=self._usuarios_cargados)
+
+    def _usuarios_cargados(self):
         self.cmb_usuarios.blockSignals(False)
         if self.cmb_usuarios.count() > 0:
             self.cmb_usuarios.setCurrentIndex(0)
@@ -87,12 +805,29 @@ class MainWindow(QtWidgets.QMainWindow):
             self.spin_ahorro.setValue(0)
             self.progress_usage.setValue(0)
 
-    def current_usuario(self) -> Usuario | None:
+    def buscar_usuarios(self, texto: str):
+        self.modelo_busqueda.reload(texto.strip())
+
+    def elegir_busqueda(self, index):
+        db_manager.iniciar_accion("Buscar usuario")
+        # el índice es del modelo interno del completer; sin filtrar, la fila coincide
+        row = self.modelo_busqueda.usuario(index.row())
+        if row is not None:
+            self.seleccionar_usuario(row)
+            self.txt_buscar.clear()
+
+    def seleccionar_usuario(self, row_data):
+        i = self.modelo_usuarios.fijar(row_data)
+        if i == self.cmb_usuarios.currentIndex():
+            self.on_user_changed(i)
+        else:
+            self.cmb_usuarios.setCurrentIndex(i)
+
+    def current_usuario_id(self) -> int | None:
         idx = self.cmb_usuarios.currentIndex()
         if idx < 0:
             return None
-        uid = self.cmb_usuarios.itemData(idx)
-        return Usuario.from_db(int(uid))
+        return int(self.cmb_usuarios.itemData(idx))
 
     def create_user(self):
         nombre, ok = QtWidgets.QInputDialog.getText(self, "Crear usuario", "Nombre:")
@@ -104,13 +839,25 @@ class MainWindow(QtWidgets.QMainWindow):
         ahorro, ok = QtWidgets.QInputDialog.getDouble(self, "Crear usuario", "Porcentaje de ahorro (ej. 10):", decimals=2, min=0.0)
         if not ok:
             return
-        # insertar y refrescar
-        db_manager.insert_usuario(nombre.strip(), float(ingreso), float(ahorro))
-        self.refresh_users()
+        row = [None, nombre.strip(), float(ingreso), float(ahorro)]
+
+        def on_ok(uid):
+            # se agrega solo el nuevo usuario y queda seleccionado
+            row[0] = uid
+            self.seleccionar_usuario(row)
+        self.db.submit(None, db_manager.insert_usuario_return_id, *row[1:], on_ok=on_ok, on_error=self.on_db_error)
 
     def on_user_changed(self, index):
-        u = self.current_usuario()
-        if not u:
+        uid = self.current_usuario_id()
+        if uid is None:
+            self.txt_reporte.setPlainText("No hay usuario seleccionado.")
+            return
+        # al recorrer rápido el combo solo se muestra el último usuario pedido
+        self.db.submit("reporte", _cargar_reporte, uid, on_ok=self._on_usuario_cargado, on_error=self.on_db_error)
+
+    def _on_usuario_cargado(self, datos):
+        u, r = datos
+        if u is None:
             self.txt_reporte.setPlainText("No hay usuario seleccionado.")
             return
         # actualizar spin con el porcentaje actual
@@ -119,45 +866,77 @@ class MainWindow(QtWidgets.QMainWindow):
             self.spin_ahorro.setValue(int(u.ahorro_porcentaje))
         finally:
             self.spin_ahorro.blockSignals(False)
-        self.update_report(u)
+        self.mostrar_reporte(u, r)
 
     def update_ahorro(self):
-        u = self.current_usuario()
-        if not u:
+        uid = self.current_usuario_id()
+        if uid is None:
             QtWidgets.QMessageBox.warning(self, "Atención", "Selecciona un usuario primero.")
             return
         nuevo_pct = self.spin_ahorro.value()
-        db_manager.update_usuario(u.id, u.nombre, u.ingreso, float(nuevo_pct))
-        # recargar y refrescar
-        self.refresh_users()
 
-    def update_report(self, u: Usuario):
-        texto = []
-        texto.append(f"Usuario: {u.nombre} (id={u.id})")
-        texto.append(f"Ingreso: {u.ingreso:.2f}")
-        texto.append(f"Ahorro ({u.ahorro_porcentaje}%): {u.calcular_ahorro():.2f}")
-        texto.append(f"Gastos fijos totales: {u.gastos_fijos_totales():.2f}")
-        texto.append(f"Gastos variables totales: {u.gastos_variables_totales():.2f}")
-        texto.append(f"Presupuesto disponible (ingreso - ahorro - gastos fijos - gastos variables): {u.presupuesto_disponible():.2f}")
-
-        # estado y advertencia si compromiso supera ingreso
-        compromiso = u.compromiso_total()
-        texto.append(f"Total comprometido (ahorro + gastos): {compromiso:.2f}")
-        if u.ingreso > 0:
-            pct = int(min(100, (compromiso / u.ingreso) * 100))
+        def on_ok(row):
+            # el combo y el reporte se actualizan con el evento de la escritura
+            if row is None:
+                self.refresh_users()
+        # solo se escribe el porcentaje: nombre e ingreso pueden venir de otro proceso
+        self.db.submit(None, db_manager.update_ahorro_porcentaje, uid, float(nuevo_pct),
+                       on_ok=on_ok, on_error=self.on_db_error)
+
+    def _aplicar_eventos(self, lote):
+        """
+        Lleva a la vista lo que cambió: solo las filas tocadas de las tablas
+        abiertas y de las listas de usuarios, y el reporte del usuario actual con
+        el resumen que la caché ya corrigió (sin consultar la base). Si la caché
+        no lo tiene (el usuario no está en el mapa o su resumen no se guardó),
+        se vuelve a pedir en segundo plano: solo los objetos del mapa reciben
+        los eventos y solo ellos guardan un resumen.
+        """
+        uid = self.current_usuario_id()
+        reporte = False
+        for evento in lote:
+            for modelo in self.tablas_abiertas:
+                modelo.aplicar_evento(evento)
+            if isinstance(evento, eventos.UsuarioActualizado):
+                self.modelo_usuarios.actualizar_fila(evento.fila)
+                self.modelo_busqueda.actualizar_fila(evento.fila)
+            elif isinstance(evento, eventos.UsuarioEliminado):
+                self.modelo_busqueda.eliminar_fila(evento.usuario_id)
+                # si era el actual, el combo cambia de usuario y se carga el nuevo
+                self.modelo_usuarios.eliminar_fila(evento.usuario_id)
+            reporte = reporte or evento.usuario_id in (None, uid)
+        uid = self.current_usuario_id()
+        if not reporte or uid is None:
+            return
+        u = Usuario.en_cache(uid)
+        r = u.resumen_en_cache() if u is not None else None
+        if r is None:
+            self.on_user_changed(self.cmb_usuarios.currentIndex())
         else:
-            pct = 0
-        self.progress_usage.setValue(pct)
+            self._on_usuario_cargado((u, r))
+
+    def actualizar_proyeccion(self):
+        # solo se calcula con la pestaña a la vista
+        if self.tabs.currentWidget() is self.proyeccion:
+            self.proyeccion.actualizar()
 
-        if compromiso > u.ingreso:
+    def mostrar_reporte(self, u: Usuario, r):
+        self.progress_usage.setValue(r.porcentaje_uso)
+        self.txt_reporte.setPlainText("\n".join(r.lineas_reporte(u)))
+        self.actualizar_proyeccion()
+        if r.excede_ingreso:
             # Advertencia visible + cuadro
-            texto.append("ADVERTENCIA: Compras + ahorro exceden el ingreso. Revisa gastos o porcentaje de ahorro.")
             QtWidgets.QMessageBox.warning(self, "Advertencia", "El total comprometido (ahorro + gastos) supera el ingreso. Ajusta gastos o ahorro.")
-        self.txt_reporte.setPlainText("\n".join(texto))
+
+    def closeEvent(self, event):
+        # no cerrar con escrituras pendientes en el pool
+        self.db.esperar()
+        self.eventos.cerrar()
+        super().closeEvent(event)
 
     def show_add_gasto_dialog(self, tipo: str):
-        u = self.current_usuario()
-        if not u:
+        uid = self.current_usuario_id()
+        if uid is None:
             QtWidgets.QMessageBox.warning(self, "Atención", "Selecciona un usuario primero.")
             return
         dlg = QtWidgets.QDialog(self)
@@ -192,43 +971,95 @@ class MainWindow(QtWidgets.QMainWindow):
             if monto <= 0:
                 QtWidgets.QMessageBox.information(dlg, "Monto inválido", "Ingresa un monto mayor a 0.")
                 return
+            # el reporte se actualiza con el evento de la escritura
             if tipo == "fijo":
-                u.agregar_gasto_fijo(categoria, monto)
+                self.db.submit(None, db_manager.insert_gasto_fijo, uid, categoria, monto,
+                               on_error=self.on_db_error)
             else:
-                u.agregar_gasto_variable(categoria, monto, fecha)
+                self.db.submit(None, db_manager.insert_gasto_variable, uid, categoria, monto, fecha,
+                               on_error=self.on_db_error)
             dlg.accept()
 
         btns.accepted.connect(on_accept)
         btns.rejected.connect(dlg.reject)
+        dlg.exec_()
 
-        if dlg.exec_() == QtWidgets.QDialog.Accepted:
-            u = Usuario.from_db(u.id)
-            self.update_report(u)
+    def importar_gastos(self):
+        uid = self.current_usuario_id()
+        if uid is None:
+            QtWidgets.QMessageBox.warning(self, "Atención", "Selecciona un usuario primero.")
+            return
+        path, _ = QtWidgets.QFileDialog.getOpenFileName(self, "Importar gastos variables", "", "CSV (*.csv *.txt);;Todos (*)")
+        if not path:
+            return
+        self.btn_importar.setEnabled(False)
+
+        def on_ok(resultado):
+            self.btn_importar.setEnabled(True)
+            if resultado is None:
+                QtWidgets.QMessageBox.warning(self, "Importar", "El usuario ya no existe.")
+                return
+            mensaje = f"Gastos importados: {resultado.insertados}\nFilas omitidas: {resultado.omitidos}"
+            if resultado.abonos:
+                mensaje += f"\nAbonos omitidos (no son gastos): {resultado.abonos}"
+            if resultado.errores:
+                mensaje += "\n\n" + "\n".join(resultado.errores)
+            QtWidgets.QMessageBox.information(self, "Importar", mensaje)
+
+        def on_error(mensaje):
+            self.btn_importar.setEnabled(True)
+            QtWidgets.QMessageBox.warning(self, "Importar", f"No se pudo importar el archivo: {mensaje}")
+
+        self.db.submit(None, _importar_gastos, uid, path, on_ok=on_ok, on_error=on_error)
 
     def show_gastos_dialog(self):
-        u = self.current_usuario()
-        if not u:
+        uid = self.current_usuario_id()
+        if uid is None:
             QtWidgets.QMessageBox.warning(self, "Atención", "Selecciona un usuario primero.")
             return
+
+        def on_ok(u):
+            if u is None:
+                QtWidgets.QMessageBox.warning(self, "Atención", "El usuario ya no existe.")
+                return
+            self._mostrar_gastos(u)
+        self.db.submit("gastos", Usuario.from_db, uid, on_ok=on_ok, on_error=self.on_db_error)
+
+    def _mostrar_gastos(self, u: Usuario):
         dlg = QtWidgets.QDialog(self)
         dlg.setWindowTitle(f"Gastos de {u.nombre}")
         dlg.resize(700, 450)
         v = QtWidgets.QVBoxLayout(dlg)
 
+        # filtro por categoría (se aplica en SQL)
+        h_filtro = QtWidgets.QHBoxLayout()
+        h_filtro.addWidget(QtWidgets.QLabel("Categoría:"))
+        cmb_filtro = QtWidgets.QComboBox()
+        cmb_filtro.addItem("Todas", None)
+        for c in CATEGORIES:
+            cmb_filtro.addItem(c, c)
+        h_filtro.addWidget(cmb_filtro)
+        h_filtro.addStretch()
+        v.addLayout(h_filtro)
+
         tabs = QtWidgets.QTabWidget()
         v.addWidget(tabs)
 
-        # Gastos fijos
-        tbl_f = QtWidgets.QTableWidget()
-        gf = u.listar_gastos_fijos()
-        tbl_f.setColumnCount(3)
-        tbl_f.setHorizontalHeaderLabels(["id", "categoría", "monto"])
-        tbl_f.setRowCount(len(gf))
-        for i, g in enumerate(gf):
-            tbl_f.setItem(i, 0, QtWidgets.QTableWidgetItem(str(g.id)))
-            tbl_f.setItem(i, 1, QtWidgets.QTableWidgetItem(g.categoria))
-            tbl_f.setItem(i, 2, QtWidgets.QTableWidgetItem(f"{g.monto:.2f}"))
-        tbl_f.resizeColumnsToContents()
+        def crear_tabla(model):
+            view = QtWidgets.QTableView()
+            view.setModel(model)
+            view.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+            view.setSelectionMode(QtWidgets.QAbstractItemView.SingleSelection)
+            view.setSortingEnabled(True)
+            view.sortByColumn(0, QtCore.Qt.AscendingOrder)
+            view.horizontalHeader().setStretchLastSection(True)
+            view.verticalHeader().setDefaultSectionSize(22)
+            return view
+
+        # Gastos fijos (las tablas abiertas reciben los eventos de la ventana)
+        model_f = GastosTableModel("gastos_fijos", u.id, ["id", "categoría", "monto"], self.db, dlg)
+        model_f.fallo.connect(self.on_db_error)
+        tbl_f = crear_tabla(model_f)
         tabs.addTab(tbl_f, "Gastos fijos")
 
         # botones para gastos fijos
@@ -240,19 +1071,17 @@ class MainWindow(QtWidgets.QMainWindow):
         v.addLayout(h_f)
 
         # Gastos variables
-        tbl_v = QtWidgets.QTableWidget()
-        gv = u.listar_gastos_variables()
-        tbl_v.setColumnCount(4)
-        tbl_v.setHorizontalHeaderLabels(["id", "categoría", "monto", "fecha"])
-        tbl_v.setRowCount(len(gv))
-        for i, g in enumerate(gv):
-            tbl_v.setItem(i, 0, QtWidgets.QTableWidgetItem(str(g.id)))
-            tbl_v.setItem(i, 1, QtWidgets.QTableWidgetItem(g.categoria))
-            tbl_v.setItem(i, 2, QtWidgets.QTableWidgetItem(f"{g.monto:.2f}"))
-            tbl_v.setItem(i, 3, QtWidgets.QTableWidgetItem(g.fecha))
-        tbl_v.resizeColumnsToContents()
+        model_v = GastosTableModel("gastos_variables", u.id, ["id", "categoría", "monto", "fecha"], self.db, dlg)
+        model_v.fallo.connect(self.on_db_error)
+        tbl_v = crear_tabla(model_v)
         tabs.addTab(tbl_v, "Gastos variables")
 
+        def on_filtro_changed(_):
+            categoria = cmb_filtro.currentData()
+            model_f.set_categoria(categoria)
+            model_v.set_categoria(categoria)
+        cmb_filtro.currentIndexChanged.connect(on_filtro_changed)
+
         # botones para gastos variables
         h_v = QtWidgets.QHBoxLayout()
         btn_edit_v = QtWidgets.QPushButton("Editar seleccionado (variable)")
@@ -266,53 +1095,27 @@ class MainWindow(QtWidgets.QMainWindow):
         v.addWidget(btn_close)
 
         # -- funciones de edición/eliminación --
-        def get_selected_id(table: QtWidgets.QTableWidget):
-            sel = table.currentRow()
-            if sel < 0:
-                return None
-            item = table.item(sel, 0)
-            if not item:
-                return None
-            try:
-                return int(item.text())
-            except Exception:
+        def get_selected_id(table: QtWidgets.QTableView):
+            idx = table.currentIndex()
+            if not idx.isValid():
                 return None
-
-        def refresh_tables():
-            # recarga datos desde BD y actualiza tablas y reporte
-            new_u = Usuario.from_db(u.id)
-            # recargar fijos
-            rows_f = new_u.listar_gastos_fijos()
-            tbl_f.setRowCount(len(rows_f))
-            for i, g in enumerate(rows_f):
-                tbl_f.setItem(i, 0, QtWidgets.QTableWidgetItem(str(g.id)))
-                tbl_f.setItem(i, 1, QtWidgets.QTableWidgetItem(g.categoria))
-                tbl_f.setItem(i, 2, QtWidgets.QTableWidgetItem(f"{g.monto:.2f}"))
-            tbl_f.resizeColumnsToContents()
-            # recargar variables
-            rows_v = new_u.listar_gastos_variables()
-            tbl_v.setRowCount(len(rows_v))
-            for i, g in enumerate(rows_v):
-                tbl_v.setItem(i, 0, QtWidgets.QTableWidgetItem(str(g.id)))
-                tbl_v.setItem(i, 1, QtWidgets.QTableWidgetItem(g.categoria))
-                tbl_v.setItem(i, 2, QtWidgets.QTableWidgetItem(f"{g.monto:.2f}"))
-                tbl_v.setItem(i, 3, QtWidgets.QTableWidgetItem(g.fecha))
-            tbl_v.resizeColumnsToContents()
-            # actualizar reporte principal
-            self.update_report(new_u)
+            return table.model().gasto_id(idx.row())
 
         def edit_fixed():
             gid = get_selected_id(tbl_f)
             if gid is None:
                 QtWidgets.QMessageBox.information(dlg, "Selecciona", "Selecciona una fila de gasto fijo.")
                 return
-            # obtener fila actual del gasto
-            rows = db_manager.get_gastos_fijos(u.id)
-            row = next((r for r in rows if r[0] == gid), None)
-            if not row:
+            # leer solo el gasto seleccionado, por id; el diálogo se abre al llegar
+            self.db.submit("gasto", u.obtener_gasto_fijo, gid,
+                           on_ok=lambda gasto: editar_fijo(gid, gasto), on_error=self.on_db_error)
+
+        def editar_fijo(gid, gasto):
+            if gasto is None:
                 QtWidgets.QMessageBox.information(dlg, "No encontrado", "Gasto no encontrado.")
+                model_f.eliminar_fila(gid)
                 return
-            _, usuario_id, categoria, monto = row
+            categoria, monto = gasto.categoria, gasto.monto
             # diálogo editar (prefill)
             dlg2 = QtWidgets.QDialog(self)
             dlg2.setWindowTitle("Editar gasto fijo")
@@ -336,13 +1139,18 @@ class MainWindow(QtWidgets.QMainWindow):
                 if new_monto <= 0:
                     QtWidgets.QMessageBox.information(dlg2, "Monto inválido", "Ingresa un monto mayor a 0.")
                     return
-                db_manager.update_gasto_fijo(gid, new_cat, new_monto)
                 dlg2.accept()
 
+                def on_ok(g):
+                    # la fila y el reporte se actualizan con el evento; si ya no existía no hay evento
+                    if g is None:
+                        model_f.eliminar_fila(gid)
+                self.db.submit(None, u.actualizar_gasto_fijo, gid, new_cat, new_monto,
+                               on_ok=on_ok, on_error=self.on_db_error)
+
             btns2.accepted.connect(on_ok2)
             btns2.rejected.connect(dlg2.reject)
-            if dlg2.exec_() == QtWidgets.QDialog.Accepted:
-                refresh_tables()
+            dlg2.exec_()
 
         def delete_fixed():
             gid = get_selected_id(tbl_f)
@@ -351,20 +1159,23 @@ class MainWindow(QtWidgets.QMainWindow):
                 return
             if QtWidgets.QMessageBox.question(dlg, "Confirmar", "Eliminar gasto fijo seleccionado?") != QtWidgets.QMessageBox.StandardButton.Yes:
                 return
-            db_manager.delete_gasto_fijo(gid)
-            refresh_tables()
+
+            self.db.submit(None, db_manager.delete_gasto_fijo, gid, on_error=self.on_db_error)
 
         def edit_variable():
             gid = get_selected_id(tbl_v)
             if gid is None:
                 QtWidgets.QMessageBox.information(dlg, "Selecciona", "Selecciona una fila de gasto variable.")
                 return
-            rows = db_manager.get_gastos_variables(u.id)
-            row = next((r for r in rows if r[0] == gid), None)
-            if not row:
+            self.db.submit("gasto", u.obtener_gasto_variable, gid,
+                           on_ok=lambda gasto: editar_variable(gid, gasto), on_error=self.on_db_error)
+
+        def editar_variable(gid, gasto):
+            if gasto is None:
                 QtWidgets.QMessageBox.information(dlg, "No encontrado", "Gasto no encontrado.")
+                model_v.eliminar_fila(gid)
                 return
-            _, usuario_id, categoria, monto, fecha = row
+            categoria, monto, fecha = gasto.categoria, gasto.monto, gasto.fecha
             dlg2 = QtWidgets.QDialog(self)
             dlg2.setWindowTitle("Editar gasto variable")
             form = QtWidgets.QFormLayout(dlg2)
@@ -396,13 +1207,17 @@ class MainWindow(QtWidgets.QMainWindow):
                 if new_monto <= 0:
                     QtWidgets.QMessageBox.information(dlg2, "Monto inválido", "Ingresa un monto mayor a 0.")
                     return
-                db_manager.update_gasto_variable(gid, new_cat, new_monto, new_fecha)
                 dlg2.accept()
 
+                def on_ok(g):
+                    if g is None:
+                        model_v.eliminar_fila(gid)
+                self.db.submit(None, u.actualizar_gasto_variable, gid, new_cat, new_monto, new_fecha,
+                               on_ok=on_ok, on_error=self.on_db_error)
+
             btns2.accepted.connect(on_ok3)
             btns2.rejected.connect(dlg2.reject)
-            if dlg2.exec_() == QtWidgets.QDialog.Accepted:
-                refresh_tables()
+            dlg2.exec_()
 
         def delete_variable():
             gid = get_selected_id(tbl_v)
@@ -411,8 +1226,8 @@ class MainWindow(QtWidgets.QMainWindow):
                 return
             if QtWidgets.QMessageBox.question(dlg, "Confirmar", "Eliminar gasto variable seleccionado?") != QtWidgets.QMessageBox.StandardButton.Yes:
                 return
-            db_manager.delete_gasto_variable(gid)
-            refresh_tables()
+
+            self.db.submit(None, db_manager.delete_gasto_variable, gid, on_error=self.on_db_error)
 
         # conectar botones
         btn_edit_f.clicked.connect(edit_fixed)
@@ -420,11 +1235,29 @@ class MainWindow(QtWidgets.QMainWindow):
         btn_edit_v.clicked.connect(edit_variable)
         btn_del_v.clicked.connect(delete_variable)
 
-        dlg.exec_()
+        self.tablas_abiertas += [model_f, model_v]
+        try:
+            dlg.exec_()
+        finally:
+            self.tablas_abiertas = [m for m in self.tablas_abiertas if m not in (model_f, model_v)]
+
+def _cargar_reporte(usuario_id: int):
+    # corre en un hilo del pool: usuario + resumen en una sola tarea
+    u = Usuario.from_db(usuario_id)
+    return u, (u.summary() if u else None)
+
+def _importar_gastos(usuario_id: int, path: str):
+    u = Usuario.from_db(usuario_id)
+    return u.importar_gastos(path) if u else None
+
+def _calcular_proyeccion(usuario_id: int, meses: int, escenarios, tendencia: bool):
+    u = Usuario.from_db(usuario_id)
+    return u.proyectar(meses, escenarios, tendencia=tendencia) if u else None
 
 def main():
     import signal
     signal.signal(signal.SIGINT, signal.SIG_DFL)
+    db_manager.init_db()
     app = QtWidgets.QApplication(sys.argv)
     window = MainWindow()
     window.show()